@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+from datetime import date
 from pathlib import Path
 from dotenv import load_dotenv
 from os import getenv
@@ -42,6 +43,76 @@ CORS_ORIGIN_ALLOW_ALL = True
 # Constantes especificas de funcionalidades
 NOMBRE_COOKIE_DOCENTE = 'cedula_docente'
 
+# Sesión de los docentes: cookie con el token firmado y su duración en segundos. La cookie anterior con la
+# cédula sin firmar (NOMBRE_COOKIE_DOCENTE) se acepta hasta la fecha indicada (vacía para rechazarla).
+NOMBRE_COOKIE_SESION_DOCENTE = 'sesion_docente'
+DURACION_SESION_DOCENTE = int(getenv("DURACION_SESION_DOCENTE", 7 * 24 * 60 * 60))
+FIN_MIGRACION_COOKIE_CEDULA = getenv("FIN_MIGRACION_COOKIE_CEDULA", "2027-01-31")
+FIN_MIGRACION_COOKIE_CEDULA = date.fromisoformat(FIN_MIGRACION_COOKIE_CEDULA) if FIN_MIGRACION_COOKIE_CEDULA else None
+
+# Caché con las épocas de las sesiones (para revocarlas al eliminar un docente). Debe ser compartida por
+# todos los procesos del servidor, por eso por defecto es un directorio en disco.
+CACHE_SESIONES_DOCENTE = 'sesiones'
+DIRECTORIO_CACHE_SESIONES = BASE_DIR / getenv("DIRECTORIO_CACHE_SESIONES", "cache_sesiones")
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    CACHE_SESIONES_DOCENTE: {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': DIRECTORIO_CACHE_SESIONES,
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 1_000_000},
+    },
+}
+
+# Docentes autenticados que se conservan en memoria por proceso y segundos que se consideran vigentes
+TAMAÑO_CACHE_DOCENTES = int(getenv("TAMAÑO_CACHE_DOCENTES", 1024))
+VIGENCIA_CACHE_DOCENTES = float(getenv("VIGENCIA_CACHE_DOCENTES", 60))
+
+# Caché en disco de los PDFs generados (tamaño máximo en bytes)
+DIRECTORIO_CACHE_PDF = BASE_DIR / getenv("DIRECTORIO_CACHE_PDF", "cache_pdf")
+TAMAÑO_MAXIMO_CACHE_PDF = int(getenv("CACHE_PDF_MAXIMO_MB", 256)) * 1024 * 1024
+# Caché de páginas individuales (en el subdirectorio "paginas", con su propio tamaño máximo), para regenerar
+# solo las páginas que cambiaron
+CACHE_PAGINAS_PDF = getenv("CACHE_PAGINAS_PDF", "True") == "True"
+TAMAÑO_MAXIMO_CACHE_PAGINAS_PDF = int(getenv("CACHE_PAGINAS_PDF_MAXIMO_MB", 64)) * 1024 * 1024
+
+# Modo de salida de los PDFs: "normal" (sin comprimir), "comprimido" (flujos comprimidos y objetos repetidos
+# unificados) o "web" (comprimido y linealizado para vista rápida en la web, requiere el programa qpdf)
+MODO_SALIDA_PDF = getenv("MODO_SALIDA_PDF", "comprimido")
+
+# Los planes con más items que este umbral (0 para desactivarlo) se exportan por bloques, con la memoria
+# acotada: los items se leen de a ITEMS_POR_BLOQUE_PDF y las páginas se escriben directamente en el archivo
+ITEMS_EXPORTACION_EN_FLUJO = int(getenv("ITEMS_EXPORTACION_EN_FLUJO", 1000))
+ITEMS_POR_BLOQUE_PDF = int(getenv("ITEMS_POR_BLOQUE_PDF", 500))
+
+# Ancho en pixeles de las imágenes de vista previa de las páginas (792 equivale a un pixel por punto)
+ANCHO_VISTA_PREVIA_PDF = int(getenv("ANCHO_VISTA_PREVIA_PDF", 792))
+
+# Regeneración en segundo plano de los PDFs tras cada escritura (espera en segundos desde la última edición)
+PRERENDERIZAR_PDF = getenv("PRERENDERIZAR_PDF", "True") == "True"
+ESPERA_PRERENDERIZADO_PDF = float(getenv("ESPERA_PRERENDERIZADO_PDF", 5))
+HILOS_PRERENDERIZADO_PDF = int(getenv("HILOS_PRERENDERIZADO_PDF", 2))
+
+# Procesos para generar los PDFs de las exportaciones masivas (0 genera los PDFs en el mismo proceso),
+# compartidos por todas las exportaciones de cada proceso web, y cantidad de exportaciones simultáneas
+PROCESOS_EXPORTACION_PDF = int(getenv("PROCESOS_EXPORTACION_PDF", 2))
+EXPORTACIONES_SIMULTANEAS_PDF = int(getenv("EXPORTACIONES_SIMULTANEAS_PDF", 2))
+
+# Procesos que generan los PDFs de las descargas (0 los genera en el hilo de la petición), cantidad de
+# descargas que pueden esperar un proceso libre, tiempo máximo por PDF y espera sugerida al responder 503 (segundos)
+PROCESOS_RENDERIZADO_PDF = int(getenv("PROCESOS_RENDERIZADO_PDF", 2))
+COLA_RENDERIZADO_PDF = int(getenv("COLA_RENDERIZADO_PDF", 8))
+TIEMPO_MAXIMO_RENDERIZADO_PDF = float(getenv("TIEMPO_MAXIMO_RENDERIZADO_PDF", 30))
+REINTENTO_RENDERIZADO_PDF = int(getenv("REINTENTO_RENDERIZADO_PDF", 5))
+
+# Archivos de los trabajos de exportación asíncrona, horas que se conservan tras completarse y minutos sin
+# avanzar tras los que un trabajo en proceso se considera abandonado (su proceso terminó) y vuelve a la cola
+DIRECTORIO_EXPORTACIONES = BASE_DIR / getenv("DIRECTORIO_EXPORTACIONES", "exportaciones")
+HORAS_VIGENCIA_EXPORTACIONES = float(getenv("HORAS_VIGENCIA_EXPORTACIONES", 24))
+MINUTOS_ABANDONO_EXPORTACIONES = float(getenv("MINUTOS_ABANDONO_EXPORTACIONES", 15))
+
 # Configuraciones DRF
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
@@ -85,6 +156,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'autenticacion_docente.middleware.DocenteMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AutenticacionDocenteConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'autenticacion_docente'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,64 @@
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+
+from autenticacion_docente.models import Docente
+
+
+class CacheDocentes:
+    """Caché por proceso de los docentes autenticados, identificados por su cédula.
+
+    Se conservan los `maximo` docentes usados más recientemente, cada uno durante `vigencia` segundos.
+    Guardar o eliminar un docente lo descarta de la caché de este proceso (ver `signals.py`); los
+    cambios hechos en otros procesos se ven al vencer la vigencia. Las cédulas sin docente no se guardan,
+    así un docente recién registrado en otro proceso puede usar la API apenas inicia sesión.
+    """
+
+    def __init__(self, maximo: int = 1024, vigencia: float = 60):
+        self.maximo = maximo
+        self.vigencia = vigencia
+        self._docentes: OrderedDict[int, tuple[float, Docente]] = OrderedDict()
+        self._candado = Lock()
+
+    def obtener(self, cedula: int) -> Docente | None:
+        """Devuelve el docente con la cédula, consultándolo solo si no está en la caché o ya venció."""
+        with self._candado:
+            entrada = self._docentes.get(cedula)
+            if entrada is not None and entrada[0] > monotonic():
+                self._docentes.move_to_end(cedula)
+                return entrada[1]
+
+        docente = Docente.objects.filter(cedula=cedula).first()
+        if docente is None:
+            return None
+
+        with self._candado:
+            self._docentes[cedula] = (monotonic() + self.vigencia, docente)
+            self._docentes.move_to_end(cedula)
+            while len(self._docentes) > self.maximo:
+                self._docentes.popitem(last=False)
+        return docente
+
+    def invalidar(self, cedula: int):
+        """Descarta el docente de la caché."""
+        with self._candado:
+            self._docentes.pop(cedula, None)
+
+    def limpiar(self):
+        """Descarta todos los docentes."""
+        with self._candado:
+            self._docentes.clear()
+
+
+cache_docentes = CacheDocentes(settings.TAMAÑO_CACHE_DOCENTES, settings.VIGENCIA_CACHE_DOCENTES)
+
+
+def resolver_docente(cedula: str | None) -> Docente | None:
+    """Devuelve el docente correspondiente al valor de la cookie, o None si no es una cédula registrada."""
+    try:
+        cedula = int(cedula)
+    except (TypeError, ValueError):
+        return None
+    return cache_docentes.obtener(cedula)
@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from autenticacion_docente.docentes import cache_docentes, resolver_docente
+from autenticacion_docente.models import Docente
+from autenticacion_docente.sesiones import acepta_cookie_cedula, iniciar_sesion, verificar_token
+
+
+def autenticar_peticion(request) -> Docente | None:
+    """Deja en la petición la cédula del docente autenticado (`request.cedula_docente`) y el docente
+    (`request.docente`), o None en ambos si no hay una sesión válida.
+
+    La cédula sale del token de sesión firmado, sin consultar la base de datos; el docente se obtiene
+    (de la caché de docentes) solo si se usa. Durante el periodo de migración también se acepta la cookie
+    anterior con la cédula sin firmar, verificándola contra la base de datos; en ese caso devuelve el
+    docente, para emitirle un token.
+    """
+    cedula = verificar_token(request.COOKIES.get(settings.NOMBRE_COOKIE_SESION_DOCENTE))
+    docente = None
+    if cedula is None and acepta_cookie_cedula():
+        docente = resolver_docente(request.COOKIES.get(settings.NOMBRE_COOKIE_DOCENTE))
+
+    if docente is not None:
+        request.cedula_docente = docente.cedula
+        request.docente = docente
+    elif cedula is not None:
+        request.cedula_docente = cedula
+        request.docente = SimpleLazyObject(lambda: cache_docentes.obtener(cedula))
+    else:
+        request.cedula_docente = None
+        request.docente = None
+    return docente
+
+
+class DocenteMiddleware:
+    """Autentica una sola vez por petición al docente de la sesión (ver `autenticar_peticion`).
+
+    Las vistas de DRF leen `request.cedula_docente` y `request.docente` igual desde su `request`, que
+    delega los atributos en el original. A quien aún usa la cookie anterior se le emite un token de
+    sesión en la respuesta, que reemplaza a esa cookie.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        docente_cookie_anterior = autenticar_peticion(request)
+        response = self.get_response(request)
+        # Si la vista ya inició o cerró la sesión, se respeta su respuesta
+        if docente_cookie_anterior is not None and settings.NOMBRE_COOKIE_SESION_DOCENTE not in response.cookies:
+            iniciar_sesion(response, docente_cookie_anterior)
+        return response
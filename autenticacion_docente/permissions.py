@@ -1,22 +1,22 @@
 from rest_framework.permissions import BasePermission
 from django.conf import settings
 
-from autenticacion_docente.models import Docente
+from autenticacion_docente.middleware import autenticar_peticion
 
 class CedulaRequerida(BasePermission):
     """
-    Permiso que requiere que la cookie 'cedula' esté presente en la petición.
+    Permiso que requiere una sesión de docente válida (la cookie con el token de sesión firmado).
     """
 
-    message = f'Se requiere la cookie "{settings.NOMBRE_COOKIE_DOCENTE}" para acceder a este recurso.'
+    message = f'Se requiere la cookie "{settings.NOMBRE_COOKIE_SESION_DOCENTE}" para acceder a este recurso.'
 
     def has_permission(self, request, view):
-        """Valida que exista la cookie y que además la cédula del docente exista."""
-        cedula: str | None = request.COOKIES.get(settings.NOMBRE_COOKIE_DOCENTE)
+        """Valida que el token de sesión sea válido, sin consultar la base de datos.
 
-        if not cedula:
-            return False
+        La sesión ya viene verificada por `DocenteMiddleware`; si la petición no pasó por él (por ejemplo,
+        al probar una vista directamente) se verifica aquí y se guarda en la petición.
+        """
+        if not hasattr(request, 'cedula_docente'):
+            autenticar_peticion(request._request)
 
-        return Docente.objects.filter(cedula=cedula).exists()
-
-        
\ No newline at end of file
+        return request.cedula_docente is not None
@@ -0,0 +1,78 @@
+from datetime import date
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from autenticacion_docente.models import Docente
+
+# Separa las firmas de las sesiones de cualquier otra firma hecha con la misma SECRET_KEY
+SAL_SESION = "autenticacion_docente.sesion"
+
+
+def _cache_sesiones():
+    return caches[settings.CACHE_SESIONES_DOCENTE]
+
+
+def _clave_epoca(cedula: int) -> str:
+    return f"epoca-sesiones-docente:{cedula}"
+
+
+def epoca_sesiones(cedula: int) -> int:
+    """Época de las sesiones del docente: los tokens emitidos en una época anterior ya no son válidos."""
+    return _cache_sesiones().get(_clave_epoca(cedula), 0)
+
+
+def revocar_sesiones(cedula: int):
+    """Invalida todos los tokens emitidos hasta ahora para la cédula, avanzando su época."""
+    cache = _cache_sesiones()
+    clave = _clave_epoca(cedula)
+    cache.add(clave, 0, timeout=None)
+    cache.incr(clave)
+
+
+def emitir_token(docente: Docente) -> str:
+    """Token de sesión firmado (HMAC con SECRET_KEY) con la cédula, la época y la fecha de emisión."""
+    return signing.TimestampSigner(salt=SAL_SESION).sign_object([docente.cedula, epoca_sesiones(docente.cedula)])
+
+
+def verificar_token(token: str | None) -> int | None:
+    """Devuelve la cédula del token si la firma es válida (comparada en tiempo constante), no expiró
+    y su época sigue vigente, o None en caso contrario. No consulta la base de datos.
+    """
+    if not token:
+        return None
+    try:
+        cedula, epoca = signing.TimestampSigner(salt=SAL_SESION).unsign_object(
+            token, max_age=settings.DURACION_SESION_DOCENTE
+        )
+    except (signing.BadSignature, ValueError, TypeError):
+        return None
+    if epoca != epoca_sesiones(cedula):
+        return None
+    return cedula
+
+
+def acepta_cookie_cedula() -> bool:
+    """Indica si todavía se acepta la cookie anterior con la cédula sin firmar (periodo de migración)."""
+    fin = settings.FIN_MIGRACION_COOKIE_CEDULA
+    return fin is not None and date.today() <= fin
+
+
+def iniciar_sesion(response: HttpResponse, docente: Docente):
+    """Guarda en la respuesta la cookie con el token de sesión y elimina la cookie anterior, si existía."""
+    response.set_cookie(
+        settings.NOMBRE_COOKIE_SESION_DOCENTE,
+        emitir_token(docente),
+        max_age=settings.DURACION_SESION_DOCENTE,
+        httponly=True,
+        samesite="Lax",
+    )
+    response.delete_cookie(settings.NOMBRE_COOKIE_DOCENTE)
+
+
+def cerrar_sesion(response: HttpResponse):
+    """Elimina de la respuesta las cookies de sesión (la del token y la anterior con la cédula)."""
+    response.delete_cookie(settings.NOMBRE_COOKIE_SESION_DOCENTE, samesite="Lax")
+    response.delete_cookie(settings.NOMBRE_COOKIE_DOCENTE)
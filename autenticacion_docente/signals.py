@@ -0,0 +1,16 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Docente
+from .docentes import cache_docentes
+from .sesiones import revocar_sesiones
+
+
+@receiver([post_save, post_delete], sender=Docente)
+def invalidar_docente(sender, instance: Docente, **kwargs):
+    cache_docentes.invalidar(instance.cedula)
+
+
+@receiver(post_delete, sender=Docente)
+def revocar_sesiones_docente(sender, instance: Docente, **kwargs):
+    revocar_sesiones(instance.cedula)
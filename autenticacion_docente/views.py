@@ -6,9 +6,8 @@ from drf_spectacular.utils import extend_schema, OpenApiResponse
 
 from autenticacion_docente.serializers import SerializadorDocente, SerializadorInicioSesion
 from autenticacion_docente.permissions import CedulaRequerida
-from autenticacion_docente.models import Docente
+from autenticacion_docente.sesiones import iniciar_sesion, cerrar_sesion
 
-from django.conf import settings
 
 
 class IniciarSesion(APIView):
@@ -16,15 +15,15 @@ class IniciarSesion(APIView):
     API endpoint para la autenticación de docentes.
 
     Permite a un docente iniciar sesión proporcionando su cédula.
-    Tras una autenticación exitosa, la cédula del docente se guarda
-    en una cookie en la respuesta.
+    Tras una autenticación exitosa, se guarda en una cookie de la respuesta
+    un token de sesión firmado con la cédula del docente.
     """
     permission_classes = [AllowAny]
     serializer_class = SerializadorInicioSesion
 
     @extend_schema(
         summary="Iniciar sesión de docente",
-        description="Autentica a un docente y guarda su cédula en una cookie.",
+        description="Autentica a un docente y guarda un token de sesión firmado en una cookie.",
         request=SerializadorInicioSesion,
         responses={
             202: OpenApiResponse(description="Inicio de sesión exitoso. Cookie configurada."),
@@ -36,16 +35,16 @@ class IniciarSesion(APIView):
         Maneja la solicitud POST para iniciar sesión.
 
         Valida los datos de la solicitud utilizando el SerializadorInicioSesion.
-        Si la validación es exitosa, guarda la cédula del docente en una cookie
-        y devuelve una respuesta 202. Si la validación falla, devuelve
+        Si la validación es exitosa, guarda el token de sesión del docente en una
+        cookie y devuelve una respuesta 202. Si la validación falla, devuelve
         una respuesta 400 con los errores de validación.
         """
         serializador = SerializadorInicioSesion(data=request.data)
         if serializador.is_valid():
 
-            # Guardar la cedula en una cookie
+            # Guardar el token de sesión firmado en una cookie
             response = Response(status=202)
-            response.set_cookie(settings.NOMBRE_COOKIE_DOCENTE, serializador.docente.cedula, httponly=True)
+            iniciar_sesion(response, serializador.docente)
 
             return response
 
@@ -58,7 +57,7 @@ class ObtenerDatosDocente(APIView):
     """
     API endpoint para obtener los datos del docente autenticado.
 
-    Requiere que el docente esté autenticado (la cookie de cédula sea válida).
+    Requiere que el docente esté autenticado (el token de sesión sea válido).
     Devuelve la información del docente en formato JSON.
     """
     permission_classes = [CedulaRequerida]
@@ -68,20 +67,18 @@ class ObtenerDatosDocente(APIView):
         description="Obtiene los datos del docente autenticado a través de la cookie.",
         responses={
             200: SerializadorDocente,
-            403: OpenApiResponse(description="No autenticado. Cookie de cédula no encontrada o inválida."),
+            403: OpenApiResponse(description="No autenticado. Token de sesión no encontrado, inválido o expirado."),
         }
     )
     def get(self, request):
         """
         Maneja la solicitud GET para obtener los datos del docente.
 
-        Recupera la cédula del docente de la cookie y busca al docente
-        correspondiente en la base de datos. Serializa los datos del docente
+        Toma el docente autenticado de la petición (resuelto a partir de la
+        token de sesión por DocenteMiddleware). Serializa los datos del docente
         utilizando el SerializadorDocente y los devuelve en la respuesta.
         """
-        cedula: str = request.COOKIES.get(settings.NOMBRE_COOKIE_DOCENTE)
-        docente = Docente.objects.get(cedula=cedula)
-        docente = SerializadorDocente(docente)
+        docente = SerializadorDocente(request.docente)
         return Response(docente.data)
 
 
@@ -89,28 +86,28 @@ class CerrarSesion(APIView):
     """
     API endpoint para cerrar la sesión del docente.
 
-    Requiere que el docente esté autenticado (la cookie de cédula sea válida).
-    Elimina la cookie de cédula del navegador del cliente.
+    Requiere que el docente esté autenticado (el token de sesión sea válido).
+    Elimina la cookie de sesión del navegador del cliente.
     """
     permission_classes = [CedulaRequerida]
 
     @extend_schema(
         summary="Cerrar sesión de docente",
-        description="Elimina la cookie de cédula del docente para cerrar la sesión.",
+        description="Elimina la cookie de sesión del docente para cerrar la sesión.",
         responses={
             202: OpenApiResponse(description="Cierre de sesión exitoso. Cookie eliminada."),
-            403: OpenApiResponse(description="No autenticado. Cookie de cédula no encontrada o inválida."),
+            403: OpenApiResponse(description="No autenticado. Token de sesión no encontrado, inválido o expirado."),
         }
     )
     def get(self, request):
         """
         Maneja la solicitud GET para cerrar sesión.
 
-        Crea una respuesta 202 (Éxito) y elimina la cookie que contiene
-        la cédula del docente.
+        Crea una respuesta 202 (Éxito) y elimina la cookie con el token de
+        sesión del docente (y la cookie anterior con su cédula, si existe).
         """
         response = Response(status=202)
-        response.delete_cookie(settings.NOMBRE_COOKIE_DOCENTE)
+        cerrar_sesion(response)
         return response
 
 
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class GestionPlanesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "gestion_planes"
+
+    def ready(self):
+        from . import signals  # noqa: F401
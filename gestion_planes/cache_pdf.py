@@ -0,0 +1,199 @@
+from contextlib import contextmanager
+from io import BytesIO
+from os import replace, utime
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from threading import Lock
+from typing import Any, BinaryIO, Callable
+
+from django.conf import settings
+
+try:
+    from fcntl import flock, LOCK_EX, LOCK_UN
+except ImportError:  # Sin bloqueo entre procesos en sistemas sin fcntl
+    flock = None
+
+
+class CachePDF:
+    """Caché en disco de PDFs generados, direccionada por la huella del contenido del plan.
+
+    Los archivos se escriben de forma atómica (archivo temporal + `os.replace`), por lo que varios
+    procesos pueden escribir la misma huella al mismo tiempo sin dejar archivos a medias. Cuando el
+    tamaño total supera el máximo configurado se eliminan los archivos usados hace más tiempo (LRU),
+    usando la fecha de modificación del archivo como marca del último uso.
+
+    Para no recorrer el directorio en cada escritura, cada proceso lleva una estimación del tamaño
+    ocupado: el directorio solo se recorre cuando la estimación supera el máximo, y entonces se desaloja
+    hasta `FRACCION_DESALOJO` del máximo. Como cada proceso solo suma sus propias escrituras, con varios
+    procesos el directorio puede pasarse del máximo en hasta esa holgura por proceso.
+
+    Las cachés que comparten directorio (PDFs y vistas previas) comparten también el tamaño máximo: el
+    desalojo considera todos los archivos del directorio. La de páginas tiene su propio subdirectorio
+    y tamaño máximo (`ajuste_tamaño`), porque sus archivos son muchos y pequeños.
+    """
+
+    FRACCION_DESALOJO = 0.9
+
+    def __init__(self, extension: str = ".pdf", subdirectorio: str = "", ajuste_tamaño: str = "TAMAÑO_MAXIMO_CACHE_PDF"):
+        self.extension = extension
+        self.subdirectorio = subdirectorio
+        self.ajuste_tamaño = ajuste_tamaño
+        self._directorio: Path | None = None
+        self._candado = Lock()
+        self._en_curso: dict[str, list] = {}  # huella -> [candado, cantidad de hilos que lo usan]
+        self._ocupado: dict[Path, int] = {}  # directorio -> tamaño estimado de sus archivos
+
+    @property
+    def directorio(self) -> Path:
+        """`DIRECTORIO_CACHE_PDF` (más el subdirectorio), salvo que se asigne otro (como en los procesos de renderizado)."""
+        return self._directorio or Path(settings.DIRECTORIO_CACHE_PDF) / self.subdirectorio
+
+    @directorio.setter
+    def directorio(self, directorio: Path | None):
+        self._directorio = directorio
+
+    @property
+    def tamaño_maximo(self) -> int:
+        return getattr(settings, self.ajuste_tamaño)
+
+    def ruta(self, huella: str) -> Path:
+        """Ubicación del archivo correspondiente a una huella."""
+        return self.directorio / f"{huella}{self.extension}"
+
+    def obtener(self, huella: str) -> Path | None:
+        """Devuelve la ruta del PDF en caché (marcándolo como usado) o None si no existe."""
+        ruta = self.ruta(huella)
+        try:
+            utime(ruta)
+        except FileNotFoundError:
+            return None
+        return ruta
+
+    def leer(self, huella: str) -> bytes | None:
+        """Devuelve el contenido del archivo en caché (marcándolo como usado) o None si no existe."""
+        ruta = self.obtener(huella)
+        try:
+            return ruta.read_bytes() if ruta is not None else None
+        except FileNotFoundError:  # Desalojado por otro proceso
+            return None
+
+    def guardar(self, huella: str, contenido: BytesIO) -> Path:
+        """Guarda el PDF de forma atómica y aplica el desalojo por tamaño."""
+        return self.escribir(huella, lambda archivo: archivo.write(contenido.getbuffer()))
+
+    def escribir(self, huella: str, escribir: Callable[[BinaryIO], Any]) -> Path:
+        """Como `guardar`, pero el contenido lo escribe `escribir` directamente en el archivo (por partes)."""
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        ruta = self.ruta(huella)
+
+        with NamedTemporaryFile(dir=self.directorio, prefix=".tmp-", suffix=self.extension, delete=False) as temporal:
+            try:
+                escribir(temporal)
+            except BaseException:
+                temporal.close()
+                Path(temporal.name).unlink(missing_ok=True)
+                raise
+        replace(temporal.name, ruta)
+
+        # El directorio solo se recorre cuando la estimación supera el máximo (o aún no se conoce)
+        directorio = self.directorio
+        with self._candado:
+            ocupado = self._ocupado.get(directorio)
+            if ocupado is not None:
+                ocupado = self._ocupado[directorio] = ocupado + ruta.stat().st_size
+        if ocupado is None or ocupado > self.tamaño_maximo:
+            # El archivo recién escrito no se desaloja, aunque supere por sí solo el tamaño máximo
+            self.desalojar(conservar=ruta)
+        return ruta
+
+    def obtener_o_generar(self, huella: str, generar: Callable[[], BytesIO]) -> Path:
+        """Devuelve el PDF de la caché o lo genera, una sola vez aunque varios lo pidan al mismo tiempo.
+
+        Los hilos de este proceso que piden la misma huella esperan al que la está generando, y entre
+        procesos se usa un archivo de bloqueo en el directorio de la caché. Al obtener el bloqueo se
+        vuelve a revisar la caché, así quienes esperaban comparten el PDF ya generado. Si la generación
+        falla, el siguiente en espera lo intenta de nuevo.
+        """
+        return self.obtener_o_escribir(huella, lambda archivo: archivo.write(generar().getbuffer()))
+
+    def obtener_o_escribir(self, huella: str, escribir: Callable[[BinaryIO], Any]) -> Path:
+        """Como `obtener_o_generar`, pero el contenido lo escribe `escribir` directamente en el archivo."""
+        ruta = self.obtener(huella)
+        if ruta is not None:
+            return ruta
+
+        with self._bloqueo_hilos(huella), self._bloqueo_procesos(huella):
+            ruta = self.obtener(huella)
+            if ruta is None:
+                ruta = self.escribir(huella, escribir)
+            return ruta
+
+    @contextmanager
+    def _bloqueo_hilos(self, huella: str):
+        with self._candado:
+            entrada = self._en_curso.setdefault(huella, [Lock(), 0])
+            entrada[1] += 1
+        try:
+            with entrada[0]:
+                yield
+        finally:
+            with self._candado:
+                entrada[1] -= 1
+                if not entrada[1]:
+                    del self._en_curso[huella]
+
+    @contextmanager
+    def _bloqueo_procesos(self, huella: str):
+        if flock is None:
+            yield
+            return
+
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        ruta = self.directorio / f".lock-{huella}"
+        with open(ruta, "a") as archivo:
+            flock(archivo, LOCK_EX)
+            try:
+                yield
+            finally:
+                # Se elimina con el bloqueo tomado y el PDF ya guardado: quien abra un archivo nuevo
+                # encontrará el PDF en la caché al volver a revisarla.
+                ruta.unlink(missing_ok=True)
+                flock(archivo, LOCK_UN)
+
+    def desalojar(self, conservar: Path | None = None):
+        """Recorre el directorio y, si se pasa del tamaño máximo, elimina los archivos menos usados
+        recientemente (salvo `conservar`) hasta quedar en `FRACCION_DESALOJO` del máximo."""
+        directorio = self.directorio
+        archivos = []
+        for ruta in directorio.glob("*.*"):
+            if ruta.name.startswith(".") or ruta == conservar:  # Temporales, archivos de bloqueo y el recién escrito
+                continue
+            try:
+                estado = ruta.stat()
+            except FileNotFoundError:  # Eliminado por otro proceso
+                continue
+            archivos.append((estado.st_mtime_ns, estado.st_size, ruta))
+
+        total = sum(tamaño for _, tamaño, _ in archivos)
+        if conservar is not None:
+            try:
+                total += conservar.stat().st_size
+            except FileNotFoundError:
+                pass
+        if total > self.tamaño_maximo:
+            objetivo = self.tamaño_maximo * self.FRACCION_DESALOJO
+            for _, tamaño, ruta in sorted(archivos):
+                if total <= objetivo:
+                    break
+                ruta.unlink(missing_ok=True)
+                total -= tamaño
+
+        with self._candado:
+            self._ocupado[directorio] = total
+
+
+cache_pdf = CachePDF()
+# Flujos de contenido de páginas individuales, para regenerar solo las páginas que cambiaron
+cache_paginas = CachePDF(".pagina", subdirectorio="paginas", ajuste_tamaño="TAMAÑO_MAXIMO_CACHE_PAGINAS_PDF")
+# Imágenes de vista previa de páginas
+cache_vistas = CachePDF(".png")
@@ -0,0 +1,99 @@
+from hashlib import sha256
+from io import BytesIO
+from json import dumps
+from pathlib import Path
+from typing import Callable
+
+from pypdf import PdfWriter
+
+from .cache_pdf import cache_pdf
+from .models import VERSION_GENERADOR_PDF, PlanAprendizaje, PlanEvaluacion
+from .salida_pdf import escribir_pdf
+
+
+class ExpedientePDF:
+    """PDF combinado de un grupo: el plan de aprendizaje seguido de su plan de evaluación.
+
+    El árbol del plan se carga una sola vez (el plan de evaluación reutiliza el plan de aprendizaje y sus
+    objetivos ya cargados), los datos se validan una sola vez y ambas plantillas se combinan en un mismo
+    documento, con un marcador por sección si `marcadores` es verdadero.
+
+    Se exporta igual que un plan (`exportar_pdf`), por lo que también puede generarse en los procesos
+    de `renderizador.py`.
+    """
+
+    def __init__(self, pa: PlanAprendizaje, pe: PlanEvaluacion, marcadores: bool = True):
+        # El plan de evaluación usa la misma instancia del plan de aprendizaje (docente y UC ya cargados)
+        pe.plan_aprendizaje = pa
+        self.pa = pa
+        self.pe = pe
+        self.marcadores = marcadores
+
+    @classmethod
+    def del_grupo(cls, pa: PlanAprendizaje, marcadores: bool = True) -> "ExpedientePDF":
+        """Crea el expediente de un plan de aprendizaje obtenido con `consulta_exportacion`.
+
+        Lanza PlanEvaluacion.DoesNotExist si el plan no tiene plan de evaluación.
+        """
+        return cls(pa, PlanEvaluacion.objects.get(plan_aprendizaje=pa), marcadores)
+
+    @property
+    def nombre_archivo_pdf(self) -> str:
+        return f"expediente_{self.pa.codigo_grupo}.pdf"
+
+    def obtener_items_pdf(self) -> tuple[tuple, tuple]:
+        """Objetivos del plan de aprendizaje e items del plan de evaluación (con sus objetivos)."""
+        return self.pa.obtener_items_pdf(), self.pe.obtener_items_pdf()
+
+    def validar_datos_para_exportar(self, items: tuple[tuple, tuple]):
+        """Valida ambos planes en una sola pasada.
+
+        La validación del plan de aprendizaje ya cubre los objetivos sin evaluación asociada, que el
+        plan de evaluación volvería a consultar; de este solo falta validar el peso total.
+        """
+        objetivos, items_pe = items
+        self.pa.validar_datos_para_exportar(objetivos)
+        self.pe.validar_peso_total(items_pe)
+
+    def huella_pdf(self, items: tuple[tuple, tuple]) -> str:
+        """Hash del expediente a partir de las huellas de ambos planes."""
+        objetivos, items_pe = items
+        huella = sha256()
+        huella.update(dumps((
+            VERSION_GENERADOR_PDF,
+            self.__class__.__name__,
+            self.marcadores,
+            self.pa.huella_pdf(objetivos),
+            self.pe.huella_pdf(items_pe),
+        )).encode())
+        return huella.hexdigest()
+
+    def renderizar_pdf(self, items: tuple[tuple, tuple]) -> BytesIO:
+        """Genera ambos planes, a partir de items ya validados, en un mismo documento."""
+        objetivos, items_pe = items
+        salida = PdfWriter()
+        paginas_pa = self.pa.agregar_paginas(salida, objetivos)
+        self.pe.agregar_paginas(salida, items_pe)
+
+        if self.marcadores:
+            salida.add_outline_item("Plan de Aprendizaje", 0)
+            salida.add_outline_item("Plan de Evaluación", paginas_pa)
+            salida.page_mode = "/UseOutlines"
+
+        return escribir_pdf(salida)
+
+    def generar_pdf(self) -> BytesIO:
+        """Valida los datos y genera el expediente sin pasar por la caché."""
+        items = self.obtener_items_pdf()
+        self.validar_datos_para_exportar(items)
+        return self.renderizar_pdf(items)
+
+    def exportar_pdf(self, renderizar: Callable[["ExpedientePDF", tuple], BytesIO] = None) -> Path:
+        """Valida los datos y devuelve la ruta del expediente, generándolo solo si no está en la caché."""
+        items = self.obtener_items_pdf()
+        self.validar_datos_para_exportar(items)
+
+        huella = self.huella_pdf(items)
+        return cache_pdf.obtener_o_generar(
+            huella, lambda: renderizar(self, items) if renderizar else self.renderizar_pdf(items)
+        )
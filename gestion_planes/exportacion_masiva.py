@@ -0,0 +1,226 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import closing
+from json import dumps
+from multiprocessing import get_context
+from shutil import copyfileobj
+from threading import Lock
+from time import localtime
+from typing import Any, Callable, Iterator
+from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED
+
+from django.conf import settings
+
+from .models import PlanAprendizaje, PlanEvaluacion
+from .procesos_pdf import iniciar_proceso, exportar_plan
+from .renderizador import GrupoProcesosPDF, RenderizadoNoDisponible
+
+
+class SalidaZIP:
+    """Destino no posicionable para `ZipFile` que acumula lo escrito hasta que se consume."""
+
+    def __init__(self):
+        self._bloques: list[bytes] = []
+
+    def write(self, datos: bytes) -> int:
+        self._bloques.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def consumir(self) -> bytes:
+        datos = b"".join(self._bloques)
+        self._bloques.clear()
+        return datos
+
+
+def seleccionar_planes(
+    docente: int | None = None,
+    nucleo: str | None = None,
+    turno: str | None = None,
+    unidad_curricular: str | None = None,
+    tipo: str | None = None,
+) -> list[tuple[str, Any]]:
+    """Devuelve los planes que cumplen los filtros como pares (modelo, clave primaria).
+
+    El tipo puede ser "pa" (planes de aprendizaje), "pe" (planes de evaluación) o ninguno (ambos).
+    """
+    filtros = {
+        "docente": docente,
+        "nucleo": nucleo,
+        "turno": turno,
+        "unidad_curricular": unidad_curricular,
+    }
+    filtros = {campo: valor for campo, valor in filtros.items() if valor is not None}
+
+    planes = []
+    if tipo in (None, "pa"):
+        codigos = PlanAprendizaje.objects.filter(**filtros).order_by("codigo_grupo").values_list("pk", flat=True)
+        planes += [(PlanAprendizaje._meta.label, pk) for pk in codigos]
+    if tipo in (None, "pe"):
+        filtros_pe = {f"plan_aprendizaje__{campo}": valor for campo, valor in filtros.items()}
+        ids = PlanEvaluacion.objects.filter(**filtros_pe).order_by("plan_aprendizaje").values_list("pk", flat=True)
+        planes += [(PlanEvaluacion._meta.label, pk) for pk in ids]
+    return planes
+
+
+def _exportar_planes(planes: list[tuple[str, Any]], procesos: int, avance=None) -> Iterator[dict]:
+    """Genera los PDFs de los planes en `procesos` procesos propios y los devuelve a medida que terminan."""
+    if procesos < 1:
+        for modelo, pk in planes:
+            yield exportar_plan(modelo, pk, avance)
+        return
+
+    # Se usa "spawn" para que los procesos no hereden las conexiones a la base de datos del proceso web.
+    ejecutor = ProcessPoolExecutor(procesos, mp_context=get_context("spawn"), initializer=iniciar_proceso)
+    try:
+        pendientes = [ejecutor.submit(exportar_plan, modelo, pk, avance) for modelo, pk in planes]
+        for pendiente in as_completed(pendientes):
+            yield pendiente.result()
+    finally:
+        ejecutor.shutdown(wait=False, cancel_futures=True)
+
+
+class CupoExportacion:
+    """Cupo reservado para una exportación en `GrupoExportacionPDF`; `liberar` se puede llamar más de una vez."""
+
+    def __init__(self, liberar: Callable[[], None]):
+        self._liberar = liberar
+        self._candado = Lock()
+
+    def liberar(self):
+        with self._candado:
+            liberar, self._liberar = self._liberar, None
+        if liberar is not None:
+            liberar()
+
+
+class ContenidoConCupo:
+    """Contenido de una respuesta por partes que libera el cupo de su exportación al cerrarse.
+
+    Django cierra la respuesta al terminar de enviarla o si se interrumpe, aunque el contenido no se
+    haya empezado a recorrer (en cuyo caso un generador no ejecutaría su `finally`).
+    """
+
+    def __init__(self, partes: Iterator[bytes], cupo: CupoExportacion):
+        self._partes = partes
+        self._cupo = cupo
+
+    def __iter__(self) -> Iterator[bytes]:
+        return self._partes
+
+    def close(self):
+        try:
+            self._partes.close()
+        finally:
+            self._cupo.liberar()
+
+
+class GrupoExportacionPDF(GrupoProcesosPDF):
+    """Procesos que generan los PDFs de las exportaciones masivas, compartidos por todas las exportaciones
+    de este proceso web (descargas de ZIP y trabajos de exportación).
+
+    Cada exportación reserva un cupo (`reservar`) antes de empezar: como máximo hay
+    `EXPORTACIONES_SIMULTANEAS_PDF` exportaciones en curso, que reparten sus planes entre los mismos
+    `PROCESOS_EXPORTACION_PDF` procesos. Sin cupos libres se lanza `RenderizadoNoDisponible` (503 con
+    `Retry-After`) en lugar de crear más procesos.
+    """
+
+    def cantidad_procesos(self) -> int:
+        return settings.PROCESOS_EXPORTACION_PDF
+
+    def cantidad_cupos(self) -> int:
+        return settings.EXPORTACIONES_SIMULTANEAS_PDF
+
+    def reservar(self, esperar: bool = False) -> CupoExportacion:
+        """Reserva un cupo para una exportación, esperando a que se libere uno si `esperar` es verdadero."""
+        if settings.PROCESOS_EXPORTACION_PDF < 1:
+            return CupoExportacion(lambda: None)
+
+        _, cupos = self._obtener()
+        if not cupos.acquire(blocking=esperar):
+            raise RenderizadoNoDisponible("Hay demasiadas exportaciones en curso, intente nuevamente en unos segundos.")
+        return CupoExportacion(cupos.release)
+
+    def exportar(self, planes: list[tuple[str, Any]], avance=None) -> Iterator[dict]:
+        """Genera los PDFs de los planes en los procesos y los devuelve a medida que terminan.
+
+        Con `PROCESOS_EXPORTACION_PDF` en 0 se generan en este mismo hilo. `avance` se envía a cada
+        proceso (ver `exportar_plan`).
+        """
+        if settings.PROCESOS_EXPORTACION_PDF < 1:
+            yield from _exportar_planes(planes, 0, avance)
+            return
+
+        ejecutor, _ = self._obtener()
+        pendientes = []
+        try:
+            for modelo, pk in planes:
+                pendientes.append(ejecutor.submit(exportar_plan, modelo, pk, avance))
+            for pendiente in as_completed(pendientes):
+                yield pendiente.result()
+        except (BrokenProcessPool, RuntimeError):
+            self._reiniciar(ejecutor)
+            raise RenderizadoNoDisponible()
+        finally:
+            # Si la exportación se interrumpe, sus planes pendientes no ocupan los procesos de las demás
+            for pendiente in pendientes:
+                pendiente.cancel()
+
+
+grupo_exportacion_pdf = GrupoExportacionPDF()
+
+
+def generar_zip(
+    planes: list[tuple[str, Any]],
+    procesos: int | None = None,
+    al_exportar: Callable[[dict], None] | None = None,
+    avance=None,
+) -> Iterator[bytes]:
+    """Genera un ZIP con los PDFs de los planes por partes, sin mantener el archivo completo en memoria.
+
+    Cada PDF se agrega al ZIP en cuanto termina de generarse. Los planes que no son exportables se
+    registran en `manifiesto.json` en lugar de interrumpir la exportación. `al_exportar` recibe la
+    entrada del manifiesto de cada plan procesado (exportado u omitido) y `avance` cada página generada
+    (ver `exportar_plan`).
+
+    Los PDFs se generan en los procesos compartidos de `grupo_exportacion_pdf` (quien llama debe haber
+    reservado un cupo), o en `procesos` procesos propios si se indica (como en el comando `exportar_planes`).
+    """
+    if procesos is None:
+        entradas: Iterator[dict] = grupo_exportacion_pdf.exportar(planes, avance)
+    else:
+        entradas = _exportar_planes(planes, procesos, avance)
+
+    salida = SalidaZIP()
+    manifiesto = {"exportados": [], "omitidos": []}
+
+    # `closing` cancela los planes pendientes si el ZIP se interrumpe
+    with closing(entradas), ZipFile(salida, mode="w", compression=ZIP_DEFLATED) as archivo_zip:
+        for entrada in entradas:
+            if al_exportar is not None:
+                al_exportar(entrada)
+
+            entrada.pop("paginas_generadas", None)
+            ruta = entrada.pop("ruta", None)
+            if ruta is None:
+                manifiesto["omitidos"].append(entrada)
+                continue
+
+            try:
+                info = ZipInfo(entrada["archivo"], date_time=localtime()[:6])
+                info.compress_type = ZIP_DEFLATED
+                with open(ruta, "rb") as pdf, archivo_zip.open(info, "w", force_zip64=True) as destino:
+                    copyfileobj(pdf, destino)
+            except FileNotFoundError:  # Desalojado de la caché antes de copiarse
+                entrada["error"] = "El PDF generado no se encontró en la caché."
+                manifiesto["omitidos"].append(entrada)
+                continue
+
+            manifiesto["exportados"].append(entrada)
+            yield salida.consumir()
+
+        archivo_zip.writestr("manifiesto.json", dumps(manifiesto, ensure_ascii=False, indent=2))
+
+    yield salida.consumir()
@@ -0,0 +1,210 @@
+from datetime import timedelta
+from logging import getLogger
+from os import getpid, replace
+from pathlib import Path
+from queue import Empty, Queue
+from shutil import copyfileobj
+from tempfile import NamedTemporaryFile
+from threading import Thread
+from time import monotonic
+from typing import Any
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils.timezone import now
+
+from rest_framework.serializers import ValidationError
+
+from .models import TrabajoExportacion
+from .exportacion_masiva import generar_zip, grupo_exportacion_pdf
+from .procesos_pdf import exportar_plan
+
+
+logger = getLogger(__name__)
+
+
+def contar_paginas(modelo: str, pk: Any) -> int:
+    """Cantidad de páginas del PDF de un plan, 0 si el plan no existe o no es exportable."""
+    try:
+        plan = apps.get_model(modelo).consulta_exportacion().get(pk=pk)
+        items = plan.obtener_items_pdf()
+        plan.validar_datos_para_exportar(items)
+    except (ObjectDoesNotExist, ValidationError):
+        return 0
+    return len(plan.paginar(tuple(enumerate(items, 1))))
+
+
+class AvanceTrabajo:
+    """Suma al progreso de un trabajo cada página generada, con a lo sumo una actualización cada `INTERVALO` segundos.
+
+    Solo guarda el id del trabajo, así que se puede enviar a los procesos de exportación, que actualizan
+    el trabajo directamente desde el ciclo que genera las páginas.
+    """
+
+    INTERVALO = 1
+
+    def __init__(self, trabajo_id):
+        self.trabajo_id = trabajo_id
+        self._pendientes = 0
+        self._ultima = 0.0
+
+    def __call__(self, paginas: int = 1):
+        self._pendientes += paginas
+        if monotonic() - self._ultima >= self.INTERVALO:
+            self.guardar()
+
+    def guardar(self):
+        """Guarda las páginas aún no informadas (también renueva la señal de avance del trabajo)."""
+        TrabajoExportacion.objects.filter(pk=self.trabajo_id).update(
+            paginas_generadas=F("paginas_generadas") + self._pendientes, fecha_actualizacion=now()
+        )
+        self._pendientes = 0
+        self._ultima = monotonic()
+
+
+def _escribir_archivo(trabajo: TrabajoExportacion, paginas: dict[tuple, int]) -> str:
+    """Genera el archivo del trabajo en un temporal del directorio de exportaciones y devuelve su nombre de descarga."""
+    avance = AvanceTrabajo(trabajo.pk)
+
+    def avanzar(entrada: dict):
+        # Las páginas que no se informaron al generarse (el PDF ya estaba en la caché) se suman al terminar el plan
+        if "ruta" in entrada:
+            restantes = paginas[(entrada["modelo"], entrada["id"])] - entrada.get("paginas_generadas", 0)
+            avance(max(restantes, 0))
+            avance.guardar()
+
+    directorio = trabajo.ruta_archivo.parent
+    directorio.mkdir(parents=True, exist_ok=True)
+    with NamedTemporaryFile(dir=directorio, prefix=".tmp-", delete=False) as temporal:
+        try:
+            if len(trabajo.planes) == 1:
+                entrada = exportar_plan(*trabajo.planes[0], avance)
+                if "error" in entrada:
+                    raise ValidationError(entrada["error"])
+                with open(entrada["ruta"], "rb") as pdf:
+                    copyfileobj(pdf, temporal)
+                avanzar(entrada)
+                nombre = Path(entrada["archivo"]).name
+            else:
+                # Los trabajos esperan un cupo libre en lugar de fallar como las descargas directas
+                cupo = grupo_exportacion_pdf.reservar(esperar=True)
+                try:
+                    for bloque in generar_zip([tuple(plan) for plan in trabajo.planes], al_exportar=avanzar, avance=avance):
+                        temporal.write(bloque)
+                finally:
+                    cupo.liberar()
+                nombre = "planes.zip"
+        except BaseException:
+            Path(temporal.name).unlink(missing_ok=True)
+            raise
+    replace(temporal.name, trabajo.ruta_archivo)
+    return nombre
+
+
+def ejecutar_trabajo(trabajo_id) -> bool:
+    """Ejecuta un trabajo pendiente. Devuelve False si otro proceso ya lo tomó."""
+    # La actualización condicional garantiza que un solo trabajador tome el trabajo
+    if not TrabajoExportacion.objects.filter(pk=trabajo_id, estado='PEN').update(estado='PRO', fecha_actualizacion=now()):
+        return False
+    trabajo = TrabajoExportacion.objects.get(pk=trabajo_id)
+
+    # Cualquier error (también al contar las páginas) termina el trabajo en lugar de dejarlo en proceso
+    try:
+        paginas = {(modelo, pk): contar_paginas(modelo, pk) for modelo, pk in trabajo.planes}
+        trabajo.paginas_totales = sum(paginas.values())
+        trabajo.save(update_fields=["paginas_totales"])
+        trabajo.nombre_archivo = _escribir_archivo(trabajo, paginas)
+    except ValidationError as error:
+        trabajo.estado = 'ERR'
+        trabajo.error = " ".join(str(detalle) for detalle in error.detail)
+    except Exception as error:
+        trabajo.estado = 'ERR'
+        trabajo.error = f"No se pudo generar la exportación: {error}"
+    else:
+        trabajo.estado = 'COM'
+        trabajo.paginas_generadas = trabajo.paginas_totales
+        trabajo.fecha_expiracion = now() + timedelta(hours=settings.HORAS_VIGENCIA_EXPORTACIONES)
+
+    trabajo.fecha_finalizacion = now()
+    trabajo.save(update_fields=["estado", "error", "nombre_archivo", "paginas_generadas", "fecha_finalizacion", "fecha_expiracion"])
+    return True
+
+
+def recuperar_trabajos() -> int:
+    """Devuelve a la cola los trabajos en proceso que no avanzan hace más de `MINUTOS_ABANDONO_EXPORTACIONES`
+    (su proceso terminó a mitad del trabajo). Devuelve cuántos recuperó."""
+    limite = now() - timedelta(minutes=settings.MINUTOS_ABANDONO_EXPORTACIONES)
+    abandonados = TrabajoExportacion.objects.filter(
+        Q(fecha_actualizacion__lte=limite) | Q(fecha_actualizacion__isnull=True), estado='PRO'
+    )
+    return abandonados.update(estado='PEN', paginas_generadas=0)
+
+
+def ejecutar_pendientes() -> int:
+    """Recupera los trabajos abandonados, elimina los vencidos y ejecuta los pendientes en orden de
+    creación. Devuelve cuántos trabajos ejecutó."""
+    recuperar_trabajos()
+    expirar_trabajos()
+    pendientes = TrabajoExportacion.objects.filter(estado='PEN').order_by('fecha_creacion').values_list('pk', flat=True)
+    return sum(ejecutar_trabajo(trabajo_id) for trabajo_id in list(pendientes))
+
+
+def expirar_trabajos() -> int:
+    """Elimina los archivos de los trabajos vencidos y los marca como expirados. Devuelve cuántos expiraron."""
+    vencidos = TrabajoExportacion.objects.filter(estado='COM', fecha_expiracion__lte=now())
+    for trabajo in vencidos:
+        trabajo.ruta_archivo.unlink(missing_ok=True)
+    return vencidos.update(estado='EXP')
+
+
+class TrabajadorExportaciones:
+    """Hilo local que ejecuta los trabajos de exportación en orden, sin un intermediario externo.
+
+    El hilo se inicia con el primer trabajo que se crea en el proceso web. Al iniciarse, y cada
+    `INTERVALO_REVISION` segundos sin trabajos nuevos, ejecuta los pendientes (también los que otro
+    proceso abandonó) y elimina los archivos vencidos. Para no depender de que llegue un trabajo nuevo
+    tras reiniciar el servidor, el comando `procesar_exportaciones` hace lo mismo en un proceso aparte.
+    """
+
+    INTERVALO_REVISION = 600
+
+    def __init__(self):
+        self._cola: Queue = Queue()
+        self._pid = None
+
+    def encolar(self, trabajo_id):
+        """Encola el trabajo cuando se confirme la transacción actual."""
+        transaction.on_commit(lambda: self._encolar(trabajo_id))
+
+    def _encolar(self, trabajo_id):
+        if self._pid != getpid():
+            self._pid = getpid()
+            self._cola = Queue()
+            Thread(target=self._trabajar, name="trabajador-exportaciones", daemon=True).start()
+        self._cola.put(trabajo_id)
+
+    def _trabajar(self):
+        cola = self._cola
+        trabajo_id = None  # Al iniciarse se revisan los pendientes
+        while True:
+            try:
+                if trabajo_id is None:
+                    ejecutar_pendientes()
+                else:
+                    expirar_trabajos()
+                    ejecutar_trabajo(trabajo_id)
+            except Exception:  # Un trabajo con errores no debe detener al trabajador
+                logger.exception("Error al ejecutar el trabajo de exportación %s", trabajo_id)
+            finally:
+                close_old_connections()
+
+            try:
+                trabajo_id = cola.get(timeout=self.INTERVALO_REVISION)
+            except Empty:
+                trabajo_id = None
+
+
+trabajador_exportaciones = TrabajadorExportaciones()
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from gestion_planes.exportacion_masiva import seleccionar_planes, generar_zip
+from gestion_planes.models import OPCIONES_NUCLEO, OPCIONES_TURNO
+from gestion_planes.utils import obtener_valores_de_opciones
+
+
+class Command(BaseCommand):
+    help = "Exporta en un ZIP los PDFs de los planes seleccionados por docente, núcleo, turno o unidad curricular."
+
+    def add_arguments(self, parser):
+        parser.add_argument("salida", help="Ruta del archivo ZIP a generar.")
+        parser.add_argument("--docente", type=int, help="Cédula del docente.")
+        parser.add_argument("--nucleo", choices=obtener_valores_de_opciones(OPCIONES_NUCLEO))
+        parser.add_argument("--turno", choices=obtener_valores_de_opciones(OPCIONES_TURNO))
+        parser.add_argument("--unidad-curricular", help="Código de la unidad curricular.")
+        parser.add_argument("--tipo", choices=["pa", "pe"], help="Exportar solo planes de aprendizaje o de evaluación.")
+        parser.add_argument("--procesos", type=int, default=settings.PROCESOS_EXPORTACION_PDF)
+
+    def handle(self, *args, **opciones):
+        planes = seleccionar_planes(
+            docente=opciones["docente"],
+            nucleo=opciones["nucleo"],
+            turno=opciones["turno"],
+            unidad_curricular=opciones["unidad_curricular"],
+            tipo=opciones["tipo"],
+        )
+
+        with open(opciones["salida"], "wb") as salida:
+            for parte in generar_zip(planes, opciones["procesos"]):
+                salida.write(parte)
+
+        self.stdout.write(self.style.SUCCESS(f"{len(planes)} planes procesados en {opciones['salida']}."))
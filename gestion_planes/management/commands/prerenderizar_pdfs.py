@@ -0,0 +1,33 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from gestion_planes.models import PlanAprendizaje
+from gestion_planes.prerenderizado import prerenderizar_grupo
+
+
+def _prerenderizar(codigo_grupo: str) -> int:
+    try:
+        return prerenderizar_grupo(codigo_grupo)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = "Genera en la caché los PDFs de todos los planes exportables."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--docente", type=int, help="Cédula del docente cuyos planes se generan.")
+        parser.add_argument("--hilos", type=int, default=1, help="Cantidad de hilos para generar los PDFs.")
+
+    def handle(self, *args, **opciones):
+        planes = PlanAprendizaje.objects.order_by("codigo_grupo")
+        if opciones["docente"]:
+            planes = planes.filter(docente=opciones["docente"])
+        codigos = list(planes.values_list("codigo_grupo", flat=True))
+
+        with ThreadPoolExecutor(max(opciones["hilos"], 1)) as hilos:
+            listos = sum(hilos.map(_prerenderizar, codigos))
+
+        self.stdout.write(self.style.SUCCESS(f"{listos} PDFs listos en la caché para {len(codigos)} grupos."))
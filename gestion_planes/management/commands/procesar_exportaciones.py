@@ -0,0 +1,29 @@
+from time import sleep
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from gestion_planes.exportaciones import ejecutar_pendientes
+
+
+class Command(BaseCommand):
+    help = (
+        "Ejecuta los trabajos de exportación pendientes (también los abandonados por un proceso que terminó) "
+        "y elimina los vencidos, revisando la base de datos cada cierto intervalo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--intervalo", type=float, default=5, help="Segundos entre cada revisión de los trabajos.")
+        parser.add_argument("--una-vez", action="store_true", help="Revisa los trabajos una sola vez y termina.")
+
+    def handle(self, *args, **opciones):
+        while True:
+            try:
+                ejecutados = ejecutar_pendientes()
+            finally:
+                close_old_connections()
+            if ejecutados:
+                self.stdout.write(f"{ejecutados} trabajos de exportación ejecutados.")
+            if opciones["una_vez"]:
+                break
+            sleep(opciones["intervalo"])
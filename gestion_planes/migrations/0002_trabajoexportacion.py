@@ -0,0 +1,67 @@
+# Generated by Django 5.1.6 on 2026-10-17 19:25
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("autenticacion_docente", "0001_initial"),
+        ("gestion_planes", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TrabajoExportacion",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("planes", models.JSONField(default=list)),
+                (
+                    "estado",
+                    models.CharField(
+                        choices=[
+                            ("PEN", "Pendiente"),
+                            ("PRO", "En proceso"),
+                            ("COM", "Completado"),
+                            ("ERR", "Fallido"),
+                            ("EXP", "Expirado"),
+                        ],
+                        default="PEN",
+                        max_length=3,
+                    ),
+                ),
+                ("paginas_generadas", models.PositiveIntegerField(default=0)),
+                ("paginas_totales", models.PositiveIntegerField(default=0)),
+                ("nombre_archivo", models.CharField(blank=True, max_length=128)),
+                ("error", models.TextField(blank=True)),
+                (
+                    "fecha_creacion",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("fecha_finalizacion", models.DateTimeField(null=True)),
+                ("fecha_expiracion", models.DateTimeField(null=True)),
+                (
+                    "docente",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="autenticacion_docente.docente",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "trabajos_de_exportacion",
+                "ordering": ["-fecha_creacion"],
+            },
+        ),
+    ]
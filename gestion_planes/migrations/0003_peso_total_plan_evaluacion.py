@@ -0,0 +1,43 @@
+# Generated by Django 5.1.6 on 2026-10-17 20:12
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def calcular_peso_total(apps, schema_editor):
+    """Guarda en cada plan la suma de los pesos de sus items."""
+    PlanEvaluacion = apps.get_model("gestion_planes", "PlanEvaluacion")
+    ItemPlanEvaluacion = apps.get_model("gestion_planes", "ItemPlanEvaluacion")
+    suma = (
+        ItemPlanEvaluacion.objects.filter(plan_evaluacion=OuterRef("pk"))
+        .order_by()
+        .values("plan_evaluacion")
+        .annotate(suma=Sum("peso"))
+        .values("suma")
+    )
+    PlanEvaluacion.objects.update(peso_total=Coalesce(Subquery(suma), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gestion_planes", "0002_trabajoexportacion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="planevaluacion",
+            name="peso_total",
+            field=models.SmallIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(calcular_peso_total, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="planevaluacion",
+            constraint=models.CheckConstraint(
+                condition=models.Q(("peso_total__gte", 0), ("peso_total__lte", 100)),
+                name="validar_peso_total",
+                violation_error_message="El peso total de un plan de evaluación debe estar entre 0% y 100%",
+            ),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.6 on 2026-10-17 21:05
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def calcular_contadores(apps, schema_editor):
+    """Guarda en cada plan de aprendizaje la cantidad de objetivos y de objetivos sin evaluación asociada."""
+    PlanAprendizaje = apps.get_model("gestion_planes", "PlanAprendizaje")
+    ObjetivoPlanAprendizaje = apps.get_model("gestion_planes", "ObjetivoPlanAprendizaje")
+
+    def contar(filtro=Q()):
+        return Coalesce(Subquery(
+            ObjetivoPlanAprendizaje.objects.filter(filtro, plan_aprendizaje=OuterRef("pk"))
+            .order_by()
+            .values("plan_aprendizaje")
+            .annotate(cantidad=Count("pk"))
+            .values("cantidad")
+        ), 0)
+
+    PlanAprendizaje.objects.update(
+        total_objetivos=contar(),
+        objetivos_sin_evaluacion=contar(Q(evaluacion_asociada__isnull=True)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gestion_planes", "0003_peso_total_plan_evaluacion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="planaprendizaje",
+            name="total_objetivos",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="planaprendizaje",
+            name="objetivos_sin_evaluacion",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(calcular_contadores, migrations.RunPython.noop),
+    ]
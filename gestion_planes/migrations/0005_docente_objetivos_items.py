@@ -0,0 +1,80 @@
+# Generated by Django 5.1.6 on 2026-10-17 21:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copiar_docente(apps, schema_editor):
+    """Copia en cada objetivo e item el docente de su plan de aprendizaje."""
+    PlanAprendizaje = apps.get_model("gestion_planes", "PlanAprendizaje")
+    ObjetivoPlanAprendizaje = apps.get_model("gestion_planes", "ObjetivoPlanAprendizaje")
+    ItemPlanEvaluacion = apps.get_model("gestion_planes", "ItemPlanEvaluacion")
+    ObjetivoPlanAprendizaje.objects.update(docente=Subquery(
+        PlanAprendizaje.objects.filter(pk=OuterRef("plan_aprendizaje")).values("docente")
+    ))
+    ItemPlanEvaluacion.objects.update(docente=Subquery(
+        PlanAprendizaje.objects.filter(planevaluacion=OuterRef("plan_evaluacion")).values("docente")
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("autenticacion_docente", "0001_initial"),
+        ("gestion_planes", "0004_contadores_plan_aprendizaje"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="objetivoplanaprendizaje",
+            name="docente",
+            field=models.ForeignKey(
+                db_index=False,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="autenticacion_docente.docente",
+            ),
+        ),
+        migrations.AddField(
+            model_name="itemplanevaluacion",
+            name="docente",
+            field=models.ForeignKey(
+                db_index=False,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="autenticacion_docente.docente",
+            ),
+        ),
+        migrations.RunPython(copiar_docente, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="objetivoplanaprendizaje",
+            name="docente",
+            field=models.ForeignKey(
+                db_index=False,
+                editable=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="autenticacion_docente.docente",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="itemplanevaluacion",
+            name="docente",
+            field=models.ForeignKey(
+                db_index=False,
+                editable=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="autenticacion_docente.docente",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="objetivoplanaprendizaje",
+            index=models.Index(fields=["docente", "id"], name="objetivos_pa_docente_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="itemplanevaluacion",
+            index=models.Index(fields=["docente", "id"], name="items_pe_docente_idx"),
+        ),
+    ]
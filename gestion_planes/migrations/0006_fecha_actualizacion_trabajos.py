@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-17 22:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gestion_planes", "0005_docente_objetivos_items"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="trabajoexportacion",
+            name="fecha_actualizacion",
+            field=models.DateTimeField(null=True),
+        ),
+    ]
@@ -1,9 +1,12 @@
-from typing import Iterable, Any
+from gc import collect
+from itertools import islice
+from typing import Any, BinaryIO, Callable, Iterable, Iterator
 from datetime import date
-from math import ceil
 from pathlib import Path
+from uuid import uuid4
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils.timezone import now
 from django.conf import settings
@@ -12,13 +15,72 @@ from rest_framework.serializers import ValidationError
 
 from autenticacion_docente.models import Docente
 
-from pypdf import PdfReader, PdfWriter
+from pypdf import PdfReader, PdfWriter, PageObject
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import landscape, letter
 from reportlab.lib.colors import black
 from io import BytesIO
 
-from .utils import dibujar_multi_linea, ajustar_texto_pdf, obtener_valores_de_opciones
+from .utils import ajustar_texto, dibujar_texto_ajustado, obtener_valores_de_opciones, TextoAjustado
+from .plantillas import registro_plantillas, registro_encabezados, PlantillaEncabezadaPDF
+from .cache_pdf import cache_pdf, cache_paginas
+from .salida_pdf import escribir_pdf, EscritorPDFEnFlujo
+
+from hashlib import sha256
+from json import dumps
+
+
+# Se debe incrementar cuando cambie la forma de dibujar los PDFs, para invalidar los archivos en caché.
+VERSION_GENERADOR_PDF = 5
+
+
+class CamposMantenidosMixin:
+    """Modelos con columnas (contadores) que solo se modifican con sentencias UPDATE atómicas.
+
+    Al actualizar una instancia, `save` omite esas columnas, así una instancia cargada antes de un cambio en
+    los contadores no los pisa con sus valores viejos.
+    """
+
+    campos_mantenidos: tuple[str, ...] = ()
+
+    def save(self, *args, **kwargs) -> None:
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                campo.name for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.name not in self.campos_mantenidos
+            ]
+        return super().save(*args, **kwargs)
+
+
+class ReasignacionDocenteMixin:
+    """Planes de los que sale el `docente` copiado en sus filas (objetivos o items), que permite limitar las
+    consultas de las filas por docente sin unir tablas.
+
+    `campo_origen_docente` es la columna de la que depende el docente del plan. Si cambió al guardar, `save`
+    llama a `propagar_docente` en la misma transacción para actualizar las filas.
+    """
+
+    campo_origen_docente: str = 'docente_id'
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Valor guardado, para saber al guardar si cambió (None si no se cargó)
+        instancia._origen_docente_guardado = dict(zip(field_names, values)).get(cls.campo_origen_docente)
+        return instancia
+
+    def propagar_docente(self):
+        """Copia el docente del plan en sus filas."""
+        ...
+
+    def save(self, *args, **kwargs) -> None:
+        origen = getattr(self, self.campo_origen_docente)
+        reasignado = not self._state.adding and getattr(self, '_origen_docente_guardado', None) != origen
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if reasignado:
+                self.propagar_docente()
+        self._origen_docente_guardado = origen
 
 
 class ExportablePDFMixin:
@@ -29,10 +91,35 @@ class ExportablePDFMixin:
         """ Ubicación de la plantilla. """
         return settings.BASE_DIR / "gestion_planes" / "pdfs" / f"{self.__class__.__name__.lower()}.pdf"
 
+    @property
+    def nombre_archivo_pdf(self) -> str:
+        """ Nombre con el que se descarga el PDF. """
+        ...
+
+    @property
+    def nombre_archivo_zip(self) -> str:
+        """ Ruta del PDF dentro de una exportación masiva, agrupada por código de grupo. """
+        ...
+
     @property
     def maximo_objetos_por_pagina(self):
-        """ La cantidad máxima de objetivos que pueden haber en una página del PDF. """
-        return 6
+        """ La cantidad máxima de objetivos que pueden haber en una página del PDF (la paginación depende del alto de cada fila). """
+        return 20
+
+    @property
+    def inicio_tabla_y(self) -> float:
+        """Coordenada Y de la primera linea de la tabla."""
+        return 412
+
+    @property
+    def limite_tabla_y(self) -> float:
+        """Coordenada Y mínima para la última linea de texto de la tabla (borde inferior de la plantilla)."""
+        return 84
+
+    @property
+    def separacion_filas(self) -> float:
+        """Espacio vertical entre filas de la tabla."""
+        return 10
 
     @property
     def desviacion_y(self):
@@ -50,91 +137,344 @@ class ExportablePDFMixin:
         - nombre_docente
         """
 
+        pnf, nucleo, turno, uc, docente, fecha = self.valores_encabezado()
+
         # Escribir la información en las coordenadas de la plantilla
-        lienzo.drawString(120, 506 + self.desviacion_y, self.nombre_pnf)  # Programa
-        lienzo.drawString(342, 506 + self.desviacion_y, self.nombre_nucleo)  # Núcleo
-        lienzo.drawString(548, 506 + self.desviacion_y, self.nombre_turno)  # Horario
+        lienzo.drawString(120, 506 + self.desviacion_y, pnf)  # Programa
+        lienzo.drawString(342, 506 + self.desviacion_y, nucleo)  # Núcleo
+        lienzo.drawString(548, 506 + self.desviacion_y, turno)  # Horario
 
-        lienzo.drawString(185, 485 + self.desviacion_y, self.nombre_uc)  # Unidad Curricular
-        lienzo.drawString(545, 485 + self.desviacion_y, self.nombre_docente)  # Profesor(a)
+        lienzo.drawString(185, 485 + self.desviacion_y, uc)  # Unidad Curricular
+        lienzo.drawString(545, 485 + self.desviacion_y, docente)  # Profesor(a)
 
         # Fecha de Modificación (o Creación) del Plan
-        lienzo.drawString(55, 30 + self.desviacion_y, (self.fecha_modificacion or self.fecha_creacion).strftime('%d/%m/%Y'))
+        lienzo.drawString(55, 30 + self.desviacion_y, fecha)
+
+    def valores_encabezado(self) -> tuple[str]:
+        """Textos del encabezado, en el orden en que se escriben. Identifican la plantilla con encabezado."""
+        return (
+            self.nombre_pnf,
+            self.nombre_nucleo,
+            self.nombre_turno,
+            self.nombre_uc,
+            self.nombre_docente,
+            (self.fecha_modificacion or self.fecha_creacion).strftime('%d/%m/%Y'),
+        )
 
+    def generar_capa_encabezado(self) -> PageObject:
+        """Dibuja solo el encabezado en una página transparente."""
+        buffer = BytesIO()
+        lienzo = canvas.Canvas(buffer, pagesize=landscape(letter))
+        lienzo.setFont("Helvetica", self.tamaño_fuente)
+        self.escribir_encabezado(lienzo)
+        lienzo.save()
+        buffer.seek(0)
+        return PdfReader(buffer).pages[0]
 
-    def llenar_tabla(self, lienzo: canvas.Canvas, datos: tuple[int, Any]):
-        """Función sobrescribible donde se define la lógica para llenar la tabla de información."""
+    def plantilla_encabezada(self) -> PlantillaEncabezadaPDF:
+        """Plantilla con el encabezado del plan ya combinado (se dibuja una vez por cada encabezado distinto)."""
+        plantilla = registro_plantillas.obtener(self.plantilla_para_pdf)
+        return registro_encabezados.obtener(
+            plantilla, self.valores_encabezado(), self.generar_capa_encabezado, lambda: self.generar_capa(((),)).pages[0]
+        )
+
+    @property
+    def columnas_pdf(self) -> tuple[tuple[int, int]]:
+        """Columnas de la tabla de la plantilla como pares (coordenada X, ancho disponible en puntos)."""
+        return ()
+
+    @property
+    def tamaño_fuente(self) -> float:
+        """Tamaño de la fuente del contenido."""
+        return 11
+
+    @property
+    def tamaño_minimo_fuente(self) -> float:
+        """Tamaño hasta el que se reduce la fuente de una celda cuyo texto no cabe completo."""
+        return 9
+
+    def fila_pdf(self, indice: int, item: Any) -> tuple[str]:
+        """Función sobrescribible donde se definen los textos de cada columna para un item."""
         ...
 
-    def generar_pagina(self, datos: tuple[int, Any]):
-        """Función donde se define la lógica para generar una página."""
-        # Objeto de pagina base
-        plantilla = PdfReader(self.plantilla_para_pdf).pages[0] 
+    def ajustar_fila(self, indice: int, item: Any) -> tuple[TextoAjustado]:
+        """Ajusta los textos de la fila de un item al ancho de cada columna."""
+        return tuple(
+            ajustar_texto(texto, ancho, self.tamaño_fuente, tamaño_minimo=self.tamaño_minimo_fuente)
+            for texto, (_, ancho) in zip(self.fila_pdf(indice, item), self.columnas_pdf)
+        )
+
+    def alto_fila(self, fila: tuple[TextoAjustado]) -> float:
+        """Alto de una fila ajustada: la celda con más lineas más la separación con la siguiente fila."""
+        alto_texto = max((len(texto.lineas) * (texto.tamaño + 1) for texto in fila), default=0)
+        return max(alto_texto, self.tamaño_fuente + 1) + self.separacion_filas
 
-        # Crear un nuevo PDF en memoria
+    def paginar(self, items: tuple[tuple[int, Any]]) -> tuple[tuple[tuple[int, Any]]]:
+        """Reparte los items en páginas según el alto real de cada fila.
+
+        Las filas se agregan a la página actual mientras su última linea quede sobre el borde inferior
+        de la tabla y no se supere `maximo_objetos_por_pagina`.
+        """
+        return tuple(self.iterar_partes(items))
+
+    def iterar_partes(self, items: Iterable[tuple[int, Any]]) -> Iterator[tuple[tuple[int, Any]]]:
+        """Igual que `paginar`, pero entrega cada página apenas se completa (los items pueden leerse por bloques)."""
+        parte = []
+        y = self.inicio_tabla_y
+        for i, item in items:
+            alto = self.alto_fila(self.ajustar_fila(i, item))
+            ultima_linea = y - (alto - self.separacion_filas - (self.tamaño_fuente + 1))
+            if parte and (ultima_linea < self.limite_tabla_y or len(parte) >= self.maximo_objetos_por_pagina):
+                yield tuple(parte)
+                parte = []
+                y = self.inicio_tabla_y
+            parte.append((i, item))
+            y -= alto
+
+        if parte:
+            yield tuple(parte)
+
+    def llenar_tabla(self, lienzo: canvas.Canvas, datos: tuple[int, Any]):
+        """Escribe las filas de los items en la tabla de la plantilla."""
+        y = self.inicio_tabla_y
+        for i, item in datos:
+            fila = self.ajustar_fila(i, item)
+            for texto, (x, _) in zip(fila, self.columnas_pdf):
+                dibujar_texto_ajustado(lienzo, texto, x, y, tamaño_base=self.tamaño_fuente)
+            y -= self.alto_fila(fila)
+
+    def generar_capa(self, partes: Iterable[tuple[int, Any]], al_generar_pagina: Callable[[], None] = None) -> PdfReader:
+        """Dibuja las tablas de todas las partes en un único lienzo de varias páginas (una página por parte).
+
+        El encabezado no se dibuja aquí, ya viene en la plantilla encabezada. `al_generar_pagina` se
+        llama al terminar de dibujar cada página.
+        """
         buffer = BytesIO()
         lienzo = canvas.Canvas(buffer, pagesize=landscape(letter))
-        lienzo.setFont("Helvetica", 11)
 
-        # Escribir la información encabezado
-        self.escribir_encabezado(lienzo)
-
-        lienzo.setFillColor(black)
+        for datos in partes:
+            # showPage reinicia el estado gráfico, por eso la fuente se define en cada página
+            lienzo.setFont("Helvetica", self.tamaño_fuente)
+            lienzo.setFillColor(black)
 
-        # Llenado de tabla
-        self.llenar_tabla(lienzo, datos)
+            # Llenado de tabla
+            self.llenar_tabla(lienzo, datos)
+            lienzo.showPage()
+            if al_generar_pagina is not None:
+                al_generar_pagina()
 
-        # Guardar el PDF en memoria
+        # Guardar el PDF en memoria y leerlo una sola vez
         lienzo.save()
         buffer.seek(0)
+        return PdfReader(buffer)
 
-        # Combinar la plantilla PDF con la información escrita
-        nuevo_pdf_buffer = BytesIO(buffer.getvalue()) # Creamos un nuevo buffer a partir del valor del anterior.
-        nuevo_pdf = PdfReader(nuevo_pdf_buffer)
-        plantilla.merge_page(nuevo_pdf.pages[0])
+    def combinar_con_plantilla(self, pagina_capa: PageObject, plantilla: PlantillaEncabezadaPDF = None) -> PageObject:
+        """Combina una página de la capa de contenido con una copia de la plantilla encabezada."""
+        # Copia de la pagina base (la plantilla y el encabezado se preparan una sola vez por proceso)
+        pagina = (plantilla or self.plantilla_encabezada()).copiar_pagina()
+        pagina.merge_page(pagina_capa)
+        return pagina
 
-        return plantilla
+    def generar_pagina(self, datos: tuple[int, Any]):
+        """Función donde se define la lógica para generar una página."""
+        capa = self.generar_capa((datos,))
+        return self.combinar_con_plantilla(capa.pages[0])
 
     def validar_datos_para_exportar(self, items: tuple = None):
         """Valida que los datos a exportar sean aceptables."""
         ...
 
+    @property
+    def motivos_no_exportable(self) -> list[str]:
+        """Motivos por los que la validación de los datos fallaría, obtenidos de los contadores guardados en el
+        plan (sin consultar sus items ni intentar la exportación). Vacía si el plan se puede exportar."""
+        return []
+
+    @property
+    def exportable(self) -> bool:
+        return not self.motivos_no_exportable
+
     def generar_pdf(self):
-        """Genera las páginas del archivo y devuelve el buffer de bytes final."""
+        """Valida los datos, genera las páginas del archivo y devuelve el buffer de bytes final."""
+        items = self.obtener_items_pdf()
+        self.validar_datos_para_exportar(items)
+        return self.renderizar_pdf(items)
+
+    def renderizar_pdf(self, items: Iterable[Any], al_generar_pagina: Callable[[], None] = None) -> BytesIO:
+        """Genera las páginas del archivo a partir de items ya validados y devuelve el buffer de bytes final.
+
+        `al_generar_pagina` se llama por cada página lista (ver `generar_paginas`).
+        """
 
         # Crear el flujo de salida con el PDF combinado
         salida = PdfWriter()
-        items = self.obtener_items_pdf()
-        self.validar_datos_para_exportar(items)
+        self.agregar_paginas(salida, items, al_generar_pagina)
+
+        # Se comprime (o no) según el modo de salida configurado
+        return escribir_pdf(salida)
+
+    def agregar_paginas(self, salida: PdfWriter, items: Iterable[Any], al_generar_pagina: Callable[[], None] = None) -> int:
+        """Agrega al documento las páginas generadas a partir de items ya validados y devuelve cuántas agregó."""
 
         # Enumera y separa los items
         items = enumerate(items, 1)
         items = tuple((idx, item) for idx, item in items)
 
-        # Se dividen los objetivos según la cantidad máxima de entradas por PDF
-        paginas_requeridas = ceil(len(items) / self.maximo_objetos_por_pagina)
-        partes = tuple(
-            [
-                items[
-                    self.maximo_objetos_por_pagina*i:self.maximo_objetos_por_pagina*(i+1)
-                ] for i in range(0, paginas_requeridas)
-            ]
+        # Se dividen los objetivos en páginas según el alto de cada fila
+        partes = self.paginar(items)
+
+        for pagina in self.generar_paginas(partes, al_generar_pagina=al_generar_pagina):
+            salida.add_page(pagina)
+
+        return len(partes)
+
+    @property
+    def paginas_por_capa(self) -> int:
+        """Páginas que se dibujan juntas en una capa al exportar por bloques (`escribir_pdf_en_flujo`)."""
+        return 20
+
+    def generar_paginas(
+        self,
+        partes: Iterable[tuple[tuple[int, Any]]],
+        paginas_por_capa: int | None = None,
+        al_generar_pagina: Callable[[], None] = None,
+    ) -> Iterator[PageObject]:
+        """Genera las páginas de las partes, en orden, combinadas con la plantilla encabezada.
+
+        Las partes se procesan en bloques de `paginas_por_capa` (todas juntas si es None): las partes del
+        bloque que cambiaron se dibujan en una sola capa y las demás se arman con su contenido de la caché.
+        `al_generar_pagina` se llama por cada página lista: al leerla de la caché o al terminar de dibujarla,
+        para informar el avance de exportaciones largas.
+        """
+        partes = iter(partes)
+        plantilla = self.plantilla_encabezada()
+        while bloque := tuple(islice(partes, paginas_por_capa)):
+            yield from self._generar_bloque(bloque, plantilla, al_generar_pagina)
+            if paginas_por_capa is None:
+                break
+
+    def _generar_bloque(
+        self, partes: tuple[tuple[tuple[int, Any]]], plantilla: PlantillaEncabezadaPDF, al_generar_pagina: Callable[[], None] = None
+    ) -> list[PageObject]:
+        # Las páginas cuyo contenido ya está en la caché de páginas se arman sin volver a dibujarse
+        if settings.CACHE_PAGINAS_PDF:
+            huellas = [self.huella_pagina(parte) for parte in partes]
+        else:
+            huellas = [None] * len(partes)
+        paginas: list[bytes | PageObject] = [huella and cache_paginas.leer(huella) for huella in huellas]
+        pendientes = [i for i, pagina in enumerate(paginas) if pagina is None]
+        if al_generar_pagina is not None:
+            for _ in range(len(paginas) - len(pendientes)):
+                al_generar_pagina()
+
+        # Las partes que cambiaron se dibujan en una sola capa y cada página se combina con la plantilla encabezada
+        if pendientes:
+            capa = self.generar_capa((partes[i] for i in pendientes), al_generar_pagina)
+            for i, pagina_capa in zip(pendientes, capa.pages):
+                pagina = self.combinar_con_plantilla(pagina_capa, plantilla)
+                if plantilla.admite_contenido(pagina):
+                    # La página se arma con los recursos compartidos, así no conserva los de la capa
+                    paginas[i] = pagina.get_contents().get_data()
+                    if huellas[i] is not None:
+                        cache_paginas.guardar(huellas[i], BytesIO(paginas[i]))
+                else:  # Con recursos inesperados la página se usa tal cual
+                    paginas[i] = pagina
+
+        return [plantilla.pagina_con_contenido(pagina) if isinstance(pagina, bytes) else pagina for pagina in paginas]
+
+    def huella_pagina(self, parte: tuple[tuple[int, Any]]) -> str:
+        """Hash de una página: plantilla, encabezado y filas de la parte (con su numeración)."""
+        huella = sha256()
+        huella.update(dumps(("pagina", *self.identidad_pdf())).encode())
+        for i, item in parte:
+            huella.update(dumps(self.fila_pdf(i, item)).encode())
+        return huella.hexdigest()
+
+    def identidad_pdf(self) -> tuple:
+        """Lo que determina cada página además de sus filas: versión del generador, plantilla y encabezado."""
+        return (
+            VERSION_GENERADOR_PDF,
+            self.__class__.__name__,
+            registro_plantillas.obtener(self.plantilla_para_pdf).version,
+            *self.valores_encabezado(),
         )
 
-        # Se generan las paginas para cada parte y se agregan a la salida
-        for parte in partes:
-            salida.add_page(self.generar_pagina(parte))
+    def huella_pdf(self, items: Iterable[Any]) -> str:
+        """Hash del contenido que determina el PDF: plantilla, encabezado, fecha de modificación y filas."""
+        huella = sha256()
+        huella.update(dumps((*self.identidad_pdf(), settings.MODO_SALIDA_PDF)).encode())
+        for i, item in enumerate(items, 1):
+            huella.update(dumps(self.fila_pdf(i, item)).encode())
+        return huella.hexdigest()
+
+    def exportar_pdf(
+        self, renderizar: Callable[["ExportablePDFMixin", tuple], BytesIO] = None, al_generar_pagina: Callable[[], None] = None
+    ) -> Path:
+        """Valida los datos y devuelve la ruta del PDF, generándolo solo si no está en la caché.
+
+        `renderizar` permite generar el PDF fuera de este proceso (ver `renderizador.py`); recibe el plan
+        y sus items ya validados. Por defecto se genera aquí mismo con `renderizar_pdf`, llamando a
+        `al_generar_pagina` por cada página lista (no se llama si el PDF ya estaba en la caché).
+        """
+        # Los planes muy grandes se generan por bloques, sin cargar todos sus items ni sus páginas en memoria
+        umbral = settings.ITEMS_EXPORTACION_EN_FLUJO
+        if umbral and self.consulta_items_pdf().count() > umbral:
+            return self.exportar_pdf_en_flujo(al_generar_pagina)
+
+        items = self.obtener_items_pdf()
+        self.validar_datos_para_exportar(items)
 
-        flujo_salida = BytesIO()
-        salida.write(flujo_salida)
-        flujo_salida.seek(0)
+        # Las peticiones simultáneas del mismo PDF esperan a una sola generación
+        huella = self.huella_pdf(items)
+        return cache_pdf.obtener_o_generar(
+            huella, lambda: renderizar(self, items) if renderizar else self.renderizar_pdf(items, al_generar_pagina)
+        )
 
-        return flujo_salida
+    def exportar_pdf_en_flujo(self, al_generar_pagina: Callable[[], None] = None) -> Path:
+        """Como `exportar_pdf`, pero con la memoria acotada sin importar el tamaño del plan.
 
-    def obtener_items_pdf(self) -> tuple[Any]:
-        """Función sobrescribible donde se debe declarar el set de datos origen para el pdf."""
+        Los items se leen por bloques en cada pasada (validación, huella y generación) y el PDF se
+        escribe página por página directamente en el archivo de la caché. Se genera en este proceso.
+        """
+        self.validar_datos_para_exportar(self.iterar_items_pdf())
+        huella = self.huella_pdf(self.iterar_items_pdf())
+        return cache_pdf.obtener_o_escribir(huella, lambda destino: self.escribir_pdf_en_flujo(destino, al_generar_pagina))
+
+    def escribir_pdf_en_flujo(self, destino: BinaryIO, al_generar_pagina: Callable[[], None] = None) -> int:
+        """Escribe el PDF en el archivo a medida que se generan sus páginas y devuelve cuántas escribió.
+
+        No valida los datos. En memoria solo hay un bloque de items y uno de `paginas_por_capa` páginas.
+        """
+        escritor = EscritorPDFEnFlujo(destino)
+        partes = self.iterar_partes(enumerate(self.iterar_items_pdf(), 1))
+        for numero, pagina in enumerate(self.generar_paginas(partes, self.paginas_por_capa, al_generar_pagina), 1):
+            escritor.agregar_pagina(pagina)
+            if numero % self.paginas_por_capa == 0:
+                # Los lectores de pypdf tienen referencias circulares: se liberan las capas ya escritas
+                # sin esperar a la recolección completa, que en planes grandes tarda en llegar
+                collect()
+        return escritor.cerrar()
+
+    def consulta_items_pdf(self) -> models.QuerySet:
+        """Función sobrescribible donde se debe declarar la consulta de los items del pdf, con sus relaciones."""
         ...
 
+    def obtener_items_pdf(self) -> tuple[Any]:
+        """Devuelve los items del pdf ya cargados (con sus relaciones).
+
+        La validación y la generación del PDF no hacen consultas adicionales por cada item.
+        """
+        return tuple(self.consulta_items_pdf())
+
+    def iterar_items_pdf(self) -> Iterator[Any]:
+        """Recorre los items del pdf leyéndolos de la base de datos en bloques de `ITEMS_POR_BLOQUE_PDF`."""
+        return self.consulta_items_pdf().iterator(chunk_size=settings.ITEMS_POR_BLOQUE_PDF)
+
+    @classmethod
+    def consulta_exportacion(cls) -> models.QuerySet:
+        """Consulta que trae el plan junto a las relaciones que se usan en el encabezado del PDF."""
+        return cls.objects.all()
+
 
 OPCIONES_TRAYECTO = [
     (0, 'Inicial'),
@@ -186,7 +526,7 @@ OPCIONES_TURNO = [
 ]
 
 
-class PlanAprendizaje(models.Model, ExportablePDFMixin):
+class PlanAprendizaje(CamposMantenidosMixin, ReasignacionDocenteMixin, models.Model, ExportablePDFMixin):
     """Modelo de plan de aprendizaje."""
 
     codigo_grupo = models.CharField(max_length=32, primary_key=True)
@@ -197,6 +537,12 @@ class PlanAprendizaje(models.Model, ExportablePDFMixin):
     pnf = models.CharField(max_length=32)
     fecha_creacion = models.DateTimeField(default=now)
     fecha_modificacion = models.DateTimeField(null=True)
+    # Contadores de los objetivos para el estado de exportación, actualizados en la misma transacción que cada
+    # escritura de un objetivo (o de un item al que estén asociados)
+    total_objetivos = models.PositiveIntegerField(default=0, editable=False)
+    objetivos_sin_evaluacion = models.PositiveIntegerField(default=0, editable=False)
+
+    campos_mantenidos = ('total_objetivos', 'objetivos_sin_evaluacion')
 
     @property
     def nombre_pnf(self) -> str:
@@ -222,6 +568,14 @@ class PlanAprendizaje(models.Model, ExportablePDFMixin):
     def objetivos_pa(self) -> Iterable["ObjetivoPlanAprendizaje"]:
         return self.objetivoplanaprendizaje_set.all()
 
+    @property
+    def nombre_archivo_pdf(self) -> str:
+        return f"plan_aprendizaje_{self.codigo_grupo}.pdf"
+
+    @property
+    def nombre_archivo_zip(self) -> str:
+        return f"{self.codigo_grupo}/{self.nombre_archivo_pdf.replace('/', '-')}"
+
     class Meta:
         db_table = 'planes_de_aprendizaje'
 
@@ -233,6 +587,10 @@ class PlanAprendizaje(models.Model, ExportablePDFMixin):
         self.fecha_modificacion = now()
         return super().save(*args, **kwargs)
 
+    def propagar_docente(self):
+        ObjetivoPlanAprendizaje.objects.filter(plan_aprendizaje=self.pk).update(docente=self.docente_id)
+        ItemPlanEvaluacion.objects.filter(plan_evaluacion__plan_aprendizaje=self.pk).update(docente=self.docente_id)
+
     def añadir_objetivo(
         self,
         titulo: str,
@@ -254,25 +612,62 @@ class PlanAprendizaje(models.Model, ExportablePDFMixin):
 
         return objetivo
 
-    def llenar_tabla(self, lienzo: canvas.Canvas, datos: tuple[int, "ObjetivoPlanAprendizaje"]):
-        """ Escribe los objetivos de aprendizaje en la tabla de la plantilla. """
-        y = 412
-        for i, objetivo in datos:
-            objetivo: ObjetivoPlanAprendizaje
-            dibujar_multi_linea(lienzo, ajustar_texto_pdf(f"{i}. {objetivo.titulo}", 30), 37, y)
-            dibujar_multi_linea(lienzo, ajustar_texto_pdf(objetivo.contenido, 40), 190, y)
-            dibujar_multi_linea(lienzo, ajustar_texto_pdf(objetivo.get_estrategia_didactica_display(), 18), 390, y)
-            dibujar_multi_linea(lienzo, ajustar_texto_pdf(objetivo.criterio_logro, 30), 508, y)
-            dibujar_multi_linea(lienzo, ajustar_texto_pdf(str(objetivo.duracion_horas) + " horas", 16), 690, y)
-            y -= 58
-
-    def obtener_items_pdf(self) -> tuple["ObjetivoPlanAprendizaje"]:
+    @property
+    def columnas_pdf(self) -> tuple[tuple[int, int]]:
+        return ((37, 144), (190, 189), (390, 106), (508, 154), (690, 62))
+
+    def fila_pdf(self, indice: int, objetivo: "ObjetivoPlanAprendizaje") -> tuple[str]:
+        """ Textos de un objetivo de aprendizaje en la tabla de la plantilla. """
+        return (
+            f"{indice}. {objetivo.titulo}",
+            objetivo.contenido,
+            objetivo.get_estrategia_didactica_display(),
+            objetivo.criterio_logro,
+            str(objetivo.duracion_horas) + " horas",
+        )
+
+    def consulta_items_pdf(self) -> models.QuerySet:
         return self.objetivoplanaprendizaje_set.all()
 
-    
+    @classmethod
+    def consulta_exportacion(cls) -> models.QuerySet:
+        return cls.objects.select_related('docente', 'unidad_curricular')
+
+    @classmethod
+    def consulta_serializacion(cls) -> models.QuerySet:
+        """Consulta que trae los planes junto a las relaciones que muestra `SerializadorPlanAprendizaje`
+        (plan de evaluación y objetivos), con la misma cantidad de consultas sin importar cuántos planes sean."""
+        return cls.objects.select_related('planevaluacion').prefetch_related('objetivoplanaprendizaje_set')
+
+    @classmethod
+    def ajustar_contadores(cls, pk: str, objetivos: int = 0, sin_evaluacion: int = 0):
+        """Suma las diferencias a los contadores de objetivos del plan, en una única sentencia."""
+        cls.objects.filter(pk=pk).update(
+            total_objetivos=F('total_objetivos') + objetivos,
+            objetivos_sin_evaluacion=F('objetivos_sin_evaluacion') + sin_evaluacion,
+        )
+
+    def recalcular_contadores(self):
+        """Vuelve a contar los objetivos del plan. Solo hace falta tras escrituras en lote (`bulk_create`,
+        `QuerySet.update`), que no pasan por `save` ni envían señales."""
+        objetivos = self.objetivoplanaprendizaje_set.all()
+        self.total_objetivos = objetivos.count()
+        self.objetivos_sin_evaluacion = objetivos.filter(evaluacion_asociada__isnull=True).count()
+        PlanAprendizaje.objects.filter(pk=self.pk).update(
+            total_objetivos=self.total_objetivos, objetivos_sin_evaluacion=self.objetivos_sin_evaluacion
+        )
+
+    @property
+    def motivos_no_exportable(self) -> list[str]:
+        if self.objetivos_sin_evaluacion:
+            return [
+                f"{self.objetivos_sin_evaluacion} de {self.total_objetivos} objetivos del plan de aprendizaje no tienen evaluación asociada."
+            ]
+        return []
+
     def validar_datos_para_exportar(self, items: tuple["ObjetivoPlanAprendizaje"], subllamado: bool = False):
 
-        items_sin_evaluacion: tuple["ObjetivoPlanAprendizaje"] = tuple(filter(lambda item: item.evaluacion_asociada is None, items))
+        items_sin_evaluacion: tuple["ObjetivoPlanAprendizaje"] = tuple(filter(lambda item: item.evaluacion_asociada_id is None, items))
         items_sin_evaluacion = [item.titulo for item in items_sin_evaluacion]
         mensaje = "No se puede exportar el plan de aprendizaje ya que hay objetivos de plan de aprendizaje sin evaluación asociada"
         if subllamado:
@@ -302,12 +697,26 @@ OPCIONES_ESTRATEGIAS_DIDACTICAS = [
     ('OT', 'Otras'),
 ]
 
-class PlanEvaluacion(models.Model, ExportablePDFMixin):
+class PesoTotalExcedido(ValidationError):
+    """Error de una escritura de un item con la que el peso total de su plan de evaluación superaría el 100%."""
+
+    def __init__(self, peso_total: int, diferencia: int):
+        self.peso_total = peso_total
+        self.diferencia = diferencia
+        super().__init__(
+            f"El peso total del plan de evaluación superaría el límite de 100% ({peso_total + diferencia}%).",
+            code='peso_total_excedido',
+        )
+
+
+class PlanEvaluacion(CamposMantenidosMixin, ReasignacionDocenteMixin, models.Model, ExportablePDFMixin):
     """Modelo de plan de evaluación."""
 
     nombre = models.CharField(max_length=96)
     fecha_creacion = models.DateTimeField(default=now)
     fecha_modificacion = models.DateTimeField(null=True)
+    # Suma de los pesos de los items, actualizada en la misma transacción que cada escritura de un item
+    peso_total = models.SmallIntegerField(default=0, editable=False)
 
     # Relación 1:1 con Plan de Aprendizaje
     plan_aprendizaje = models.OneToOneField(PlanAprendizaje, on_delete=models.CASCADE)
@@ -333,21 +742,55 @@ class PlanEvaluacion(models.Model, ExportablePDFMixin):
         return self.plan_aprendizaje.nombre_docente
     
     @property
-    def peso_total(self) -> int:
-        return sum(item.peso for item in self.itemplanevaluacion_set.all()) 
+    def nombre_archivo_pdf(self) -> str:
+        return f"{self.nombre}.pdf"
 
+    @property
+    def nombre_archivo_zip(self) -> str:
+        return f"{self.plan_aprendizaje_id}/{self.nombre_archivo_pdf.replace('/', '-')}"
 
     class Meta:
         db_table = 'planes_de_evaluacion'
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(peso_total__gte=0, peso_total__lte=100),
+                name="validar_peso_total",
+                violation_error_message="El peso total de un plan de evaluación debe estar entre 0% y 100%"
+            )
+        ]
 
     def __str__(self):
         return f"P.E {self.nombre} ({self.plan_aprendizaje.codigo_grupo})"
 
+    # El peso total solo lo modifican los items (`ajustar_peso_total`)
+    campos_mantenidos = ('peso_total',)
+    # El docente de los items es el del plan de aprendizaje
+    campo_origen_docente = 'plan_aprendizaje_id'
+
     def save(self, *args, **kwargs) -> None:
         # Actualiza fecha de modificación
         self.fecha_modificacion = now()
         return super().save(*args, **kwargs)
 
+    def propagar_docente(self):
+        ItemPlanEvaluacion.objects.filter(plan_evaluacion=self.pk).update(docente=self.plan_aprendizaje.docente_id)
+
+    @classmethod
+    def ajustar_peso_total(cls, pk: int, diferencia: int):
+        """Suma `diferencia` al peso total del plan solo si no supera el 100%, en una única sentencia
+        (`UPDATE ... SET peso_total = peso_total + x WHERE peso_total + x <= 100`).
+
+        Mientras dure la transacción la fila del plan queda bloqueada, así las escrituras simultáneas sobre
+        los items de un mismo plan se aplican una tras otra y ninguna puede pasar del 100%.
+
+        Raises:
+            PesoTotalExcedido: Si con la diferencia se superaría el 100%.
+        """
+        actualizados = cls.objects.filter(pk=pk, peso_total__lte=100 - diferencia).update(peso_total=F('peso_total') + diferencia)
+        # Restar nunca falla (el plan pudo haberse eliminado junto con sus items)
+        if not actualizados and diferencia > 0:
+            raise PesoTotalExcedido(cls.objects.values_list('peso_total', flat=True).get(pk=pk), diferencia)
+
     def añadir_item_evaluacion(
         self,
         instrumento_evaluacion: str,
@@ -371,29 +814,58 @@ class PlanEvaluacion(models.Model, ExportablePDFMixin):
 
         return item
 
-    def llenar_tabla(self, lienzo: canvas.Canvas, datos: tuple[int, "ItemPlanEvaluacion"]):
-        """ Escribe los items del plan de evaluación en la tabla de la plantilla. """
-        y = 412
-        for i, evaluacion in datos:
-            evaluacion: ItemPlanEvaluacion
-            objetivos = ", ".join(obj.titulo for obj in evaluacion.objetivos)
-            dibujar_multi_linea(lienzo, ajustar_texto_pdf(evaluacion.get_instrumento_evaluacion_display(), 24), 37, y)
-            dibujar_multi_linea(lienzo, ajustar_texto_pdf(evaluacion.get_tipo_evaluacion_display(), 24), 195, y)
-            dibujar_multi_linea(lienzo, ajustar_texto_pdf(f"{objetivos}", 36), 313, y)
-            dibujar_multi_linea(lienzo, ajustar_texto_pdf(evaluacion.habilidades_a_evaluar, 39), 483, y)
-            dibujar_multi_linea(lienzo, ajustar_texto_pdf(str(evaluacion.peso) + "%", 22), 714, y)
-            y -= 58
+    @property
+    def columnas_pdf(self) -> tuple[tuple[int, int]]:
+        return ((37, 148), (195, 107), (313, 160), (483, 206), (714, 38))
+
+    def fila_pdf(self, indice: int, evaluacion: "ItemPlanEvaluacion") -> tuple[str]:
+        """ Textos de un item del plan de evaluación en la tabla de la plantilla. """
+        objetivos = ", ".join(obj.titulo for obj in evaluacion.objetivos)
+        return (
+            evaluacion.get_instrumento_evaluacion_display(),
+            evaluacion.get_tipo_evaluacion_display(),
+            f"{objetivos}",
+            evaluacion.habilidades_a_evaluar,
+            str(evaluacion.peso) + "%",
+        )
+
+    def consulta_items_pdf(self) -> models.QuerySet:
+        # Los objetivos de todos los items (o de cada bloque de items) se traen en una sola consulta
+        objetivos = models.Prefetch('objetivos_asociados', queryset=ObjetivoPlanAprendizaje.objects.only('id', 'titulo', 'evaluacion_asociada'))
+        return self.itemplanevaluacion_set.prefetch_related(objetivos)
 
-    def obtener_items_pdf(self) -> tuple["ItemPlanEvaluacion"]:
-        return self.itemplanevaluacion_set.all()
+    @classmethod
+    def consulta_exportacion(cls) -> models.QuerySet:
+        return cls.objects.select_related('plan_aprendizaje__docente', 'plan_aprendizaje__unidad_curricular')
+
+    @classmethod
+    def consulta_serializacion(cls) -> models.QuerySet:
+        """Consulta que trae los planes con sus items, los objetivos de cada item y el plan de aprendizaje (para
+        el estado de exportación), lo que muestra `SerializadorPlanEvaluacion`, con la misma cantidad de consultas
+        sin importar cuántos sean."""
+        items = models.Prefetch('itemplanevaluacion_set', queryset=ItemPlanEvaluacion.consulta_serializacion())
+        return cls.objects.select_related('plan_aprendizaje').prefetch_related(items)
 
 
     def validar_datos_para_exportar(self, items: tuple["ItemPlanEvaluacion"]):
 
-        self.plan_aprendizaje.validar_datos_para_exportar(self.plan_aprendizaje.objetivos_pa, subllamado=True)
-    
-        if not self.peso_total == 100:
-            raise ValidationError(f"El plan de evaluacion debe tener un total de 100%, actualmente tiene {self.peso_total}%.")
+        # Solo se consultan los objetivos sin evaluación asociada del plan de aprendizaje
+        objetivos_sin_evaluacion = self.plan_aprendizaje.objetivos_pa.filter(evaluacion_asociada__isnull=True).only('titulo', 'evaluacion_asociada')
+        self.plan_aprendizaje.validar_datos_para_exportar(objetivos_sin_evaluacion, subllamado=True)
+        self.validar_peso_total(items)
+
+    @property
+    def motivos_no_exportable(self) -> list[str]:
+        motivos = self.plan_aprendizaje.motivos_no_exportable
+        if self.peso_total != 100:
+            motivos.append(f"El plan de evaluación debe tener un total de 100%, actualmente tiene {self.peso_total}%.")
+        return motivos
+
+    def validar_peso_total(self, items: tuple["ItemPlanEvaluacion"]):
+        """Valida que los items ya cargados sumen 100%."""
+        peso_total = sum(item.peso for item in items)
+        if not peso_total == 100:
+            raise ValidationError(f"El plan de evaluacion debe tener un total de 100%, actualmente tiene {peso_total}%.")
 
 
 
@@ -446,6 +918,8 @@ class ItemPlanEvaluacion(models.Model):
     habilidades_a_evaluar = models.TextField()
     peso = models.SmallIntegerField(choices=OPCIONES_PESO_EVALUACION, default=15)
     fecha_planificada = models.DateField()
+    # Docente del plan, copiado al guardar para limitar las consultas por docente sin unir tablas
+    docente = models.ForeignKey(Docente, on_delete=models.CASCADE, editable=False, db_index=False)
 
     @property
     def objetivos(self) -> tuple["ObjetivoPlanAprendizaje"]:
@@ -454,6 +928,8 @@ class ItemPlanEvaluacion(models.Model):
     class Meta:
         db_table = 'items_plan_de_evaluacion'
         ordering = ['id']
+        # Sirve tanto para filtrar por docente como para el orden de los listados
+        indexes = [models.Index(fields=['docente', 'id'], name='items_pe_docente_idx')]
         constraints = [
             models.CheckConstraint(
                 check=models.Q(peso__in=obtener_valores_de_opciones(OPCIONES_PESO_EVALUACION)),
@@ -475,6 +951,48 @@ class ItemPlanEvaluacion(models.Model):
     def __str__(self):
         return f"{self.tipo_evaluacion}-{self.instrumento_evaluacion} {self.peso}% ({self.plan_evaluacion.nombre})"
 
+    def save(self, *args, **kwargs) -> None:
+        """Guarda el item con el docente de su plan y actualiza el peso total del plan en la misma transacción.
+
+        Raises:
+            PesoTotalExcedido: Si con el peso del item el plan superaría el 100% (el item no se guarda).
+        """
+        with transaction.atomic():
+            if self._state.adding:
+                PlanEvaluacion.ajustar_peso_total(self.plan_evaluacion_id, self.peso)
+                self.docente_id = self.plan_evaluacion.plan_aprendizaje.docente_id
+            else:
+                plan_anterior, peso_anterior = (
+                    ItemPlanEvaluacion.objects.select_for_update().values_list('plan_evaluacion', 'peso').get(pk=self.pk)
+                )
+                if plan_anterior == self.plan_evaluacion_id:
+                    PlanEvaluacion.ajustar_peso_total(self.plan_evaluacion_id, self.peso - peso_anterior)
+                else:
+                    # Ambos planes se bloquean en orden de clave antes de ajustarlos: dos traslados en sentidos
+                    # opuestos entre los mismos planes se esperan en lugar de bloquearse mutuamente
+                    list(
+                        PlanEvaluacion.objects.select_for_update()
+                        .filter(pk__in=[plan_anterior, self.plan_evaluacion_id]).order_by('pk').values_list('pk', flat=True)
+                    )
+                    PlanEvaluacion.ajustar_peso_total(plan_anterior, -peso_anterior)
+                    PlanEvaluacion.ajustar_peso_total(self.plan_evaluacion_id, self.peso)
+                    self.docente_id = self.plan_evaluacion.plan_aprendizaje.docente_id
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        """Elimina el item; su peso se descuenta del plan con la señal `post_delete` (ver `signals.py`)."""
+        with transaction.atomic():
+            # Se descuenta el peso guardado, no el de la instancia (que pudo cambiar sin llegar a guardarse)
+            self.plan_evaluacion_id, self.peso = (
+                ItemPlanEvaluacion.objects.select_for_update().values_list('plan_evaluacion', 'peso').get(pk=self.pk)
+            )
+            return super().delete(*args, **kwargs)
+
+    @classmethod
+    def consulta_serializacion(cls) -> models.QuerySet:
+        """Consulta que trae los items con los objetivos que muestra `SerializadorItemPlanEvaluacion`."""
+        return cls.objects.prefetch_related('objetivos_asociados')
+
     def agregar_objetivo(
         self,
         objetivo: "ObjetivoPlanAprendizaje",
@@ -505,10 +1023,14 @@ class ObjetivoPlanAprendizaje(models.Model):
     evaluacion_asociada = models.ForeignKey(
         ItemPlanEvaluacion, on_delete=models.SET_NULL, null=True, related_name="objetivos_asociados"
     )
+    # Docente del plan, copiado al guardar para limitar las consultas por docente sin unir tablas
+    docente = models.ForeignKey(Docente, on_delete=models.CASCADE, editable=False, db_index=False)
 
     class Meta:
         db_table = 'objetivos_plan_de_aprendizaje'
         ordering = ['id']
+        # Sirve tanto para filtrar por docente como para el orden de los listados
+        indexes = [models.Index(fields=['docente', 'id'], name='objetivos_pa_docente_idx')]
         constraints = [
             models.CheckConstraint(
                 check=models.Q(duracion_horas__gte=2),
@@ -529,3 +1051,79 @@ class ObjetivoPlanAprendizaje(models.Model):
 
     def __str__(self):
         return f"{self.plan_aprendizaje.codigo_grupo} - {self.titulo}"
+
+    def save(self, *args, **kwargs) -> None:
+        """Guarda el objetivo con el docente de su plan y actualiza los contadores del plan en la misma transacción."""
+        sin_evaluacion = int(self.evaluacion_asociada_id is None)
+        with transaction.atomic():
+            if self._state.adding:
+                PlanAprendizaje.ajustar_contadores(self.plan_aprendizaje_id, objetivos=1, sin_evaluacion=sin_evaluacion)
+                self.docente_id = self.plan_aprendizaje.docente_id
+            else:
+                plan_anterior, evaluacion_anterior = (
+                    ObjetivoPlanAprendizaje.objects.select_for_update()
+                    .values_list('plan_aprendizaje', 'evaluacion_asociada').get(pk=self.pk)
+                )
+                sin_evaluacion_anterior = int(evaluacion_anterior is None)
+                if plan_anterior != self.plan_aprendizaje_id:
+                    PlanAprendizaje.ajustar_contadores(plan_anterior, objetivos=-1, sin_evaluacion=-sin_evaluacion_anterior)
+                    PlanAprendizaje.ajustar_contadores(self.plan_aprendizaje_id, objetivos=1, sin_evaluacion=sin_evaluacion)
+                    self.docente_id = self.plan_aprendizaje.docente_id
+                elif sin_evaluacion != sin_evaluacion_anterior:
+                    PlanAprendizaje.ajustar_contadores(self.plan_aprendizaje_id, sin_evaluacion=sin_evaluacion - sin_evaluacion_anterior)
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        """Elimina el objetivo; se descuenta de los contadores del plan con la señal `post_delete` (ver `signals.py`)."""
+        with transaction.atomic():
+            # Se descuentan los valores guardados, no los de la instancia (que pudieron cambiar sin guardarse)
+            self.plan_aprendizaje_id, self.evaluacion_asociada_id = (
+                ObjetivoPlanAprendizaje.objects.select_for_update()
+                .values_list('plan_aprendizaje', 'evaluacion_asociada').get(pk=self.pk)
+            )
+            return super().delete(*args, **kwargs)
+
+
+OPCIONES_ESTADO_EXPORTACION = [
+    ('PEN', 'Pendiente'),
+    ('PRO', 'En proceso'),
+    ('COM', 'Completado'),
+    ('ERR', 'Fallido'),
+    ('EXP', 'Expirado'),
+]
+
+
+class TrabajoExportacion(models.Model):
+    """Modelo de trabajo de exportación asíncrona de uno o varios planes a PDF."""
+
+    id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+    docente = models.ForeignKey(Docente, on_delete=models.CASCADE)
+    # Pares [modelo, clave primaria] de los planes a exportar
+    planes = models.JSONField(default=list)
+    estado = models.CharField(max_length=3, choices=OPCIONES_ESTADO_EXPORTACION, default='PEN')
+    paginas_generadas = models.PositiveIntegerField(default=0)
+    paginas_totales = models.PositiveIntegerField(default=0)
+    nombre_archivo = models.CharField(max_length=128, blank=True)
+    error = models.TextField(blank=True)
+    fecha_creacion = models.DateTimeField(default=now)
+    # Última señal de avance del trabajador (al tomarlo y con cada avance), para recuperar trabajos abandonados
+    fecha_actualizacion = models.DateTimeField(null=True)
+    fecha_finalizacion = models.DateTimeField(null=True)
+    fecha_expiracion = models.DateTimeField(null=True)
+
+    class Meta:
+        db_table = 'trabajos_de_exportacion'
+        ordering = ['-fecha_creacion']
+
+    def __str__(self):
+        return f"Exportación {self.id} ({self.get_estado_display()})"
+
+    @property
+    def ruta_archivo(self) -> Path:
+        """Ubicación del archivo generado (PDF para un solo plan, ZIP para varios)."""
+        extension = ".pdf" if len(self.planes) == 1 else ".zip"
+        return Path(settings.DIRECTORIO_EXPORTACIONES) / f"{self.id}{extension}"
+
+    @property
+    def expirado(self) -> bool:
+        return self.estado == 'EXP' or (self.fecha_expiracion is not None and self.fecha_expiracion <= now())
@@ -0,0 +1,169 @@
+from collections import OrderedDict
+from io import BytesIO
+from pathlib import Path
+from threading import Lock
+from typing import Callable, Hashable
+
+from pypdf import PdfReader, PdfWriter, PageObject
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+
+def copiar_pagina(lector: PdfReader, indice: int = 0) -> PageObject:
+    """Devuelve una copia superficial de la página, segura para usar con `merge_page`.
+
+    La copia comparte los objetos del lector (fuentes, imágenes, flujos de contenido)
+    pero al no estar enlazada a él, `merge_page` reemplaza su contenido y recursos
+    sin modificar los originales.
+    """
+    copia = PageObject(lector, None)
+    copia.update(lector.pages[indice])
+    return copia
+
+
+class PlantillaPDF:
+    """Plantilla PDF ya leída y analizada, lista para entregar copias de sus páginas."""
+
+    def __init__(self, ruta: Path):
+        estado = ruta.stat()
+        self.ruta = ruta
+        self.fecha_modificacion = estado.st_mtime_ns
+        self.tamaño = estado.st_size
+        self.lector = PdfReader(ruta)
+
+    @property
+    def version(self) -> str:
+        """Identificador de la versión del archivo de la plantilla."""
+        return f"{self.fecha_modificacion}-{self.tamaño}"
+
+    def vigente(self, estado) -> bool:
+        """Indica si la plantilla en memoria corresponde al archivo en disco."""
+        return self.fecha_modificacion == estado.st_mtime_ns and self.tamaño == estado.st_size
+
+    def copiar_pagina(self, indice: int = 0) -> PageObject:
+        """Devuelve una copia de la página lista para combinarse con una capa de contenido."""
+        return copiar_pagina(self.lector, indice)
+
+
+class PlantillaEncabezadaPDF:
+    """Plantilla con el encabezado de un plan ya combinado, reutilizable en cada página del cuerpo.
+
+    El resultado de la combinación se escribe y se vuelve a leer, así cada copia parte de flujos de
+    contenido recién leídos y las combinaciones posteriores no se acumulan sobre la misma página.
+
+    `capa_referencia` es una capa de contenido vacía con los mismos recursos (fuentes) que las capas de
+    las páginas. Al combinarla se obtienen los recursos que tendrá cualquier página combinada, lo que
+    permite armar páginas directamente a partir de su flujo de contenido ya combinado (`pagina_con_contenido`).
+    """
+
+    def __init__(self, plantilla: PlantillaPDF, capa_encabezado: PageObject, capa_referencia: PageObject):
+        pagina = plantilla.copiar_pagina()
+        pagina.merge_page(capa_encabezado)
+
+        escritor = PdfWriter()
+        escritor.add_page(pagina)
+        buffer = BytesIO()
+        escritor.write(buffer)
+        buffer.seek(0)
+
+        self.version = plantilla.version
+        self.lector = PdfReader(buffer)
+
+        referencia = self.copiar_pagina()
+        referencia.merge_page(capa_referencia)
+        self.recursos: DictionaryObject = referencia[NameObject("/Resources")]
+
+    def copiar_pagina(self, indice: int = 0) -> PageObject:
+        """Devuelve una copia de la página lista para combinarse con una capa de contenido."""
+        return copiar_pagina(self.lector, indice)
+
+    def admite_contenido(self, pagina: PageObject) -> bool:
+        """Indica si los recursos de una página combinada son los mismos (por nombre) que los de la referencia."""
+        recursos = pagina[NameObject("/Resources")]
+        return recursos.keys() == self.recursos.keys() and all(
+            not isinstance(valor, DictionaryObject) or valor.keys() == recursos[clave].get_object().keys()
+            for clave, valor in self.recursos.items()
+        )
+
+    def pagina_con_contenido(self, contenido: bytes) -> PageObject:
+        """Arma una página con el flujo de contenido de una página ya combinada, sin volver a combinarla.
+
+        Todas las páginas armadas comparten los mismos recursos, por lo que se escriben una sola vez.
+        """
+        pagina = self.copiar_pagina()
+        flujo = DecodedStreamObject()
+        flujo.set_data(contenido)
+        pagina[NameObject("/Contents")] = flujo
+        pagina[NameObject("/Resources")] = self.recursos
+        return pagina
+
+
+class RegistroPlantillasPDF:
+    """Registro de plantillas por proceso, cada plantilla se lee una sola vez mientras no cambie en disco."""
+
+    def __init__(self):
+        self._plantillas: dict[Path, PlantillaPDF] = {}
+        self._candado = Lock()
+
+    def obtener(self, ruta: Path) -> PlantillaPDF:
+        """Devuelve la plantilla de la ruta, recargándola si el archivo fue modificado."""
+        estado = ruta.stat()
+        plantilla = self._plantillas.get(ruta)
+        if plantilla is not None and plantilla.vigente(estado):
+            return plantilla
+
+        with self._candado:
+            plantilla = self._plantillas.get(ruta)
+            if plantilla is None or not plantilla.vigente(estado):
+                plantilla = PlantillaPDF(ruta)
+                self._plantillas[ruta] = plantilla
+            return plantilla
+
+    def limpiar(self):
+        """Descarta todas las plantillas cargadas."""
+        with self._candado:
+            self._plantillas.clear()
+
+
+class RegistroEncabezadosPDF:
+    """Registro por proceso de plantillas con encabezado, identificadas por los valores del encabezado.
+
+    Se conservan las `maximo` plantillas usadas más recientemente.
+    """
+
+    def __init__(self, maximo: int = 128):
+        self.maximo = maximo
+        self._plantillas: OrderedDict[tuple, PlantillaEncabezadaPDF] = OrderedDict()
+        self._candado = Lock()
+
+    def obtener(
+        self,
+        plantilla: PlantillaPDF,
+        encabezado: Hashable,
+        dibujar: Callable[[], PageObject],
+        capa_referencia: Callable[[], PageObject],
+    ) -> PlantillaEncabezadaPDF:
+        """Devuelve la plantilla con el encabezado, dibujándolo con `dibujar` solo si no está registrada."""
+        clave = (plantilla.ruta, plantilla.version, encabezado)
+        with self._candado:
+            encabezada = self._plantillas.get(clave)
+            if encabezada is not None:
+                self._plantillas.move_to_end(clave)
+                return encabezada
+
+        # Se dibuja fuera del candado para no bloquear a los demás hilos
+        encabezada = PlantillaEncabezadaPDF(plantilla, dibujar(), capa_referencia())
+
+        with self._candado:
+            self._plantillas[clave] = encabezada
+            while len(self._plantillas) > self.maximo:
+                self._plantillas.popitem(last=False)
+        return encabezada
+
+    def limpiar(self):
+        """Descarta todas las plantillas con encabezado."""
+        with self._candado:
+            self._plantillas.clear()
+
+
+registro_plantillas = RegistroPlantillasPDF()
+registro_encabezados = RegistroEncabezadosPDF()
@@ -0,0 +1,98 @@
+from concurrent.futures import ThreadPoolExecutor
+from os import getpid
+from threading import Condition, Thread
+from time import monotonic
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from rest_framework.serializers import ValidationError
+
+from .models import PlanAprendizaje, PlanEvaluacion
+from .renderizador import renderizador_pdf, RenderizadoNoDisponible
+
+
+def prerenderizar_grupo(codigo_grupo: str) -> int:
+    """Genera (si hace falta) los PDFs del plan de aprendizaje y su plan de evaluación en la caché.
+
+    Los PDFs se generan en los procesos de `renderizador.py`, como las descargas, y no en los hilos del
+    proceso web. Los planes que no son exportables se omiten, igual que si los procesos están saturados (la
+    descarga lo generará). Devuelve la cantidad de PDFs disponibles en la caché.
+    """
+    pa = PlanAprendizaje.consulta_exportacion().filter(codigo_grupo=codigo_grupo).first()
+    if pa is None:
+        return 0
+
+    listos = 0
+    for plan in (pa, PlanEvaluacion.consulta_exportacion().filter(plan_aprendizaje=pa).first()):
+        if plan is None:
+            continue
+        try:
+            plan.exportar_pdf(renderizador_pdf.renderizar)
+            listos += 1
+        except (ValidationError, RenderizadoNoDisponible):
+            pass
+    return listos
+
+
+class PrerenderizadorPDF:
+    """Programa la regeneración en segundo plano de los PDFs de un grupo tras cada escritura.
+
+    Las escrituras seguidas sobre el mismo grupo se agrupan: el PDF se genera una sola vez cuando pasan
+    `ESPERA_PRERENDERIZADO_PDF` segundos sin cambios. Hasta `HILOS_PRERENDERIZADO_PDF` grupos se cargan y
+    envían a los procesos de generación a la vez; los PDFs quedan en la caché, de donde los sirven las descargas.
+    """
+
+    def __init__(self):
+        self._condicion = Condition()
+        self._pendientes: dict[str, float] = {}
+        self._pid = None
+        self._hilos: ThreadPoolExecutor | None = None
+
+    def _iniciar(self):
+        """Inicia el planificador y los hilos (también después de un fork del servidor)."""
+        if self._pid == getpid():
+            return
+        self._pid = getpid()
+        self._pendientes.clear()
+        self._hilos = ThreadPoolExecutor(settings.HILOS_PRERENDERIZADO_PDF, thread_name_prefix="prerenderizado-pdf")
+        Thread(target=self._planificar, name="planificador-prerenderizado-pdf", daemon=True).start()
+
+    def programar(self, codigo_grupo: str):
+        """Programa la regeneración del grupo cuando se confirme la transacción actual."""
+        if settings.PRERENDERIZAR_PDF:
+            transaction.on_commit(lambda: self._programar(codigo_grupo))
+
+    def _programar(self, codigo_grupo: str):
+        with self._condicion:
+            self._iniciar()
+            # Si ya estaba pendiente se pospone, así varias ediciones seguidas generan un solo PDF
+            self._pendientes[codigo_grupo] = monotonic() + settings.ESPERA_PRERENDERIZADO_PDF
+            self._condicion.notify()
+
+    def _planificar(self):
+        while True:
+            with self._condicion:
+                while not self._pendientes:
+                    self._condicion.wait()
+
+                ahora = monotonic()
+                listos = [codigo for codigo, momento in self._pendientes.items() if momento <= ahora]
+                if not listos:
+                    self._condicion.wait(min(self._pendientes.values()) - ahora)
+                    continue
+                for codigo in listos:
+                    del self._pendientes[codigo]
+
+            for codigo in listos:
+                self._hilos.submit(self._ejecutar, codigo)
+
+    @staticmethod
+    def _ejecutar(codigo_grupo: str):
+        try:
+            prerenderizar_grupo(codigo_grupo)
+        finally:
+            close_old_connections()
+
+
+prerenderizador_pdf = PrerenderizadorPDF()
@@ -0,0 +1,83 @@
+"""Funciones que se ejecutan en procesos separados para generar PDFs.
+
+Este módulo no importa modelos al cargarse: los procesos se crean con "spawn" (sin heredar las
+conexiones a la base de datos del proceso web) y deben inicializar Django antes de usarlos.
+"""
+
+from contextlib import contextmanager
+import signal
+
+
+def iniciar_proceso():
+    """Inicializador de los procesos de generación de PDFs."""
+    import django
+
+    django.setup()
+
+
+def exportar_plan(modelo: str, pk, avance=None) -> dict:
+    """Genera el PDF de un plan (o lo toma de la caché) y devuelve su entrada para el manifiesto.
+
+    `avance` (como `AvanceTrabajo`) recibe cada página generada; en ese caso la entrada indica
+    cuántas se informaron en `paginas_generadas`.
+    """
+    from django.apps import apps
+    from django.core.exceptions import ObjectDoesNotExist
+    from rest_framework.serializers import ValidationError
+
+    try:
+        plan = apps.get_model(modelo).consulta_exportacion().get(pk=pk)
+    except ObjectDoesNotExist:
+        return {"modelo": modelo, "id": pk, "error": "El plan ya no existe."}
+
+    entrada = {"modelo": modelo, "id": pk, "archivo": plan.nombre_archivo_zip}
+    al_generar_pagina = None
+    if avance is not None:
+        entrada["paginas_generadas"] = 0
+
+        def al_generar_pagina():
+            entrada["paginas_generadas"] += 1
+            avance()
+
+    try:
+        entrada["ruta"] = str(plan.exportar_pdf(al_generar_pagina=al_generar_pagina))
+    except ValidationError as error:
+        entrada["error"] = " ".join(str(detalle) for detalle in error.detail)
+    finally:
+        if avance is not None:
+            avance.guardar()
+    return entrada
+
+
+@contextmanager
+def limite_de_tiempo(segundos: float):
+    """Interrumpe el bloque con TimeoutError si tarda más de `segundos` (solo en sistemas con SIGALRM)."""
+    if not segundos or not hasattr(signal, "setitimer"):
+        yield
+        return
+
+    def agotar(*_):
+        raise TimeoutError(f"La generación del PDF superó los {segundos} segundos.")
+
+    anterior = signal.signal(signal.SIGALRM, agotar)
+    signal.setitimer(signal.ITIMER_REAL, segundos)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, anterior)
+
+
+def renderizar_pdf(plan, items: tuple, tiempo_maximo: float, directorio_paginas: str) -> bytes:
+    """Genera el PDF a partir de una copia del plan con sus items ya validados, sin consultar la base de datos.
+
+    Las páginas que no cambiaron se toman de la caché de páginas del proceso web (`directorio_paginas`).
+    """
+    from pathlib import Path
+
+    from .cache_pdf import cache_paginas
+
+    # Cada proceso atiende un trabajo a la vez, así que el directorio se fija antes de cada uno
+    cache_paginas.directorio = Path(directorio_paginas)
+    with limite_de_tiempo(tiempo_maximo):
+        return plan.renderizar_pdf(items).getvalue()
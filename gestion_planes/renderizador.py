@@ -0,0 +1,125 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from multiprocessing import get_context
+from os import getpid
+from threading import BoundedSemaphore, Lock
+
+from django.conf import settings
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .cache_pdf import cache_paginas
+from .procesos_pdf import iniciar_proceso, renderizar_pdf
+
+
+class RenderizadoNoDisponible(APIException):
+    """No se pudo generar el PDF a tiempo; DRF responde 503 con la cabecera `Retry-After`."""
+
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Hay demasiados PDFs generándose en este momento, intente nuevamente en unos segundos."
+    default_code = "renderizado_no_disponible"
+
+    def __init__(self, detail=None, code=None):
+        super().__init__(detail, code)
+        self.wait = settings.REINTENTO_RENDERIZADO_PDF
+
+
+class GrupoProcesosPDF:
+    """Procesos que generan PDFs fuera de los hilos del servidor web, compartidos por todas las peticiones
+    de este proceso, con una cantidad acotada de cupos para los trabajos que los usan.
+
+    Las subclases indican cuántos procesos (`cantidad_procesos`) y cupos (`cantidad_cupos`) se crean.
+    """
+
+    def __init__(self):
+        self._candado = Lock()
+        self._pid = None
+        self._ejecutor: ProcessPoolExecutor | None = None
+        self._cupos: BoundedSemaphore | None = None
+
+    def cantidad_procesos(self) -> int:
+        ...
+
+    def cantidad_cupos(self) -> int:
+        ...
+
+    def _iniciar(self):
+        """Crea los procesos (también después de un fork del servidor). Se llama con el candado tomado."""
+        if self._pid == getpid() and self._ejecutor is not None:
+            return
+        # Se usa "spawn" para que los procesos no hereden las conexiones a la base de datos del proceso web.
+        self._ejecutor = ProcessPoolExecutor(
+            self.cantidad_procesos(), mp_context=get_context("spawn"), initializer=iniciar_proceso
+        )
+        self._cupos = BoundedSemaphore(self.cantidad_cupos())
+        self._pid = getpid()
+
+    def _obtener(self) -> tuple[ProcessPoolExecutor, BoundedSemaphore]:
+        """Devuelve los procesos y los cupos de este proceso, creándolos si hace falta."""
+        with self._candado:
+            self._iniciar()
+            return self._ejecutor, self._cupos
+
+    def _reiniciar(self, ejecutor: ProcessPoolExecutor):
+        """Descarta un conjunto de procesos averiado (por ejemplo, si un proceso murió)."""
+        with self._candado:
+            if self._ejecutor is ejecutor:
+                self._ejecutor = None
+        ejecutor.shutdown(wait=False, cancel_futures=True)
+
+    def cerrar(self):
+        """Detiene los procesos."""
+        with self._candado:
+            ejecutor, self._ejecutor = self._ejecutor, None
+        if ejecutor is not None:
+            ejecutor.shutdown()
+
+
+class GrupoRenderizadoPDF(GrupoProcesosPDF):
+    """Procesos dedicados a generar los PDFs de las descargas, fuera de los hilos del servidor web.
+
+    Cada trabajo recibe una copia del plan con sus items ya cargados y validados (no consulta la base
+    de datos) y devuelve los bytes del PDF. Como máximo hay `PROCESOS_RENDERIZADO_PDF` PDFs
+    generándose y `COLA_RENDERIZADO_PDF` esperando; si la cola está llena, o un trabajo supera
+    `TIEMPO_MAXIMO_RENDERIZADO_PDF` segundos, se lanza `RenderizadoNoDisponible` en lugar de
+    ocupar el hilo de la petición.
+    """
+
+    def cantidad_procesos(self) -> int:
+        return settings.PROCESOS_RENDERIZADO_PDF
+
+    def cantidad_cupos(self) -> int:
+        return settings.PROCESOS_RENDERIZADO_PDF + settings.COLA_RENDERIZADO_PDF
+
+    def renderizar(self, plan, items: tuple) -> BytesIO:
+        """Genera el PDF del plan en uno de los procesos, o aquí mismo si `PROCESOS_RENDERIZADO_PDF` es 0."""
+        if settings.PROCESOS_RENDERIZADO_PDF < 1:
+            return plan.renderizar_pdf(items)
+
+        ejecutor, cupos = self._obtener()
+        if not cupos.acquire(blocking=False):
+            raise RenderizadoNoDisponible()
+
+        tiempo_maximo = settings.TIEMPO_MAXIMO_RENDERIZADO_PDF
+        try:
+            futuro = ejecutor.submit(renderizar_pdf, plan, items, tiempo_maximo, str(cache_paginas.directorio))
+        except (BrokenProcessPool, RuntimeError):
+            cupos.release()
+            self._reiniciar(ejecutor)
+            raise RenderizadoNoDisponible()
+        # El cupo se libera cuando el trabajo termina, aunque la petición ya haya dejado de esperarlo
+        futuro.add_done_callback(lambda _: cupos.release())
+
+        try:
+            # El proceso corta el trabajo al llegar al tiempo máximo; aquí se espera un poco más como respaldo
+            return BytesIO(futuro.result(timeout=tiempo_maximo + 5))
+        except TimeoutError:
+            raise RenderizadoNoDisponible("El PDF tardó demasiado en generarse, intente nuevamente en unos segundos.")
+        except BrokenProcessPool:
+            self._reiniciar(ejecutor)
+            raise RenderizadoNoDisponible()
+
+
+renderizador_pdf = GrupoRenderizadoPDF()
@@ -0,0 +1,104 @@
+from os import fstat
+from pathlib import Path
+from re import compile
+
+from django.http import FileResponse, HttpResponse
+
+
+PATRON_RANGO = compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class LectorParcial:
+    """Envuelve un archivo para leer solo `longitud` bytes desde la posición actual."""
+
+    def __init__(self, archivo, longitud: int):
+        self.archivo = archivo
+        self.restante = longitud
+
+    def read(self, tamaño: int = -1) -> bytes:
+        if tamaño < 0 or tamaño > self.restante:
+            tamaño = self.restante
+        datos = self.archivo.read(tamaño)
+        self.restante -= len(datos)
+        return datos
+
+    def close(self):
+        self.archivo.close()
+
+
+def interpretar_rango(cabecera: str | None, tamaño: int) -> tuple[int, int] | None:
+    """Devuelve el rango (inicio, fin inclusive) solicitado en la cabecera `Range`.
+
+    Devuelve None cuando no hay cabecera o no se puede interpretar (se responde el archivo completo,
+    incluyendo el caso de varios rangos) y lanza ValueError si el rango no se puede satisfacer.
+    """
+    if not cabecera:
+        return None
+
+    coincidencia = PATRON_RANGO.match(cabecera.strip())
+    if coincidencia is None:
+        return None
+
+    inicio, fin = coincidencia.groups()
+    if not inicio and not fin:
+        return None
+
+    if not inicio:
+        # Rango de sufijo: los últimos N bytes
+        sufijo = int(fin)
+        if sufijo == 0:
+            raise ValueError("Rango vacío.")
+        return max(tamaño - sufijo, 0), tamaño - 1
+
+    inicio = int(inicio)
+    fin = int(fin) if fin else tamaño - 1
+    if inicio >= tamaño or fin < inicio:
+        raise ValueError("Rango fuera del archivo.")
+    return inicio, min(fin, tamaño - 1)
+
+
+def respuesta_pdf(
+    request, ruta: Path, nombre_archivo: str, content_type: str = "application/pdf", adjunto: bool = True
+) -> HttpResponse:
+    """Respuesta que transmite el PDF desde el disco, con `Content-Length` y soporte para `Range`.
+
+    El archivo no se carga en memoria: se envía por bloques (o con sendfile si el servidor WSGI lo permite).
+    El nombre del archivo en caché es la huella del contenido, por lo que se usa como ETag. También se usa
+    para otros archivos con nombre único e inmutable (como los de los trabajos de exportación o las vistas
+    previas, que se muestran en línea con `adjunto=False`).
+
+    El archivo se abre antes de preparar la respuesta: si otro proceso lo desaloja de la caché después, se
+    sigue leyendo el archivo abierto. Lanza FileNotFoundError si ya no existe al abrirlo.
+    """
+    archivo = open(ruta, "rb")
+    tamaño = fstat(archivo.fileno()).st_size
+    etag = f'"{ruta.stem}"'
+
+    rango = None
+    if request.headers.get("If-Range", etag) == etag:
+        try:
+            rango = interpretar_rango(request.headers.get("Range"), tamaño)
+        except ValueError:
+            archivo.close()
+            respuesta = HttpResponse(status=416)
+            respuesta["Content-Range"] = f"bytes */{tamaño}"
+            return respuesta
+
+    if rango is None:
+        respuesta = FileResponse(archivo, content_type=content_type, as_attachment=adjunto, filename=nombre_archivo)
+    else:
+        inicio, fin = rango
+        archivo.seek(inicio)
+        respuesta = FileResponse(
+            LectorParcial(archivo, fin - inicio + 1),
+            status=206,
+            content_type=content_type,
+            as_attachment=adjunto,
+            filename=nombre_archivo,
+        )
+        respuesta["Content-Length"] = fin - inicio + 1
+        respuesta["Content-Range"] = f"bytes {inicio}-{fin}/{tamaño}"
+
+    respuesta["Accept-Ranges"] = "bytes"
+    respuesta["ETag"] = etag
+    return respuesta
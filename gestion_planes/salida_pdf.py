@@ -0,0 +1,181 @@
+from io import BytesIO
+from logging import getLogger
+from shutil import which
+from subprocess import run, CalledProcessError, TimeoutExpired
+from tempfile import TemporaryDirectory
+from pathlib import Path
+from typing import Any, BinaryIO
+
+from django.conf import settings
+
+from pypdf import PdfWriter, PageObject
+from pypdf.generic import (
+    ArrayObject,
+    DecodedStreamObject,
+    DictionaryObject,
+    IndirectObject,
+    NameObject,
+    NumberObject,
+    PdfObject,
+    StreamObject,
+)
+
+
+logger = getLogger(__name__)
+
+# Modos de salida de los PDFs generados (ajuste MODO_SALIDA_PDF)
+MODO_NORMAL = "normal"  # Flujos de contenido sin comprimir
+MODO_COMPRIMIDO = "comprimido"  # Flujos comprimidos y objetos idénticos unificados
+MODO_WEB = "web"  # Comprimido y linealizado con qpdf (vista rápida en la web), si qpdf está instalado
+MODOS_SALIDA_PDF = (MODO_NORMAL, MODO_COMPRIMIDO, MODO_WEB)
+
+
+def linealizar(contenido: bytes) -> bytes:
+    """Linealiza el PDF con qpdf para que los navegadores muestren la primera página antes de terminar la descarga.
+
+    Si qpdf no está instalado o falla, se devuelve el PDF sin linealizar.
+    """
+    qpdf = which("qpdf")
+    if qpdf is None:
+        logger.warning("MODO_SALIDA_PDF es '%s' pero qpdf no está instalado; el PDF no se linealiza.", MODO_WEB)
+        return contenido
+
+    with TemporaryDirectory() as directorio:
+        entrada, salida = Path(directorio) / "entrada.pdf", Path(directorio) / "salida.pdf"
+        entrada.write_bytes(contenido)
+        try:
+            # qpdf termina con código 3 cuando solo hubo advertencias
+            resultado = run([qpdf, "--linearize", str(entrada), str(salida)], capture_output=True, timeout=30)
+            if resultado.returncode not in (0, 3):
+                raise CalledProcessError(resultado.returncode, resultado.args, resultado.stdout, resultado.stderr)
+        except (CalledProcessError, TimeoutExpired) as error:
+            logger.warning("No se pudo linealizar el PDF: %s", error)
+            return contenido
+        return salida.read_bytes()
+
+
+def escribir_pdf(salida: PdfWriter, modo: str | None = None) -> BytesIO:
+    """Escribe el documento según el modo de salida (por defecto `MODO_SALIDA_PDF`) y devuelve el buffer final."""
+    modo = modo or settings.MODO_SALIDA_PDF
+    if modo not in MODOS_SALIDA_PDF:
+        raise ValueError(f"Modo de salida de PDF desconocido: '{modo}'. Los modos válidos son {MODOS_SALIDA_PDF}")
+
+    if modo != MODO_NORMAL:
+        for pagina in salida.pages:
+            pagina.compress_content_streams()
+        salida.compress_identical_objects(remove_identicals=True, remove_orphans=True)
+
+    flujo_salida = BytesIO()
+    salida.write(flujo_salida)
+
+    if modo == MODO_WEB:
+        flujo_salida = BytesIO(linealizar(flujo_salida.getvalue()))
+
+    flujo_salida.seek(0)
+    return flujo_salida
+
+
+class EscritorPDFEnFlujo:
+    """Escribe un PDF en un archivo página por página, sin mantener las páginas anteriores en memoria.
+
+    Cada página se escribe apenas se agrega; solo se guardan la posición de cada objeto (para la tabla de
+    referencias) y los objetos ya copiados de otros documentos. Los recursos compartidos por las páginas
+    (como los de la plantilla encabezada: fuentes e imágenes) se escriben una sola vez. Los flujos de
+    contenido se comprimen salvo en el modo normal; el modo web no se puede linealizar por partes y se
+    escribe como el comprimido.
+    """
+
+    # El catálogo y el árbol de páginas se reservan al inicio y se escriben al cerrar
+    CATALOGO, ARBOL_PAGINAS = 1, 2
+
+    def __init__(self, destino: BinaryIO, modo: str | None = None):
+        self.destino = destino
+        self.comprimir = (modo or settings.MODO_SALIDA_PDF) != MODO_NORMAL
+        self._posiciones: list[int | None] = [None, None]
+        self._copiados: dict[tuple[Any, int, int], IndirectObject] = {}
+        self._recursos: dict[int, tuple[PdfObject, IndirectObject]] = {}
+        self._paginas: list[int] = []
+        destino.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+
+    def _reservar(self) -> int:
+        self._posiciones.append(None)
+        return len(self._posiciones)
+
+    def _escribir(self, numero: int, objeto: PdfObject) -> IndirectObject:
+        self._posiciones[numero - 1] = self.destino.tell()
+        self.destino.write(f"{numero} 0 obj\n".encode())
+        objeto.write_to_stream(self.destino)
+        self.destino.write(b"\nendobj\n")
+        return IndirectObject(numero, 0, None)
+
+    def _copiar(self, objeto: PdfObject) -> PdfObject:
+        """Copia un objeto de otro documento, escribiendo (una sola vez) los objetos indirectos que referencia."""
+        if isinstance(objeto, IndirectObject):
+            # La clave incluye el documento (y no su id), así no se confunde con otro creado después. Solo
+            # las páginas con recursos propios (no las armadas sobre la plantilla encabezada) agregan documentos
+            clave = (objeto.pdf, objeto.idnum, objeto.generation)
+            if clave not in self._copiados:
+                # Se registra antes de copiar el contenido, por si el objeto se referencia a sí mismo
+                numero = self._reservar()
+                self._copiados[clave] = IndirectObject(numero, 0, None)
+                self._escribir(numero, self._copiar(objeto.get_object()))
+            return self._copiados[clave]
+
+        if isinstance(objeto, StreamObject):
+            # Se conservan los datos tal como están codificados (imágenes, fuentes incrustadas)
+            copia = DecodedStreamObject()
+            copia.set_data(objeto._data)
+            copia.update({clave: self._copiar(valor) for clave, valor in objeto.items()})
+            return copia
+        if isinstance(objeto, DictionaryObject):
+            return DictionaryObject({clave: self._copiar(valor) for clave, valor in objeto.items()})
+        if isinstance(objeto, ArrayObject):
+            return ArrayObject(self._copiar(valor) for valor in objeto)
+        return objeto
+
+    def _copiar_recursos(self, recursos: PdfObject) -> IndirectObject:
+        """Escribe el diccionario de recursos una vez por objeto, así las páginas que lo comparten lo referencian."""
+        if id(recursos) not in self._recursos:
+            # Se conserva una referencia al diccionario para que su id no se reutilice
+            self._recursos[id(recursos)] = (recursos, self._escribir(self._reservar(), self._copiar(recursos)))
+        return self._recursos[id(recursos)][1]
+
+    def agregar_pagina(self, pagina: PageObject):
+        """Escribe la página (su flujo de contenido, sus recursos y su diccionario) al final del archivo."""
+        contenido = DecodedStreamObject()
+        contenido.set_data(pagina.get_contents().get_data())
+        if self.comprimir:
+            contenido = contenido.flate_encode()
+
+        copia = DictionaryObject()
+        for clave, valor in pagina.items():
+            if clave == "/Resources":
+                copia[NameObject(clave)] = self._copiar_recursos(valor)
+            elif clave not in ("/Parent", "/Contents"):
+                copia[NameObject(clave)] = self._copiar(valor)
+        copia[NameObject("/Parent")] = IndirectObject(self.ARBOL_PAGINAS, 0, None)
+        copia[NameObject("/Contents")] = self._escribir(self._reservar(), contenido)
+
+        numero = self._reservar()
+        self._escribir(numero, copia)
+        self._paginas.append(numero)
+
+    def cerrar(self) -> int:
+        """Escribe el árbol de páginas, el catálogo y la tabla de referencias. Devuelve la cantidad de páginas."""
+        self._escribir(self.ARBOL_PAGINAS, DictionaryObject({
+            NameObject("/Type"): NameObject("/Pages"),
+            NameObject("/Kids"): ArrayObject(IndirectObject(numero, 0, None) for numero in self._paginas),
+            NameObject("/Count"): NumberObject(len(self._paginas)),
+        }))
+        self._escribir(self.CATALOGO, DictionaryObject({
+            NameObject("/Type"): NameObject("/Catalog"),
+            NameObject("/Pages"): IndirectObject(self.ARBOL_PAGINAS, 0, None),
+        }))
+
+        inicio_referencias = self.destino.tell()
+        self.destino.write(f"xref\n0 {len(self._posiciones) + 1}\n0000000000 65535 f \n".encode())
+        for posicion in self._posiciones:
+            self.destino.write(f"{posicion:010} 00000 n \n".encode())
+        self.destino.write(f"trailer\n<< /Size {len(self._posiciones) + 1} /Root {self.CATALOGO} 0 R >>\n".encode())
+        self.destino.write(f"startxref\n{inicio_referencias}\n%%EOF\n".encode())
+        return len(self._paginas)
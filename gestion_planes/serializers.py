@@ -5,9 +5,15 @@ from .models import (
     ObjetivoPlanAprendizaje,
     PlanEvaluacion,
     ItemPlanEvaluacion,
+    TrabajoExportacion,
+    PesoTotalExcedido,
+    OPCIONES_NUCLEO,
+    OPCIONES_TURNO,
 )
 from autenticacion_docente.models import Docente
 
+from django.db import transaction
+from django.urls import reverse
 from django.utils.timezone import now
 
 
@@ -84,13 +90,16 @@ class SerializadorPlanAprendizaje(serializers.ModelSerializer):
     Serializador para el modelo PlanAprendizaje.
     Incluye todos los campos del modelo y relaciones con Docente y UnidadCurricular.
 
-    Incluye un campo de solo lectura para los objetivos asociados y un campo
-    para obtener el ID del Plan de Evaluación asociado.
+    Incluye un campo de solo lectura para los objetivos asociados, un campo
+    para obtener el ID del Plan de Evaluación asociado y el estado de exportación
+    (`exportable` y `motivos_no_exportable`), calculado con los contadores del plan.
     """
     docente = serializers.PrimaryKeyRelatedField(queryset=Docente.objects.all())
     unidad_curricular = serializers.PrimaryKeyRelatedField(queryset=UnidadCurricular.objects.all())
     objetivos_plan_aprendizaje = SerializadorObjetivoPlanAprendizaje(many=True, read_only=True, source='objetivoplanaprendizaje_set')
     plan_evaluacion = serializers.SerializerMethodField("get_plan_evaluacion")
+    exportable = serializers.BooleanField(read_only=True)
+    motivos_no_exportable = serializers.ListField(child=serializers.CharField(), read_only=True)
 
     class Meta:
         model = PlanAprendizaje
@@ -106,8 +115,9 @@ class SerializadorPlanAprendizaje(serializers.ModelSerializer):
         Returns:
             int | None: El ID del Plan de Evaluación si existe, None en caso contrario.
         """
+        # Con `PlanAprendizaje.consulta_serializacion` el plan de evaluación ya viene cargado, sin otra consulta
         try:
-            return PlanEvaluacion.objects.get(plan_aprendizaje=instancia).pk
+            return instancia.planevaluacion.pk
         except PlanEvaluacion.DoesNotExist:
             pass
 
@@ -146,16 +156,20 @@ class SerializadorItemPlanEvaluacion(serializers.ModelSerializer):
         """
         pe: PlanEvaluacion = validated_data['plan_evaluacion']
         peso: int = validated_data['peso']
-        total_teorico = pe.peso_total + peso
-        if total_teorico > 100:
-            peso_disponible = 100 - pe.peso_total
+        # El límite lo garantiza el modelo al guardar (ver `PlanEvaluacion.ajustar_peso_total`), en la misma
+        # transacción que la fecha de modificación del plan
+        try:
+            with transaction.atomic():
+                pe.fecha_modificacion = now()
+                pe.save()
+                return super().create(validated_data)
+        except PesoTotalExcedido as error:
+            total_teorico = error.peso_total + peso
+            peso_disponible = 100 - error.peso_total
             complemento = f"Actualmente queda un {peso_disponible}% por asignar." if peso_disponible > 0 else ''
             raise serializers.ValidationError(
                 f"No se puede crear un nuevo item con peso {peso}% ya que se superaría el límite de 100% para un plan de evaluación ({total_teorico}%).{complemento}"
             )
-        pe.fecha_modificacion = now()
-        pe.save()
-        return super().create(validated_data)
 
     def update(self, instance: ItemPlanEvaluacion, validated_data):
         """
@@ -173,16 +187,18 @@ class SerializadorItemPlanEvaluacion(serializers.ModelSerializer):
         Raises:
             serializers.ValidationError: Si al actualizar el ítem se supera el 100% del peso total.
         """
-        pe: PlanEvaluacion = validated_data['plan_evaluacion']
-        peso: int = validated_data['peso']
-        nuevo_total_teorico = (pe.peso_total + peso) - instance.peso
-        if nuevo_total_teorico > 100:
+        pe: PlanEvaluacion = validated_data.get('plan_evaluacion', instance.plan_evaluacion)
+        peso: int = validated_data.get('peso', instance.peso)
+        try:
+            with transaction.atomic():
+                pe.fecha_modificacion = now()
+                pe.save()
+                return super().update(instance, validated_data)
+        except PesoTotalExcedido as error:
+            nuevo_total_teorico = error.peso_total + error.diferencia
             raise serializers.ValidationError(
                 f"No se puede actualizar este item con peso {peso}% ya que se superaría el límite de 100% para un plan de evaluación ({nuevo_total_teorico}%)."
             )
-        pe.fecha_modificacion = now()
-        pe.save()
-        return super().update(instance, validated_data)
 
 
 class SerializadorPlanEvaluacion(serializers.ModelSerializer):
@@ -191,13 +207,15 @@ class SerializadorPlanEvaluacion(serializers.ModelSerializer):
     Incluye todos los campos del modelo, una relación con el Plan de Aprendizaje
     y un campo de solo lectura para los ítems asociados.
 
-    Incluye un campo para mostrar el peso total actual de los ítems
-    y sobreescribe el método `create` para validar que no exista
+    Incluye un campo para mostrar el peso total actual de los ítems, el estado
+    de exportación (`exportable` y `motivos_no_exportable`) y sobreescribe el método `create` para validar que no exista
     ya un Plan de Evaluación asociado al Plan de Aprendizaje.
     """
     plan_aprendizaje = serializers.PrimaryKeyRelatedField(queryset=PlanAprendizaje.objects.all())
     items_plan_evaluacion = SerializadorItemPlanEvaluacion(many=True, read_only=True, source='itemplanevaluacion_set')
     peso_total_actual = serializers.SerializerMethodField('obtener_peso_total')
+    exportable = serializers.BooleanField(read_only=True)
+    motivos_no_exportable = serializers.ListField(child=serializers.CharField(), read_only=True)
 
     class Meta:
         model = PlanEvaluacion
@@ -206,7 +224,7 @@ class SerializadorPlanEvaluacion(serializers.ModelSerializer):
     def obtener_peso_total(self, instancia: PlanEvaluacion) -> str:
         """
         Obtiene el peso total actual de los ítems asociados al Plan de Evaluación
-        y lo formatea como una cadena con el símbolo de porcentaje.
+        (guardado en el mismo plan) y lo formatea como una cadena con el símbolo de porcentaje.
 
         Args:
             instancia (PlanEvaluacion): La instancia del Plan de Evaluación.
@@ -235,4 +253,79 @@ class SerializadorPlanEvaluacion(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 f"Ya existe un plan de evaluación asociado al plan de aprendizaje ({pa.codigo_grupo})"
             )
-        return super().create(validated_data)
\ No newline at end of file
+        return super().create(validated_data)
+
+
+class SerializadorFiltroExportacion(serializers.Serializer):
+    """
+    Serializador para validar los filtros de la exportación masiva de planes.
+    Todos los filtros son opcionales; `tipo` limita la exportación a planes
+    de aprendizaje ("pa") o de evaluación ("pe").
+    """
+    nucleo = serializers.ChoiceField(choices=OPCIONES_NUCLEO, required=False)
+    turno = serializers.ChoiceField(choices=OPCIONES_TURNO, required=False)
+    unidad_curricular = serializers.PrimaryKeyRelatedField(queryset=UnidadCurricular.objects.all(), required=False)
+    tipo = serializers.ChoiceField(choices=[('pa', 'Planes de aprendizaje'), ('pe', 'Planes de evaluación')], required=False)
+
+
+class SerializadorTrabajoExportacion(serializers.ModelSerializer):
+    """
+    Serializador para el modelo TrabajoExportacion.
+    Al crear recibe los planes de aprendizaje (códigos de grupo) y de evaluación (IDs) a exportar,
+    que deben pertenecer al docente del contexto (`docente`).
+
+    Incluye la URL de descarga del archivo una vez completado el trabajo y mientras no haya expirado.
+    """
+    planes_aprendizaje = serializers.ListField(child=serializers.CharField(), write_only=True, required=False)
+    planes_evaluacion = serializers.ListField(child=serializers.IntegerField(), write_only=True, required=False)
+    url_descarga = serializers.SerializerMethodField('obtener_url_descarga')
+
+    class Meta:
+        model = TrabajoExportacion
+        exclude = ['docente', 'planes', 'nombre_archivo']
+        read_only_fields = [
+            'estado', 'paginas_generadas', 'paginas_totales', 'error',
+            'fecha_creacion', 'fecha_finalizacion', 'fecha_expiracion',
+        ]
+
+    def obtener_url_descarga(self, instancia: TrabajoExportacion) -> str | None:
+        """
+        Obtiene la URL de descarga del archivo generado.
+
+        Args:
+            instancia (TrabajoExportacion): La instancia del trabajo de exportación.
+
+        Returns:
+            str | None: La URL si el trabajo está completado y vigente, None en caso contrario.
+        """
+        if instancia.estado != 'COM' or instancia.expirado:
+            return None
+        url = reverse('exportaciones-descargar', kwargs={'pk': instancia.pk})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def validate(self, attrs):
+        """
+        Valida que se indique al menos un plan y que todos pertenezcan al docente.
+
+        Raises:
+            serializers.ValidationError: Si no se indicó ningún plan o alguno no existe o es de otro docente.
+        """
+        docente = self.context['docente']
+        codigos = list(dict.fromkeys(attrs.pop('planes_aprendizaje', [])))
+        ids = list(dict.fromkeys(attrs.pop('planes_evaluacion', [])))
+        if not codigos and not ids:
+            raise serializers.ValidationError("Se debe indicar al menos un plan de aprendizaje o de evaluación.")
+
+        encontrados = set(PlanAprendizaje.objects.filter(docente=docente, codigo_grupo__in=codigos).values_list('pk', flat=True))
+        faltantes = [str(codigo) for codigo in codigos if codigo not in encontrados]
+        encontrados = set(PlanEvaluacion.objects.filter(plan_aprendizaje__docente=docente, id__in=ids).values_list('pk', flat=True))
+        faltantes += [str(_id) for _id in ids if _id not in encontrados]
+        if faltantes:
+            raise serializers.ValidationError(f"No se encontraron los planes: {', '.join(faltantes)}")
+
+        attrs['planes'] = (
+            [[PlanAprendizaje._meta.label, codigo] for codigo in codigos]
+            + [[PlanEvaluacion._meta.label, _id] for _id in ids]
+        )
+        return attrs
@@ -0,0 +1,75 @@
+from django.db.models import Count, QuerySet
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from .models import (
+    PlanAprendizaje,
+    ObjetivoPlanAprendizaje,
+    PlanEvaluacion,
+    ItemPlanEvaluacion,
+)
+from .prerenderizado import prerenderizador_pdf
+
+
+# Cualquier cambio en un plan o en sus filas puede cambiar tanto el PDF del plan de aprendizaje
+# como el del plan de evaluación (que muestra los títulos de los objetivos), por eso se programa el grupo completo.
+
+@receiver([post_save, post_delete], sender=PlanAprendizaje)
+def prerenderizar_plan_aprendizaje(sender, instance: PlanAprendizaje, **kwargs):
+    prerenderizador_pdf.programar(instance.codigo_grupo)
+
+
+@receiver([post_save, post_delete], sender=ObjetivoPlanAprendizaje)
+def prerenderizar_objetivo(sender, instance: ObjetivoPlanAprendizaje, **kwargs):
+    prerenderizador_pdf.programar(instance.plan_aprendizaje_id)
+
+
+@receiver([post_save, post_delete], sender=PlanEvaluacion)
+def prerenderizar_plan_evaluacion(sender, instance: PlanEvaluacion, **kwargs):
+    prerenderizador_pdf.programar(instance.plan_aprendizaje_id)
+
+
+@receiver([post_save, post_delete], sender=ItemPlanEvaluacion)
+def prerenderizar_item(sender, instance: ItemPlanEvaluacion, origin=None, **kwargs):
+    if origin is None or origin is instance:
+        prerenderizador_pdf.programar(instance.plan_evaluacion.plan_aprendizaje_id)
+        return
+
+    # En las eliminaciones en cascada el plan (o el docente) eliminado ya programa el grupo
+    if not (isinstance(origin, QuerySet) and origin.model is ItemPlanEvaluacion):
+        return
+    # En las eliminaciones en lote se consulta el grupo una sola vez por plan de evaluación
+    if not hasattr(origin, '_grupos_prerenderizado'):
+        origin._grupos_prerenderizado = {}
+    grupos: dict = origin._grupos_prerenderizado
+    if instance.plan_evaluacion_id not in grupos:
+        grupos[instance.plan_evaluacion_id] = (
+            PlanEvaluacion.objects.values_list('plan_aprendizaje', flat=True).get(pk=instance.plan_evaluacion_id)
+        )
+        prerenderizador_pdf.programar(grupos[instance.plan_evaluacion_id])
+
+
+# Se usa la señal (y no `ItemPlanEvaluacion.delete`) para cubrir también las eliminaciones en lote y en
+# cascada, que envían la señal por cada item dentro de la transacción de la eliminación.
+@receiver(post_delete, sender=ItemPlanEvaluacion)
+def descontar_peso_item(sender, instance: ItemPlanEvaluacion, **kwargs):
+    PlanEvaluacion.ajustar_peso_total(instance.plan_evaluacion_id, -instance.peso)
+
+
+@receiver(post_delete, sender=ObjetivoPlanAprendizaje)
+def descontar_objetivo(sender, instance: ObjetivoPlanAprendizaje, **kwargs):
+    PlanAprendizaje.ajustar_contadores(
+        instance.plan_aprendizaje_id, objetivos=-1, sin_evaluacion=-int(instance.evaluacion_asociada_id is None)
+    )
+
+
+# Los objetivos asociados al item quedan sin evaluación (`SET_NULL`), lo que Django hace con un UPDATE que
+# no pasa por `ObjetivoPlanAprendizaje.save`; se cuentan antes de eliminar el item.
+@receiver(pre_delete, sender=ItemPlanEvaluacion)
+def liberar_objetivos_item(sender, instance: ItemPlanEvaluacion, **kwargs):
+    por_plan = (
+        ObjetivoPlanAprendizaje.objects.filter(evaluacion_asociada=instance.pk)
+        .order_by().values_list('plan_aprendizaje').annotate(cantidad=Count('pk'))
+    )
+    for plan, cantidad in por_plan:
+        PlanAprendizaje.ajustar_contadores(plan, sin_evaluacion=cantidad)
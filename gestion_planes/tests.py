@@ -1,3 +1,1240 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from io import BytesIO, StringIO
+from os import utime
+from pathlib import Path
+from tempfile import TemporaryDirectory, TemporaryFile
+from concurrent.futures import ThreadPoolExecutor
+from fcntl import flock, LOCK_EX, LOCK_UN
+from threading import Barrier, Event, Thread
+from time import sleep
+from zipfile import ZipFile
+from json import loads
+from shutil import copy, which
+from unittest import mock, skipUnless
+import tracemalloc
 
-# Create your tests here.
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection, DatabaseError
+from django.db.models import Sum
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+
+from PIL import Image
+from pypdf import PdfReader, PdfWriter
+from rest_framework.serializers import ValidationError
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import landscape, letter
+from reportlab.lib.colors import black
+
+from autenticacion_docente.docentes import cache_docentes
+from autenticacion_docente.models import Docente
+from autenticacion_docente.sesiones import emitir_token
+
+from .cache_pdf import cache_pdf, cache_paginas
+from .plantillas import registro_encabezados
+from .procesos_pdf import limite_de_tiempo, exportar_plan
+from .prerenderizado import prerenderizar_grupo
+from .renderizador import GrupoRenderizadoPDF
+from .salida_pdf import MODO_NORMAL, MODO_COMPRIMIDO, MODO_WEB
+from .vista_previa import dibujar_vista_previa, fondo_plantilla, obtener_vista_previa
+from .utils import ajustar_texto, ancho_texto
+from .models import (
+    UnidadCurricular,
+    PlanAprendizaje,
+    ObjetivoPlanAprendizaje,
+    PlanEvaluacion,
+    ItemPlanEvaluacion,
+    PesoTotalExcedido,
+    TrabajoExportacion,
+)
+from .exportaciones import AvanceTrabajo, ejecutar_trabajo, expirar_trabajos, recuperar_trabajos
+from .exportacion_masiva import GrupoExportacionPDF
+from .expediente import ExpedientePDF
+
+
+def crear_plan_completo(
+    cantidad_objetivos: int = 14, cedula: int = 28318187, codigo_grupo: str = "INF_(AYP-0)_FLO_N", nucleo: str = "FLO"
+):
+    """Crea un plan de aprendizaje con su plan de evaluación, exportables ambos."""
+
+    docente, _ = Docente.objects.get_or_create(
+        cedula=cedula, defaults={"correo": "sidesrev@gmail.com", "nombre": "Ricardo", "apellido": "Marin"}
+    )
+    uc, _ = UnidadCurricular.objects.get_or_create(
+        codigo="AYP-0", defaults={"trayecto": 2, "semestre": 1, "unidades_credito": 3, "nombre": "Algorítmica y Programación"}
+    )
+    pa = PlanAprendizaje.objects.create(
+        codigo_grupo=codigo_grupo, docente=docente, unidad_curricular=uc, nucleo=nucleo, turno="N", pnf="Informática (PNFi)"
+    )
+    pe = PlanEvaluacion.objects.create(nombre=f"P.E {codigo_grupo}", plan_aprendizaje=pa)
+    items = [
+        ItemPlanEvaluacion.objects.create(
+            plan_evaluacion=pe, habilidades_a_evaluar=f"Habilidad evaluada {i}", peso=20, fecha_planificada=date(2025, 5, 1 + i)
+        )
+        for i in range(5)
+    ]
+    for i in range(cantidad_objetivos):
+        objetivo = pa.añadir_objetivo(
+            f"Objetivo {i}",
+            "Definir y aplicar conceptos como algoritmos, variables y estructuras de control. " * (1 + i % 2),
+            "Diseñar algoritmos para resolver problemas sencillos.",
+            "CL",
+            2 + i % 8,
+        )
+        items[i % len(items)].agregar_objetivo(objetivo)
+    return pa, pe
+
+
+def iniciar_sesion_docente(cliente: Client, docente: Docente):
+    """Autentica al cliente de pruebas con un token de sesión del docente."""
+    cliente.cookies[settings.NOMBRE_COOKIE_SESION_DOCENTE] = emitir_token(docente)
+
+
+def textos_por_pagina(flujo: BytesIO) -> list[str]:
+    return [pagina.extract_text() for pagina in PdfReader(flujo).pages]
+
+
+def generar_pdf_pagina_por_pagina(plan) -> BytesIO:
+    """Referencia: un lienzo, un buffer y una plantilla por página, como se generaba originalmente."""
+    salida = PdfWriter()
+    items = tuple(enumerate(plan.obtener_items_pdf(), 1))
+    for parte in plan.paginar(items):
+        plantilla = PdfReader(plan.plantilla_para_pdf).pages[0]
+        buffer = BytesIO()
+        lienzo = canvas.Canvas(buffer, pagesize=landscape(letter))
+        lienzo.setFont("Helvetica", 11)
+        plan.escribir_encabezado(lienzo)
+        lienzo.setFillColor(black)
+        plan.llenar_tabla(lienzo, parte)
+        lienzo.save()
+        plantilla.merge_page(PdfReader(BytesIO(buffer.getvalue())).pages[0])
+        salida.add_page(plantilla)
+
+    flujo = BytesIO()
+    salida.write(flujo)
+    flujo.seek(0)
+    return flujo
+
+
+def usar_cache_temporal(prueba: TestCase):
+    """Dirige la caché de PDFs a un directorio temporal durante la prueba."""
+    directorio = TemporaryDirectory()
+    prueba.addCleanup(directorio.cleanup)
+    ajustes = override_settings(DIRECTORIO_CACHE_PDF=directorio.name, TAMAÑO_MAXIMO_CACHE_PDF=10 * 1024 * 1024)
+    ajustes.enable()
+    prueba.addCleanup(ajustes.disable)
+
+
+class PruebasGeneracionPDF(TestCase):
+
+    def setUp(self):
+        usar_cache_temporal(self)
+        self.pa, self.pe = crear_plan_completo()
+
+    def test_capa_unica_conserva_texto_por_pagina(self):
+        for plan in (self.pa, self.pe):
+            with self.subTest(plan=plan.__class__.__name__):
+                esperado = textos_por_pagina(generar_pdf_pagina_por_pagina(plan))
+                obtenido = textos_por_pagina(plan.generar_pdf())
+                self.assertEqual(obtenido, esperado)
+
+    def test_paginacion_segun_alto_de_filas(self):
+        objetivos = tuple(enumerate(self.pa.obtener_items_pdf(), 1))
+        partes = self.pa.paginar(objetivos)
+        self.assertLess(len(partes), 3)  # Con 6 filas fijas por página serían 3
+        self.assertEqual(sum(partes, ()), objetivos)
+        for parte in partes:
+            self.assertLessEqual(len(parte), self.pa.maximo_objetos_por_pagina)
+            alto = sum(self.pa.alto_fila(self.pa.ajustar_fila(i, objetivo)) for i, objetivo in parte)
+            self.assertGreaterEqual(self.pa.inicio_tabla_y - alto + self.pa.separacion_filas + 12, self.pa.limite_tabla_y)
+
+    def test_plantilla_compartida_no_se_altera(self):
+        primera = textos_por_pagina(self.pa.generar_pdf())
+        segunda = textos_por_pagina(self.pa.generar_pdf())
+        self.assertEqual(primera, segunda)
+
+
+class PruebasPlantillaEncabezada(TestCase):
+
+    def setUp(self):
+        usar_cache_temporal(self)
+        registro_encabezados.limpiar()
+        self.pa, _ = crear_plan_completo(40)
+
+    def test_encabezado_se_dibuja_una_vez(self):
+        escribir_encabezado = PlanAprendizaje.escribir_encabezado
+        with mock.patch.object(PlanAprendizaje, "escribir_encabezado", autospec=True, side_effect=escribir_encabezado) as escribir:
+            primera = textos_por_pagina(self.pa.generar_pdf())
+            segunda = textos_por_pagina(self.pa.generar_pdf())
+        self.assertGreater(len(primera), 1)
+        self.assertEqual(escribir.call_count, 1)
+        self.assertEqual(primera, segunda)
+        for texto in primera:
+            self.assertIn(self.pa.nombre_docente, texto)
+
+    def test_cambio_en_encabezado_genera_otra_plantilla(self):
+        anterior = self.pa.plantilla_encabezada()
+        self.pa.turno = "M"
+        nueva = self.pa.plantilla_encabezada()
+        self.assertIsNot(anterior, nueva)
+        self.assertIn("Matutino", nueva.copiar_pagina().extract_text())
+        self.assertIs(self.pa.plantilla_encabezada(), nueva)
+
+
+class PruebasPaginasPDF(TestCase):
+
+    def setUp(self):
+        usar_cache_temporal(self)
+        self.pa, _ = crear_plan_completo(40)
+        self.primera = textos_por_pagina(self.pa.generar_pdf())
+
+    def generar_contando_partes(self) -> tuple[list[str], list]:
+        """Genera el PDF y devuelve sus textos junto a las partes que se dibujaron."""
+        generar_capa = PlanAprendizaje.generar_capa
+        dibujadas = []
+
+        def contar(plan, partes, *args):
+            partes = tuple(partes)
+            dibujadas.extend(partes)
+            return generar_capa(plan, partes, *args)
+
+        with mock.patch.object(PlanAprendizaje, "generar_capa", autospec=True, side_effect=contar):
+            textos = textos_por_pagina(self.pa.generar_pdf())
+        return textos, dibujadas
+
+    def test_paginas_sin_cambios_no_se_dibujan(self):
+        textos, dibujadas = self.generar_contando_partes()
+        self.assertEqual(dibujadas, [])
+        self.assertEqual(textos, self.primera)
+
+    def test_edicion_regenera_solo_su_pagina(self):
+        self.assertGreater(len(self.primera), 3)
+        objetivo = self.pa.objetivos_pa.last()
+        objetivo.criterio_logro = "Resolver problemas sencillos con algoritmos."
+        objetivo.save()
+
+        textos, dibujadas = self.generar_contando_partes()
+        self.assertEqual(len(dibujadas), 1)
+        self.assertEqual(textos[:-1], self.primera[:-1])
+        self.assertIn("Resolver problemas sencillos con algoritmos.", textos[-1].replace("\n", " "))
+        with override_settings(CACHE_PAGINAS_PDF=False):
+            self.assertEqual(textos, textos_por_pagina(self.pa.generar_pdf()))
+
+
+class PruebasSalidaPDF(TestCase):
+
+    def setUp(self):
+        usar_cache_temporal(self)
+        self.pa, _ = crear_plan_completo(40)
+
+    def test_salida_comprimida_conserva_el_texto(self):
+        with override_settings(MODO_SALIDA_PDF=MODO_NORMAL):
+            normal = self.pa.generar_pdf().getvalue()
+        with override_settings(MODO_SALIDA_PDF=MODO_COMPRIMIDO):
+            comprimido = self.pa.generar_pdf().getvalue()
+        self.assertLess(len(comprimido), len(normal) * 0.8)
+        self.assertEqual(textos_por_pagina(BytesIO(comprimido)), textos_por_pagina(BytesIO(normal)))
+
+    def test_cada_modo_tiene_su_archivo(self):
+        with override_settings(MODO_SALIDA_PDF=MODO_NORMAL):
+            normal = self.pa.exportar_pdf()
+        with override_settings(MODO_SALIDA_PDF=MODO_COMPRIMIDO):
+            comprimido = self.pa.exportar_pdf()
+        self.assertNotEqual(normal, comprimido)
+
+    def test_modo_desconocido(self):
+        with override_settings(MODO_SALIDA_PDF="zip"), self.assertRaises(ValueError):
+            self.pa.generar_pdf()
+
+    @skipUnless(which("qpdf"), "qpdf no está instalado")
+    def test_salida_linealizada(self):
+        with override_settings(MODO_SALIDA_PDF=MODO_WEB):
+            web = self.pa.generar_pdf()
+        self.assertIn(b"/Linearized", web.getvalue()[:1024])
+        self.assertEqual(textos_por_pagina(web), textos_por_pagina(self.pa.generar_pdf()))
+
+
+class PruebasVistaPrevia(TestCase):
+
+    def setUp(self):
+        usar_cache_temporal(self)
+        self.pa, self.pe = crear_plan_completo(40)
+        iniciar_sesion_docente(self.client, self.pa.docente)
+        self.url = f"/gestion-planes/planes-aprendizaje/{self.pa.codigo_grupo}/vista-previa"
+
+    def test_vista_previa_de_una_pagina(self):
+        respuesta = self.client.get(self.url, {"pagina": 2})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta["Content-Type"], "image/png")
+        self.assertEqual(int(respuesta["X-Total-Paginas"]), len(PdfReader(self.pa.generar_pdf()).pages))
+        with Image.open(BytesIO(b"".join(respuesta.streaming_content))) as imagen:
+            self.assertEqual(imagen.width, settings.ANCHO_VISTA_PREVIA_PDF)
+
+        respuesta = self.client.get(self.url, {"pagina": int(respuesta["X-Total-Paginas"]) + 1})
+        self.assertEqual(respuesta.status_code, 404)
+
+    def test_vista_previa_en_cache_hasta_que_cambia_la_pagina(self):
+        with mock.patch("gestion_planes.vista_previa.dibujar_vista_previa", side_effect=dibujar_vista_previa) as dibujar:
+            primera, _ = obtener_vista_previa(self.pa)
+            self.assertEqual(obtener_vista_previa(self.pa)[0], primera)
+        dibujar.assert_called_once()
+
+        objetivo = self.pa.objetivos_pa.first()
+        objetivo.contenido = "Contenido actualizado"
+        objetivo.save()
+        self.assertNotEqual(obtener_vista_previa(self.pa)[0], primera)
+
+    def test_vista_previa_del_plan_de_evaluacion(self):
+        respuesta = self.client.get(f"/gestion-planes/planes-evaluacion/{self.pe.pk}/vista-previa")
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta["Content-Type"], "image/png")
+
+    def copiar_plantilla(self) -> Path:
+        """Copia la plantilla del plan de aprendizaje y su PNG a un directorio temporal."""
+        directorio = TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        plantilla = copy(self.pa.plantilla_para_pdf, directorio.name)
+        copy(self.pa.plantilla_para_pdf.with_suffix(".png"), directorio.name)
+        return Path(plantilla)
+
+    def test_fondo_de_otra_version_de_la_plantilla(self):
+        plantilla = self.copiar_plantilla()
+        self.assertEqual(fondo_plantilla(plantilla, 792).width, 792)
+
+        # Un PNG que no se generó a partir del PDF actual no se usa
+        with open(plantilla, "ab") as archivo:
+            archivo.write(b"\n% plantilla modificada\n")
+        with self.assertRaises(ImproperlyConfigured):
+            fondo_plantilla(plantilla, 792)
+
+    def test_vista_previa_cambia_con_el_fondo(self):
+        plantilla = self.copiar_plantilla()
+        with mock.patch.object(PlanAprendizaje, "plantilla_para_pdf", new_callable=mock.PropertyMock, return_value=plantilla):
+            primera, _ = obtener_vista_previa(self.pa)
+            utime(plantilla.with_suffix(".png"), (1000, 1000))  # PNG regenerado
+            self.assertNotEqual(obtener_vista_previa(self.pa)[0], primera)
+
+
+class PruebasExportacionEnFlujo(TestCase):
+
+    def setUp(self):
+        usar_cache_temporal(self)
+        self.pa, self.pe = crear_plan_completo(5)
+
+    def agregar_objetivos(self, cantidad: int):
+        item = self.pe.itemplanevaluacion_set.first()
+        inicio = self.pa.objetivos_pa.count()
+        ObjetivoPlanAprendizaje.objects.bulk_create(
+            ObjetivoPlanAprendizaje(
+                plan_aprendizaje=self.pa,
+                docente=self.pa.docente,
+                titulo=f"Objetivo {i}",
+                contenido="Definir y aplicar conceptos como algoritmos y variables. " * (1 + i % 3),
+                criterio_logro="Diseñar algoritmos para resolver problemas sencillos.",
+                estrategia_didactica="CL",
+                duracion_horas=2 + i % 8,
+                evaluacion_asociada=item,
+            )
+            for i in range(inicio, inicio + cantidad)
+        )
+
+    def pico_memoria(self) -> int:
+        """Pico de memoria al escribir el PDF en flujo (la primera escritura carga las cachés de plantillas y textos)."""
+        pa = PlanAprendizaje.consulta_exportacion().get(pk=self.pa.pk)
+        with TemporaryFile() as archivo:
+            pa.escribir_pdf_en_flujo(archivo)
+
+        tracemalloc.start()
+        try:
+            with TemporaryFile() as archivo:
+                pa.escribir_pdf_en_flujo(archivo)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    @override_settings(CACHE_PAGINAS_PDF=False, ITEMS_POR_BLOQUE_PDF=50)
+    def test_memoria_acotada_sin_importar_el_tamaño_del_plan(self):
+        self.agregar_objetivos(150)
+        pequeño = self.pico_memoria()
+        self.agregar_objetivos(300)
+        grande = self.pico_memoria()
+        self.assertLess(grande, 4 * 1024 * 1024)
+        self.assertLess(grande, pequeño * 1.25)
+
+    def test_mismo_contenido_que_la_exportacion_normal(self):
+        self.agregar_objetivos(60)
+        for plan in (self.pa, self.pe):
+            with self.subTest(plan=plan.__class__.__name__):
+                archivo = BytesIO()
+                paginas = plan.escribir_pdf_en_flujo(archivo)
+                esperado = textos_por_pagina(plan.generar_pdf())
+                self.assertEqual(paginas, len(esperado))
+                self.assertEqual(textos_por_pagina(archivo), esperado)
+
+    @override_settings(ITEMS_EXPORTACION_EN_FLUJO=10)
+    def test_planes_grandes_se_exportan_en_flujo(self):
+        self.agregar_objetivos(30)
+        with mock.patch.object(PlanAprendizaje, "renderizar_pdf") as renderizar:
+            ruta = self.pa.exportar_pdf()
+        renderizar.assert_not_called()
+        with open(ruta, "rb") as archivo:
+            self.assertEqual(textos_por_pagina(archivo), textos_por_pagina(self.pa.generar_pdf()))
+
+        objetivo = self.pa.objetivos_pa.last()
+        objetivo.evaluacion_asociada = None
+        objetivo.save()
+        with self.assertRaisesMessage(ValidationError, objetivo.titulo):
+            self.pa.exportar_pdf()
+
+
+class PruebasCachePDF(TestCase):
+
+    def setUp(self):
+        usar_cache_temporal(self)
+        self.pa, self.pe = crear_plan_completo()
+
+    def test_plan_sin_cambios_no_se_vuelve_a_generar(self):
+        primera = self.pa.exportar_pdf()
+        with mock.patch.object(PlanAprendizaje, "renderizar_pdf") as renderizar:
+            segunda = self.pa.exportar_pdf()
+        renderizar.assert_not_called()
+        self.assertEqual(primera, segunda)
+
+    def test_cambio_en_objetivo_genera_otro_archivo(self):
+        primera = self.pa.exportar_pdf()
+        objetivo = self.pa.objetivos_pa.first()
+        objetivo.contenido = "Contenido actualizado"
+        objetivo.save()
+        self.assertNotEqual(primera, self.pa.exportar_pdf())
+        self.assertNotEqual(self.pe.exportar_pdf(), primera)
+
+    def test_desalojo_elimina_los_menos_usados(self):
+        contenido = BytesIO(b"%PDF" + b"0" * 1020)
+        # Al pasarse del máximo se desaloja hasta el 90% (2304 bytes)
+        with override_settings(TAMAÑO_MAXIMO_CACHE_PDF=2560):
+            antiguo = cache_pdf.guardar("a", contenido)
+            reciente = cache_pdf.guardar("b", contenido)
+            utime(antiguo, (1000, 1000))
+            utime(reciente, (2000, 2000))
+            cache_pdf.obtener("a")  # "a" pasa a ser el más reciente
+            nuevo = cache_pdf.guardar("c", contenido)
+        self.assertTrue(antiguo.exists())
+        self.assertFalse(reciente.exists())
+        self.assertTrue(nuevo.exists())
+
+    def test_escrituras_sin_recorrer_el_directorio(self):
+        contenido = BytesIO(b"0" * 1024)
+        with override_settings(TAMAÑO_MAXIMO_CACHE_PAGINAS_PDF=100 * 1024), \
+                mock.patch.object(cache_paginas, "desalojar", wraps=cache_paginas.desalojar) as desalojar:
+            for i in range(95):
+                cache_paginas.guardar(f"{i}", contenido)
+            # Solo la primera escritura recorre el directorio; las demás suman al tamaño estimado
+            self.assertEqual(desalojar.call_count, 1)
+
+            # Al pasarse del máximo se recorre una vez y se desaloja hasta el 90%
+            for i in range(95, 101):
+                cache_paginas.guardar(f"{i}", contenido)
+            self.assertEqual(desalojar.call_count, 2)
+        self.assertEqual(len(list(cache_paginas.directorio.glob("*.pagina"))), 90)
+        self.assertNotEqual(cache_paginas.directorio, cache_pdf.directorio)
+        self.assertFalse(any(cache_pdf.directorio.glob("*.pagina")))
+
+
+@override_settings(PROCESOS_RENDERIZADO_PDF=0)
+class PruebasDescargaPDF(TestCase):
+
+    def setUp(self):
+        usar_cache_temporal(self)
+        self.pa, self.pe = crear_plan_completo()
+        iniciar_sesion_docente(self.client, self.pa.docente)
+        self.url = f"/gestion-planes/planes-aprendizaje/{self.pa.codigo_grupo}/descargar"
+
+    def descargar(self, **cabeceras):
+        respuesta = self.client.get(self.url, headers=cabeceras)
+        contenido = b"".join(respuesta.streaming_content) if respuesta.streaming else respuesta.content
+        return respuesta, contenido
+
+    def test_descarga_completa(self):
+        respuesta, contenido = self.descargar()
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(int(respuesta["Content-Length"]), len(contenido))
+        self.assertEqual(respuesta["Accept-Ranges"], "bytes")
+        self.assertTrue(contenido.startswith(b"%PDF"))
+
+    def test_descarga_parcial(self):
+        _, completo = self.descargar()
+        respuesta, contenido = self.descargar(Range="bytes=100-199")
+        self.assertEqual(respuesta.status_code, 206)
+        self.assertEqual(contenido, completo[100:200])
+        self.assertEqual(respuesta["Content-Range"], f"bytes 100-199/{len(completo)}")
+
+        respuesta, contenido = self.descargar(Range="bytes=-10")
+        self.assertEqual(contenido, completo[-10:])
+
+    def test_rango_no_satisfacible(self):
+        _, completo = self.descargar()
+        respuesta, _ = self.descargar(Range=f"bytes={len(completo)}-")
+        self.assertEqual(respuesta.status_code, 416)
+        self.assertEqual(respuesta["Content-Range"], f"bytes */{len(completo)}")
+
+    def test_cache_menor_que_un_pdf(self):
+        with override_settings(TAMAÑO_MAXIMO_CACHE_PDF=1):
+            respuesta, contenido = self.descargar()
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(contenido.startswith(b"%PDF"))
+
+    def test_pdf_desalojado_antes_de_abrirse(self):
+        exportar = PlanAprendizaje.exportar_pdf
+        desalojos = []
+
+        def exportar_y_desalojar(plan, *args, **kwargs):
+            ruta = exportar(plan, *args, **kwargs)
+            if len(desalojos) < cantidad:
+                desalojos.append(ruta)
+                ruta.unlink()
+            return ruta
+
+        # Se genera de nuevo una vez; si vuelve a faltar responde 503 (nunca un error 500)
+        with mock.patch.object(PlanAprendizaje, "exportar_pdf", exportar_y_desalojar):
+            cantidad = 1
+            respuesta, contenido = self.descargar()
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertTrue(contenido.startswith(b"%PDF"))
+            desalojos.clear()
+            cantidad = 2
+            respuesta, _ = self.descargar()
+            self.assertEqual(respuesta.status_code, 503)
+
+
+@override_settings(PROCESOS_RENDERIZADO_PDF=1, COLA_RENDERIZADO_PDF=0, REINTENTO_RENDERIZADO_PDF=7)
+class PruebasRenderizadorPDF(TestCase):
+
+    def setUp(self):
+        usar_cache_temporal(self)
+        self.pa, _ = crear_plan_completo()
+        iniciar_sesion_docente(self.client, self.pa.docente)
+        self.url = f"/gestion-planes/planes-aprendizaje/{self.pa.codigo_grupo}/descargar"
+
+        self.renderizador = GrupoRenderizadoPDF()
+        self.addCleanup(self.renderizador.cerrar)
+        reemplazo = mock.patch("gestion_planes.views.renderizador_pdf", self.renderizador)
+        reemplazo.start()
+        self.addCleanup(reemplazo.stop)
+
+    def test_pdf_se_genera_en_otro_proceso(self):
+        with mock.patch.object(PlanAprendizaje, "renderizar_pdf") as renderizar:
+            respuesta = self.client.get(self.url)
+            contenido = b"".join(respuesta.streaming_content)
+        renderizar.assert_not_called()
+        self.assertEqual(respuesta.status_code, 200)
+        # El proceso guarda las páginas en la caché de este proceso (el directorio temporal de la prueba)
+        self.assertTrue(any(cache_paginas.directorio.glob("*.pagina")))
+        self.assertEqual(textos_por_pagina(BytesIO(contenido)), textos_por_pagina(self.pa.generar_pdf()))
+
+    def test_cola_llena_responde_503(self):
+        with self.renderizador._candado:
+            self.renderizador._iniciar()
+        self.assertTrue(self.renderizador._cupos.acquire(blocking=False))  # Ocupa el único proceso
+
+        respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta.status_code, 503)
+        self.assertEqual(respuesta["Retry-After"], "7")
+
+    def test_limite_de_tiempo(self):
+        with self.assertRaises(TimeoutError), limite_de_tiempo(0.05):
+            sleep(1)
+
+
+@override_settings(PROCESOS_RENDERIZADO_PDF=0)
+class PruebasGeneracionUnica(TransactionTestCase):
+
+    def setUp(self):
+        usar_cache_temporal(self)
+        self.pa, _ = crear_plan_completo()
+        renderizar_pdf = PlanAprendizaje.renderizar_pdf
+
+        def renderizar_lento(plan, items):
+            sleep(0.2)
+            return renderizar_pdf(plan, items)
+
+        reemplazo = mock.patch.object(PlanAprendizaje, "renderizar_pdf", autospec=True, side_effect=renderizar_lento)
+        self.renderizar = reemplazo.start()
+        self.addCleanup(reemplazo.stop)
+
+    def test_descargas_simultaneas_generan_un_solo_pdf(self):
+        cantidad = 8
+        barrera = Barrier(cantidad)
+        url = f"/gestion-planes/planes-aprendizaje/{self.pa.codigo_grupo}/descargar"
+
+        def descargar(_):
+            cliente = Client()
+            iniciar_sesion_docente(cliente, self.pa.docente)
+            barrera.wait()
+            try:
+                respuesta = cliente.get(url)
+                return respuesta.status_code, b"".join(respuesta.streaming_content)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(cantidad) as hilos:
+            resultados = list(hilos.map(descargar, range(cantidad)))
+
+        self.assertEqual(self.renderizar.call_count, 1)
+        self.assertEqual({estado for estado, _ in resultados}, {200})
+        self.assertEqual(len({contenido for _, contenido in resultados}), 1)
+
+    def test_espera_la_generacion_de_otro_proceso(self):
+        huella = self.pa.huella_pdf(self.pa.obtener_items_pdf())
+        cache_pdf.directorio.mkdir(parents=True, exist_ok=True)
+        resultado = {}
+
+        def exportar():
+            try:
+                resultado["ruta"] = self.pa.exportar_pdf()
+            finally:
+                connection.close()
+
+        # Otro proceso tiene el bloqueo del mismo PDF (flock también bloquea entre descriptores de un mismo proceso)
+        with open(cache_pdf.directorio / f".lock-{huella}", "a") as bloqueo:
+            flock(bloqueo, LOCK_EX)
+            hilo = Thread(target=exportar)
+            hilo.start()
+            sleep(0.3)
+            self.assertTrue(hilo.is_alive())
+            ruta = cache_pdf.guardar(huella, BytesIO(b"%PDF generado por otro proceso"))
+            flock(bloqueo, LOCK_UN)
+        hilo.join()
+
+        self.renderizar.assert_not_called()
+        self.assertEqual(resultado["ruta"], ruta)
+
+
+class PruebasPrerenderizado(TestCase):
+
+    @override_settings(PRERENDERIZAR_PDF=True, ESPERA_PRERENDERIZADO_PDF=0.2)
+    def test_ediciones_seguidas_generan_un_solo_pdf(self):
+        generado = Event()
+        with mock.patch("gestion_planes.prerenderizado.prerenderizar_grupo", side_effect=lambda _: generado.set()) as prerenderizar:
+            with self.captureOnCommitCallbacks(execute=True):
+                pa, _ = crear_plan_completo()
+            self.assertTrue(generado.wait(5))
+            sleep(0.4)
+        prerenderizar.assert_called_once_with(pa.codigo_grupo)
+
+    def test_eliminaciones_sin_consultas_por_item(self):
+        pa, pe = crear_plan_completo(40)
+        busquedas_del_grupo = lambda consultas: [
+            consulta for consulta in consultas.captured_queries
+            if 'FROM "planes_de_evaluacion" WHERE "planes_de_evaluacion"."id" =' in consulta["sql"]
+        ]
+        with mock.patch("gestion_planes.signals.prerenderizador_pdf") as prerenderizador:
+            with CaptureQueriesContext(connection) as consultas:
+                pe.itemplanevaluacion_set.filter(pk__in=pe.itemplanevaluacion_set.values('pk')[:2]).delete()
+            self.assertEqual(len(busquedas_del_grupo(consultas)), 1)
+            prerenderizador.programar.assert_called_with(pa.codigo_grupo)
+
+            with CaptureQueriesContext(connection) as consultas:
+                pa.delete()
+            self.assertEqual(busquedas_del_grupo(consultas), [])
+
+    @override_settings(PRERENDERIZAR_PDF=True, PROCESOS_RENDERIZADO_PDF=1, COLA_RENDERIZADO_PDF=0)
+    def test_prerenderizado_en_los_procesos_de_renderizado(self):
+        usar_cache_temporal(self)
+        pa, _ = crear_plan_completo()
+        renderizador = GrupoRenderizadoPDF()
+        self.addCleanup(renderizador.cerrar)
+        with mock.patch("gestion_planes.prerenderizado.renderizador_pdf", renderizador), \
+                mock.patch.object(PlanAprendizaje, "renderizar_pdf") as renderizar:
+            self.assertEqual(prerenderizar_grupo(pa.codigo_grupo), 2)
+            renderizar.assert_not_called()
+
+            # Con los procesos saturados se omite; la descarga generará el PDF
+            self.assertTrue(renderizador._cupos.acquire(blocking=False))
+            objetivo = pa.objetivos_pa.first()
+            objetivo.titulo = "Objetivo cambiado"
+            objetivo.save()
+            self.assertEqual(prerenderizar_grupo(pa.codigo_grupo), 0)
+
+
+@override_settings(PROCESOS_EXPORTACION_PDF=0)
+class PruebasExportacionMasiva(TestCase):
+
+    def setUp(self):
+        usar_cache_temporal(self)
+        self.pa, self.pe = crear_plan_completo()
+        self.incompleto, _ = crear_plan_completo(codigo_grupo="INF_(AYP-0)_URB_N", nucleo="URB")
+        self.incompleto.añadir_objetivo("Sin evaluación", "Contenido", "Criterio", "CL", 2)
+        iniciar_sesion_docente(self.client, self.pa.docente)
+
+    def exportar(self, **filtros) -> ZipFile:
+        respuesta = self.client.get("/gestion-planes/planes/exportar", filtros)
+        self.assertEqual(respuesta.status_code, 200)
+        return ZipFile(BytesIO(b"".join(respuesta.streaming_content)))
+
+    def test_zip_con_manifiesto(self):
+        archivo_zip = self.exportar(nucleo="FLO")
+        manifiesto = loads(archivo_zip.read("manifiesto.json"))
+        self.assertEqual(
+            sorted(archivo_zip.namelist()),
+            sorted([self.pa.nombre_archivo_zip, self.pe.nombre_archivo_zip, "manifiesto.json"]),
+        )
+        self.assertEqual(len(manifiesto["exportados"]), 2)
+        self.assertEqual(manifiesto["omitidos"], [])
+        self.assertTrue(archivo_zip.read(self.pa.nombre_archivo_zip).startswith(b"%PDF"))
+
+    def test_planes_no_exportables_van_al_manifiesto(self):
+        archivo_zip = self.exportar(tipo="pa")
+        manifiesto = loads(archivo_zip.read("manifiesto.json"))
+        self.assertEqual([entrada["id"] for entrada in manifiesto["exportados"]], [self.pa.pk])
+        self.assertEqual([entrada["id"] for entrada in manifiesto["omitidos"]], [self.incompleto.pk])
+        self.assertIn("Sin evaluación", manifiesto["omitidos"][0]["error"])
+
+    @override_settings(PROCESOS_EXPORTACION_PDF=1, EXPORTACIONES_SIMULTANEAS_PDF=1, REINTENTO_RENDERIZADO_PDF=7)
+    def test_exportaciones_simultaneas_limitadas(self):
+        grupo = GrupoExportacionPDF()
+        self.addCleanup(grupo.cerrar)
+        # Los PDFs se generan en este proceso; sólo interesan los cupos
+        exportar = lambda planes, avance=None: (exportar_plan(modelo, pk) for modelo, pk in planes)
+        with mock.patch("gestion_planes.views.grupo_exportacion_pdf", grupo), \
+                mock.patch("gestion_planes.exportacion_masiva.grupo_exportacion_pdf", grupo), \
+                mock.patch.object(grupo, "exportar", exportar):
+            respuesta = self.client.get("/gestion-planes/planes/exportar", {"nucleo": "FLO"})
+            self.assertEqual(respuesta.status_code, 200)
+
+            # Mientras la primera exportación no termina no se admite otra
+            saturada = self.client.get("/gestion-planes/planes/exportar", {"nucleo": "FLO"})
+            self.assertEqual(saturada.status_code, 503)
+            self.assertEqual(saturada["Retry-After"], "7")
+
+            # Al terminar de enviarse la respuesta se libera el cupo
+            b"".join(respuesta.streaming_content)
+            cupo = grupo.reservar()
+            cupo.liberar()
+            cupo.liberar()
+            self.assertTrue(grupo._cupos.acquire(blocking=False))
+
+
+@override_settings(PROCESOS_EXPORTACION_PDF=0)
+class PruebasTrabajosExportacion(TestCase):
+
+    def setUp(self):
+        usar_cache_temporal(self)
+        directorio = TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(DIRECTORIO_EXPORTACIONES=directorio.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        self.pa, self.pe = crear_plan_completo()
+        self.otro_pa, _ = crear_plan_completo(3, codigo_grupo="INF_(AYP-0)_URB_N", nucleo="URB")
+        iniciar_sesion_docente(self.client, self.pa.docente)
+
+    def crear_trabajo(self, **planes) -> dict:
+        respuesta = self.client.post("/gestion-planes/exportaciones/", planes, content_type="application/json")
+        self.assertEqual(respuesta.status_code, 202)
+        self.assertEqual(respuesta.json()["estado"], "PEN")
+        ejecutar_trabajo(respuesta.json()["id"])
+        return self.client.get(respuesta["Location"]).json()
+
+    def test_trabajo_de_varios_planes(self):
+        trabajo = self.crear_trabajo(
+            planes_aprendizaje=[self.pa.codigo_grupo, self.otro_pa.codigo_grupo], planes_evaluacion=[self.pe.pk]
+        )
+        self.assertEqual(trabajo["estado"], "COM")
+        self.assertGreaterEqual(trabajo["paginas_totales"], 3)
+        self.assertEqual(trabajo["paginas_generadas"], trabajo["paginas_totales"])
+
+        respuesta = self.client.get(trabajo["url_descarga"])
+        self.assertEqual(respuesta["Content-Type"], "application/zip")
+        with ZipFile(BytesIO(b"".join(respuesta.streaming_content))) as archivo_zip:
+            manifiesto = loads(archivo_zip.read("manifiesto.json"))
+        self.assertEqual(len(manifiesto["exportados"]), 3)
+
+    def test_planes_de_otro_docente(self):
+        otro_pa, _ = crear_plan_completo(3, cedula=12345678, codigo_grupo="INF_(AYP-0)_ALT_N", nucleo="ALT")
+        respuesta = self.client.post(
+            "/gestion-planes/exportaciones/", {"planes_aprendizaje": [otro_pa.codigo_grupo]}, content_type="application/json"
+        )
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertFalse(TrabajoExportacion.objects.exists())
+
+    def test_trabajo_expirado(self):
+        trabajo = self.crear_trabajo(planes_aprendizaje=[self.pa.codigo_grupo])
+        respuesta = self.client.get(trabajo["url_descarga"])
+        self.assertEqual(respuesta["Content-Type"], "application/pdf")
+        b"".join(respuesta.streaming_content)
+
+        TrabajoExportacion.objects.update(fecha_expiracion=now() - timedelta(minutes=1))
+        self.assertEqual(self.client.get(trabajo["url_descarga"]).status_code, 410)
+        self.assertEqual(expirar_trabajos(), 1)
+        self.assertFalse(TrabajoExportacion.objects.get().ruta_archivo.exists())
+
+    @override_settings(MINUTOS_ABANDONO_EXPORTACIONES=15)
+    def test_trabajo_abandonado_vuelve_a_la_cola(self):
+        respuesta = self.client.post(
+            "/gestion-planes/exportaciones/", {"planes_aprendizaje": [self.pa.codigo_grupo]}, content_type="application/json"
+        )
+        # Simula un trabajo tomado por un proceso que terminó a mitad del trabajo
+        trabajos = TrabajoExportacion.objects.filter(pk=respuesta.json()["id"])
+        trabajos.update(estado='PRO', fecha_actualizacion=now() - timedelta(minutes=5))
+        self.assertEqual(recuperar_trabajos(), 0)  # Aún puede estar avanzando
+
+        trabajos.update(fecha_actualizacion=now() - timedelta(minutes=20))
+        # Se conserva la conexión de la prueba, que el comando cerraría al terminar cada revisión
+        with mock.patch("gestion_planes.management.commands.procesar_exportaciones.close_old_connections"):
+            call_command("procesar_exportaciones", "--una-vez", stdout=StringIO())
+        self.assertEqual(trabajos.get().estado, 'COM')
+
+    def test_avance_por_pagina(self):
+        avances = []
+        guardar = AvanceTrabajo.guardar
+
+        def registrar(avance):
+            guardar(avance)
+            avances.append(TrabajoExportacion.objects.values_list("paginas_generadas", flat=True).get(pk=avance.trabajo_id))
+
+        # Un solo plan con varias páginas avanza página por página, no todo al final
+        with mock.patch.object(AvanceTrabajo, "INTERVALO", 0), mock.patch.object(AvanceTrabajo, "guardar", registrar):
+            trabajo = self.crear_trabajo(planes_aprendizaje=[self.pa.codigo_grupo])
+        self.assertGreater(trabajo["paginas_totales"], 1)
+        self.assertEqual(avances[:trabajo["paginas_totales"]], list(range(1, trabajo["paginas_totales"] + 1)))
+        self.assertEqual(trabajo["paginas_generadas"], trabajo["paginas_totales"])
+
+    def test_error_al_contar_paginas(self):
+        with mock.patch("gestion_planes.exportaciones.contar_paginas", side_effect=DatabaseError("sin conexión")):
+            trabajo = self.crear_trabajo(planes_aprendizaje=[self.pa.codigo_grupo])
+        self.assertEqual(trabajo["estado"], "ERR")
+        self.assertIn("sin conexión", trabajo["error"])
+        self.assertIsNone(self.client.get(f"/gestion-planes/exportaciones/{trabajo['id']}/").json()["url_descarga"])
+
+    def test_trabajo_no_exportable(self):
+        objetivo = self.pa.objetivos_pa.first()
+        objetivo.evaluacion_asociada = None
+        objetivo.save()
+        trabajo = self.crear_trabajo(planes_aprendizaje=[self.pa.codigo_grupo])
+        self.assertEqual(trabajo["estado"], "ERR")
+        self.assertIn(objetivo.titulo, trabajo["error"])
+        self.assertIsNone(trabajo["url_descarga"])
+
+
+@override_settings(PROCESOS_RENDERIZADO_PDF=0)
+class PruebasExpedientePDF(TestCase):
+
+    def setUp(self):
+        usar_cache_temporal(self)
+        self.pa, self.pe = crear_plan_completo(20)
+        iniciar_sesion_docente(self.client, self.pa.docente)
+        self.url = f"/gestion-planes/planes-aprendizaje/{self.pa.codigo_grupo}/expediente"
+
+    def expediente(self, **opciones) -> ExpedientePDF:
+        return ExpedientePDF.del_grupo(PlanAprendizaje.consulta_exportacion().get(pk=self.pa.pk), **opciones)
+
+    def test_expediente_combina_ambos_planes(self):
+        separados = textos_por_pagina(self.pa.generar_pdf()) + textos_por_pagina(self.pe.generar_pdf())
+        lector = PdfReader(self.expediente().generar_pdf())
+        self.assertEqual([pagina.extract_text() for pagina in lector.pages], separados)
+
+        paginas_pa = len(textos_por_pagina(self.pa.generar_pdf()))
+        marcadores = [(marcador.title, lector.get_destination_page_number(marcador)) for marcador in lector.outline]
+        self.assertEqual(marcadores, [("Plan de Aprendizaje", 0), ("Plan de Evaluación", paginas_pa)])
+
+    def test_menos_consultas_que_dos_descargas(self):
+        with CaptureQueriesContext(connection) as separados:
+            PlanAprendizaje.consulta_exportacion().get(pk=self.pa.pk).generar_pdf()
+            PlanEvaluacion.consulta_exportacion().get(pk=self.pe.pk).generar_pdf()
+        with CaptureQueriesContext(connection) as combinado:
+            self.expediente().generar_pdf()
+        self.assertLess(len(combinado), len(separados))
+
+    def test_descarga_sin_marcadores(self):
+        respuesta = self.client.get(self.url, {"marcadores": "false"})
+        self.assertEqual(respuesta.status_code, 200)
+        lector = PdfReader(BytesIO(b"".join(respuesta.streaming_content)))
+        self.assertEqual(lector.outline, [])
+
+    def test_validacion_del_expediente(self):
+        ItemPlanEvaluacion.objects.filter(pk=self.pe.itemplanevaluacion_set.first().pk).update(peso=10)
+        respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn("90%", respuesta.json()[0])
+
+
+class PruebasAjusteTexto(SimpleTestCase):
+
+    texto = "Aplicar las reglas de derivación para calcular derivadas de funciones algebraicas y trigonométricas."
+
+    def test_lineas_no_superan_el_ancho(self):
+        ajustado = ajustar_texto(self.texto, 150)
+        self.assertGreater(len(ajustado.lineas), 1)
+        for linea in ajustado.lineas:
+            self.assertLessEqual(ancho_texto(linea, ajustado.tamaño), 150)
+        self.assertEqual(" ".join(ajustado.lineas), self.texto)
+
+    def test_palabra_mas_ancha_que_la_columna(self):
+        ajustado = ajustar_texto("Electroencefalografista", 40)
+        self.assertEqual("".join(ajustado.lineas), "Electroencefalografista")
+
+    def test_reduccion_de_fuente(self):
+        sin_reducir = ajustar_texto(self.texto * 2, 150)
+        reducido = ajustar_texto(self.texto * 2, 150, tamaño_minimo=9)
+        self.assertTrue(sin_reducir.lineas[-1].endswith("..."))
+        self.assertLess(reducido.tamaño, sin_reducir.tamaño)
+        self.assertGreaterEqual(reducido.tamaño, 9)
+
+
+class PruebasConsultasExportacion(TestCase):
+
+    def setUp(self):
+        usar_cache_temporal(self)
+
+    def contar_consultas(self, modelo, pk) -> int:
+        with CaptureQueriesContext(connection) as consultas:
+            modelo.consulta_exportacion().get(pk=pk).exportar_pdf()
+        return len(consultas)
+
+    def test_consultas_constantes_sin_importar_el_tamaño_del_plan(self):
+        pequeño = crear_plan_completo(cantidad_objetivos=5, codigo_grupo="PEQUEÑO")
+        grande = crear_plan_completo(cantidad_objetivos=40, codigo_grupo="GRANDE")
+        for modelo, indice in ((PlanAprendizaje, 0), (PlanEvaluacion, 1)):
+            with self.subTest(modelo=modelo.__name__):
+                self.assertEqual(
+                    self.contar_consultas(modelo, pequeño[indice].pk),
+                    self.contar_consultas(modelo, grande[indice].pk),
+                )
+
+
+@override_settings(CACHES={
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "sesiones": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "sesiones-pruebas"},
+})
+class PruebasSesionDocente(TestCase):
+
+    def setUp(self):
+        cache_docentes.limpiar()
+        self.addCleanup(cache_docentes.limpiar)
+        self.pa, _ = crear_plan_completo(1)
+        self.docente = self.pa.docente
+
+    def consultas_docentes(self, url: str, estado: int = 200) -> list[str]:
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.client.get(url).status_code, estado)
+        return [consulta["sql"] for consulta in consultas if '"docentes"' in consulta["sql"]]
+
+    def test_inicio_y_cierre_de_sesion(self):
+        respuesta = self.client.post("/autenticacion-docente/login", {"cedula": self.docente.cedula})
+        self.assertEqual(respuesta.status_code, 202)
+        token = respuesta.cookies[settings.NOMBRE_COOKIE_SESION_DOCENTE]
+        self.assertTrue(token["httponly"])
+        self.assertEqual(self.client.get("/gestion-planes/planes-aprendizaje/").status_code, 200)
+
+        respuesta = self.client.get("/autenticacion-docente/logout")
+        self.assertEqual(respuesta.cookies[settings.NOMBRE_COOKIE_SESION_DOCENTE].value, "")
+        self.assertEqual(self.client.get("/gestion-planes/planes-aprendizaje/").status_code, 403)
+
+    def test_sin_consultas_de_docentes_al_autenticar(self):
+        iniciar_sesion_docente(self.client, self.docente)
+        for url in ("/gestion-planes/planes-aprendizaje/", "/gestion-planes/objetivos-aprendizaje/"):
+            with self.subTest(url=url):
+                self.assertEqual(self.consultas_docentes(url), [])
+
+        # Los datos del docente sí se consultan, una sola vez mientras estén en la caché
+        self.assertEqual(len(self.consultas_docentes("/autenticacion-docente/info")), 1)
+        self.assertEqual(self.consultas_docentes("/autenticacion-docente/info"), [])
+
+    def test_guardar_el_docente_invalida_la_cache(self):
+        iniciar_sesion_docente(self.client, self.docente)
+        self.assertEqual(self.client.get("/autenticacion-docente/info").json()["nombre"], "Ricardo")
+        self.docente.nombre = "Ricardo José"
+        self.docente.save()
+        self.assertEqual(self.client.get("/autenticacion-docente/info").json()["nombre"], "Ricardo José")
+
+    def test_eliminar_el_docente_revoca_sus_sesiones(self):
+        iniciar_sesion_docente(self.client, self.docente)
+        cedula = self.docente.cedula
+        self.docente.delete()
+        self.assertEqual(self.client.get("/gestion-planes/planes-aprendizaje/").status_code, 403)
+
+        # Aunque se vuelva a registrar con la misma cédula, el token anterior sigue revocado
+        docente = Docente.objects.create(cedula=cedula, correo="otro@gmail.com", nombre="Otro", apellido="Docente")
+        self.assertEqual(self.client.get("/gestion-planes/planes-aprendizaje/").status_code, 403)
+        iniciar_sesion_docente(self.client, docente)
+        self.assertEqual(self.client.get("/gestion-planes/planes-aprendizaje/").status_code, 200)
+
+    def test_token_invalido_o_expirado(self):
+        token = emitir_token(self.docente)
+        datos, resto = token.split(":", 1)
+        for valor in ("no-es-un-token", token[:-1] + ("A" if token[-1] != "A" else "B"), f"{datos}x:{resto}"):
+            with self.subTest(valor=valor):
+                self.client.cookies[settings.NOMBRE_COOKIE_SESION_DOCENTE] = valor
+                self.assertEqual(self.client.get("/gestion-planes/planes-aprendizaje/").status_code, 403)
+
+        self.client.cookies[settings.NOMBRE_COOKIE_SESION_DOCENTE] = token
+        with override_settings(DURACION_SESION_DOCENTE=-1):
+            self.assertEqual(self.client.get("/gestion-planes/planes-aprendizaje/").status_code, 403)
+
+    def test_cookie_anterior_durante_la_migracion(self):
+        self.client.cookies[settings.NOMBRE_COOKIE_DOCENTE] = str(self.docente.cedula)
+        respuesta = self.client.get("/gestion-planes/planes-aprendizaje/")
+        self.assertEqual(respuesta.status_code, 200)
+        # Se reemplaza por un token de sesión
+        self.assertEqual(respuesta.cookies[settings.NOMBRE_COOKIE_DOCENTE].value, "")
+        self.assertTrue(respuesta.cookies[settings.NOMBRE_COOKIE_SESION_DOCENTE].value)
+
+        self.client.cookies.clear()
+        for valor in ("no-es-una-cedula", "1000001"):
+            with self.subTest(valor=valor):
+                self.client.cookies[settings.NOMBRE_COOKIE_DOCENTE] = valor
+                self.assertEqual(self.client.get("/gestion-planes/planes-aprendizaje/").status_code, 403)
+
+        self.client.cookies[settings.NOMBRE_COOKIE_DOCENTE] = str(self.docente.cedula)
+        with override_settings(FIN_MIGRACION_COOKIE_CEDULA=date.today() - timedelta(days=1)):
+            self.assertEqual(self.client.get("/gestion-planes/planes-aprendizaje/").status_code, 403)
+
+
+class PruebasConsultasListadoPlanes(TestCase):
+
+    def setUp(self):
+        cache_docentes.limpiar()
+        self.addCleanup(cache_docentes.limpiar)
+
+    def crear_planes(self, cantidad: int) -> list[PlanAprendizaje]:
+        planes = [
+            crear_plan_completo(2, codigo_grupo=f"INF_(AYP-0)_FLO_{i}")[0]
+            for i in range(PlanAprendizaje.objects.count(), cantidad)
+        ]
+        iniciar_sesion_docente(self.client, PlanAprendizaje.objects.first().docente)
+        return planes
+
+    def test_listado_con_consultas_constantes(self):
+        for cantidad in (1, 10, 100):
+            with self.subTest(cantidad=cantidad):
+                self.crear_planes(cantidad)
+                with self.assertNumQueries(2):
+                    respuesta = self.client.get("/gestion-planes/planes-aprendizaje/")
+                self.assertEqual(len(respuesta.json()), cantidad)
+
+        plan = respuesta.json()[-1]
+        pa = PlanAprendizaje.objects.get(pk=plan["codigo_grupo"])
+        self.assertEqual(plan["plan_evaluacion"], pa.planevaluacion.pk)
+        self.assertEqual(len(plan["objetivos_plan_aprendizaje"]), 2)
+
+    def test_detalle_con_consultas_constantes(self):
+        pa = self.crear_planes(1)[0]
+        with self.assertNumQueries(2):
+            respuesta = self.client.get(f"/gestion-planes/planes-aprendizaje/{pa.pk}/")
+        self.assertEqual(respuesta.json()["plan_evaluacion"], pa.planevaluacion.pk)
+
+        pa.planevaluacion.delete()
+        with self.assertNumQueries(2):
+            respuesta = self.client.get(f"/gestion-planes/planes-aprendizaje/{pa.pk}/")
+        self.assertIsNone(respuesta.json()["plan_evaluacion"])
+
+    def test_listado_de_planes_de_evaluacion_con_consultas_constantes(self):
+        for cantidad in (1, 10, 100):
+            with self.subTest(cantidad=cantidad):
+                self.crear_planes(cantidad)
+                # Planes (con su plan de aprendizaje), sus items y los objetivos de los items
+                with self.assertNumQueries(3):
+                    respuesta = self.client.get("/gestion-planes/planes-evaluacion/")
+                self.assertEqual(len(respuesta.json()), cantidad)
+
+        plan = respuesta.json()[-1]
+        self.assertEqual(plan["peso_total_actual"], "100%")
+        self.assertEqual(len(plan["items_plan_evaluacion"]), 5)
+        self.assertEqual(sum(len(item["objetivos"]) for item in plan["items_plan_evaluacion"]), 2)
+
+    def test_peso_total_guardado_en_el_plan(self):
+        pe = self.crear_planes(1)[0].planevaluacion
+        self.assertEqual(PlanEvaluacion.objects.get(pk=pe.pk).peso_total, 100)
+
+        item = pe.itemplanevaluacion_set.first()
+        item.peso = 10
+        item.save()
+        self.assertEqual(PlanEvaluacion.objects.get(pk=pe.pk).peso_total, 90)
+        with self.assertRaises(PesoTotalExcedido):
+            ItemPlanEvaluacion.objects.create(plan_evaluacion=pe, habilidades_a_evaluar="Otra", peso=15, fecha_planificada=date(2025, 6, 1))
+        item.peso = 25
+        with self.assertRaises(PesoTotalExcedido):
+            item.save()
+        self.assertEqual(ItemPlanEvaluacion.objects.get(pk=item.pk).peso, 10)
+
+        # Guardar el plan con un peso total viejo no lo modifica
+        pe.nombre = "P.E renombrado"
+        pe.save()
+        self.assertEqual(PlanEvaluacion.objects.get(pk=pe.pk).peso_total, 90)
+
+        pe.itemplanevaluacion_set.filter(peso=20).delete()
+        self.assertEqual(PlanEvaluacion.objects.get(pk=pe.pk).peso_total, 10)
+        item.delete()
+        self.assertEqual(PlanEvaluacion.objects.get(pk=pe.pk).peso_total, 0)
+
+    def test_limite_del_peso_total_al_crear_items_por_la_api(self):
+        pe = self.crear_planes(1)[0].planevaluacion
+        pe.itemplanevaluacion_set.last().delete()
+        datos = {"plan_evaluacion": pe.pk, "habilidades_a_evaluar": "Otra", "fecha_planificada": "2025-06-01"}
+
+        respuesta = self.client.post("/gestion-planes/items-evaluacion/", {**datos, "peso": 25})
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn("(105%)", str(respuesta.json()))
+        self.assertIn("queda un 20% por asignar", str(respuesta.json()))
+
+        respuesta = self.client.post("/gestion-planes/items-evaluacion/", {**datos, "peso": 20})
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(self.client.get(f"/gestion-planes/planes-evaluacion/{pe.pk}/").json()["peso_total_actual"], "100%")
+
+    def test_contadores_de_objetivos(self):
+        pa = self.crear_planes(1)[0]
+        contadores = lambda: PlanAprendizaje.objects.values_list('total_objetivos', 'objetivos_sin_evaluacion').get(pk=pa.pk)
+        self.assertEqual(contadores(), (2, 0))
+
+        objetivo = pa.añadir_objetivo("Nuevo", "Contenido", "Criterio", "CL", 2)
+        self.assertEqual(contadores(), (3, 1))
+        pa.planevaluacion.itemplanevaluacion_set.first().agregar_objetivo(objetivo)
+        self.assertEqual(contadores(), (3, 0))
+
+        # Eliminar un item deja sin evaluación a sus objetivos
+        objetivo.evaluacion_asociada.delete()
+        self.assertEqual(contadores(), (3, 2))
+        # Guardar el plan con contadores viejos no los modifica
+        pa.nucleo = "COR"
+        pa.save()
+        self.assertEqual(contadores(), (3, 2))
+
+        objetivo.evaluacion_asociada = None
+        objetivo.delete()
+        self.assertEqual(contadores(), (2, 1))
+        pa.planevaluacion.delete()
+        self.assertEqual(contadores(), (2, 2))
+        pa.recalcular_contadores()
+        self.assertEqual(contadores(), (2, 2))
+
+    def test_estado_de_exportacion_coincide_con_la_validacion(self):
+        pa = self.crear_planes(1)[0]
+        for ruta in (f"planes-aprendizaje/{pa.pk}", f"planes-evaluacion/{pa.planevaluacion.pk}"):
+            respuesta = self.client.get(f"/gestion-planes/{ruta}/").json()
+            self.assertTrue(respuesta["exportable"])
+            self.assertEqual(respuesta["motivos_no_exportable"], [])
+
+        pa.planevaluacion.itemplanevaluacion_set.first().delete()
+        pa.añadir_objetivo("Nuevo", "Contenido", "Criterio", "CL", 2)
+        pa = PlanAprendizaje.objects.get(pk=pa.pk)
+        pe = PlanEvaluacion.objects.get(pk=pa.planevaluacion.pk)
+        with self.assertRaises(ValidationError):
+            pa.validar_datos_para_exportar(tuple(pa.objetivos_pa))
+        with self.assertRaises(ValidationError):
+            pe.validar_datos_para_exportar(tuple(pe.itemplanevaluacion_set.all()))
+
+        respuesta = self.client.get(f"/gestion-planes/planes-aprendizaje/{pa.pk}/").json()
+        self.assertFalse(respuesta["exportable"])
+        self.assertEqual(respuesta["motivos_no_exportable"], ["2 de 3 objetivos del plan de aprendizaje no tienen evaluación asociada."])
+        respuesta = self.client.get("/gestion-planes/planes-evaluacion/").json()[0]
+        self.assertFalse(respuesta["exportable"])
+        self.assertEqual(len(respuesta["motivos_no_exportable"]), 2)
+        self.assertIn("actualmente tiene 80%", respuesta["motivos_no_exportable"][1])
+
+    def test_docente_copiado_en_objetivos_e_items(self):
+        pa = self.crear_planes(1)[0]
+        otro_pa, otro_pe = crear_plan_completo(1, cedula=30123456, codigo_grupo="INF_(AYP-0)_FLO_OTRO")
+        docentes = lambda plan: (
+            set(ObjetivoPlanAprendizaje.objects.filter(plan_aprendizaje=plan).values_list('docente', flat=True))
+            | set(ItemPlanEvaluacion.objects.filter(plan_evaluacion__plan_aprendizaje=plan).values_list('docente', flat=True))
+        )
+        self.assertEqual(docentes(pa), {pa.docente_id})
+        self.assertEqual(docentes(otro_pa), {30123456})
+
+        # Las vistas filtran por la columna copiada, sin unir tablas
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get("/gestion-planes/objetivos-aprendizaje/")
+            self.client.get("/gestion-planes/items-evaluacion/")
+        self.assertEqual(len(consultas), 3)
+        self.assertFalse([consulta for consulta in consultas.captured_queries if "JOIN" in consulta["sql"]])
+
+        # Mover un objetivo o un item a un plan de otro docente
+        objetivo = pa.objetivos_pa.first()
+        objetivo.plan_aprendizaje = otro_pa
+        objetivo.evaluacion_asociada = None
+        objetivo.save()
+        otro_pe.itemplanevaluacion_set.first().delete()
+        item = pa.planevaluacion.itemplanevaluacion_set.last()
+        item.plan_evaluacion = otro_pe
+        item.save()
+        self.assertEqual(ObjetivoPlanAprendizaje.objects.get(pk=objetivo.pk).docente_id, 30123456)
+        self.assertEqual(ItemPlanEvaluacion.objects.get(pk=item.pk).docente_id, 30123456)
+
+        # Reasignar el plan de aprendizaje a otro docente
+        otro_pa.docente_id = pa.docente_id
+        otro_pa.save()
+        self.assertEqual(docentes(otro_pa), {pa.docente_id})
+        respuesta = self.client.get(f"/gestion-planes/items-evaluacion/{item.pk}/")
+        self.assertEqual(respuesta.status_code, 200)
+
+
+@override_settings(PRERENDERIZAR_PDF=False)
+class PruebasPesoTotalConcurrente(TransactionTestCase):
+
+    def test_creaciones_simultaneas_no_superan_el_100(self):
+        pe = crear_plan_completo(0)[1]
+        for item in pe.itemplanevaluacion_set.all()[:2]:  # Quedan 60%
+            item.delete()
+        cantidad = 8
+        barrera = Barrier(cantidad)
+
+        def crear_item(i):
+            barrera.wait()
+            try:
+                ItemPlanEvaluacion.objects.create(
+                    plan_evaluacion_id=pe.pk, habilidades_a_evaluar=f"Simultánea {i}", peso=20, fecha_planificada=date(2025, 6, 1)
+                )
+                return True
+            except PesoTotalExcedido:
+                return False
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(cantidad) as hilos:
+            creados = list(hilos.map(crear_item, range(cantidad)))
+
+        self.assertEqual(creados.count(True), 2)
+        self.assertEqual(PlanEvaluacion.objects.get(pk=pe.pk).peso_total, 100)
+        self.assertEqual(sum(pe.itemplanevaluacion_set.values_list("peso", flat=True)), 100)
+
+    # Sin bloqueos por fila (SQLite bloquea toda la base de datos) no hay orden de bloqueo que probar
+    @skipUnless(connection.features.has_select_for_update, "La base de datos no bloquea filas")
+    def test_traslados_simultaneos_en_sentidos_opuestos(self):
+        planes = [crear_plan_completo(0)[1], crear_plan_completo(0, codigo_grupo="INF_(AYP-0)_URB_N", nucleo="URB")[1]]
+        items = []
+        for pe in planes:
+            for item in pe.itemplanevaluacion_set.all()[:2]:  # Quedan 60% en cada plan
+                item.delete()
+            items.extend(pe.itemplanevaluacion_set.all())
+        rondas = 4
+        barrera = Barrier(len(items))
+
+        def trasladar(item):
+            errores = []
+            try:
+                for _ in range(rondas):
+                    barrera.wait()
+                    # Cada item pasa al otro plan, mientras los del otro plan vienen en sentido contrario
+                    item.plan_evaluacion_id = planes[item.plan_evaluacion_id == planes[0].pk].pk
+                    try:
+                        item.save()
+                    except PesoTotalExcedido:
+                        item.refresh_from_db()
+                    except Exception as error:  # Por ejemplo, un bloqueo mutuo detectado por la base de datos
+                        errores.append(error)
+                        item.refresh_from_db()
+                return errores
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(len(items)) as hilos:
+            errores = [error for resultado in hilos.map(trasladar, items) for error in resultado]
+
+        self.assertEqual(errores, [])
+        for pe in PlanEvaluacion.objects.filter(pk__in=[pe.pk for pe in planes]):
+            self.assertEqual(pe.peso_total, sum(pe.itemplanevaluacion_set.values_list("peso", flat=True)))
+            self.assertLessEqual(pe.peso_total, 100)
@@ -5,13 +5,20 @@ from .views import (
     CrearListarPlanAprendizaje,
     ObtenerActualizarEliminarPlanAprendizaje,
     DescargarPlanAprendizaje,
+    DescargarExpedientePlanAprendizaje,
+    VistaPreviaPlanAprendizaje,
     CrearListarObjetivoPlanAprendizaje,
     ObtenerActualizarEliminarObjetivoPlanAprendizaje,
     DescargarPlanEvaluacion,
+    VistaPreviaPlanEvaluacion,
     CrearListarPlanEvaluacion,
     ObtenerActualizarEliminarPlanEvaluacion,
     CrearListarItemPlanEvaluacion,
     ObtenerActualizarEliminarItemPlanEvaluacion,
+    ExportarPlanes,
+    CrearTrabajoExportacion,
+    ObtenerTrabajoExportacion,
+    DescargarTrabajoExportacion,
 )
 
 urlpatterns = [
@@ -23,6 +30,8 @@ urlpatterns = [
     path('planes-aprendizaje/', CrearListarPlanAprendizaje.as_view(), name='planes-aprendizaje-list-create'),
     path('planes-aprendizaje/<pk>/', ObtenerActualizarEliminarPlanAprendizaje.as_view(), name='planes-aprendizaje-retrieve-update-destroy'),
     path('planes-aprendizaje/<pk>/descargar', DescargarPlanAprendizaje.as_view(), name='planes-aprendizaje-descargar'),
+    path('planes-aprendizaje/<pk>/expediente', DescargarExpedientePlanAprendizaje.as_view(), name='planes-aprendizaje-expediente'),
+    path('planes-aprendizaje/<pk>/vista-previa', VistaPreviaPlanAprendizaje.as_view(), name='planes-aprendizaje-vista-previa'),
 
     # URLs para ObjetivoPlanAprendizaje
     path('objetivos-aprendizaje/', CrearListarObjetivoPlanAprendizaje.as_view(), name='objetivos-aprendizaje-list-create'),
@@ -32,6 +41,15 @@ urlpatterns = [
     path('planes-evaluacion/', CrearListarPlanEvaluacion.as_view(), name='planes-evaluacion-list-create'),
     path('planes-evaluacion/<pk>/', ObtenerActualizarEliminarPlanEvaluacion.as_view(), name='planes-evaluacion-retrieve-update-destroy'),
     path('planes-evaluacion/<pk>/descargar', DescargarPlanEvaluacion.as_view(), name='planes-aprendizaje-descargar'),
+    path('planes-evaluacion/<pk>/vista-previa', VistaPreviaPlanEvaluacion.as_view(), name='planes-evaluacion-vista-previa'),
+
+    # URL para la exportación masiva de planes
+    path('planes/exportar', ExportarPlanes.as_view(), name='planes-exportar'),
+
+    # URLs para TrabajoExportacion (exportación asíncrona)
+    path('exportaciones/', CrearTrabajoExportacion.as_view(), name='exportaciones-create'),
+    path('exportaciones/<uuid:pk>/', ObtenerTrabajoExportacion.as_view(), name='exportaciones-retrieve'),
+    path('exportaciones/<uuid:pk>/descargar', DescargarTrabajoExportacion.as_view(), name='exportaciones-descargar'),
 
     # URLs para ItemPlanEvaluacion
     path('items-evaluacion/', CrearListarItemPlanEvaluacion.as_view(), name='items-evaluacion-list-create'),
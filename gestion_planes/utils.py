@@ -1,37 +1,127 @@
-def ajustar_texto_pdf(texto: str, max_caracteres: int, max_lineas: int = 4, elipsis: bool = False) -> tuple[str]:
-    """Funcion para ajustar los textos a las columnas de los formatos pdf."""
-    if len(texto) > max_caracteres:
-        # Puntos suspensivos si el texto es muy largo.
-        if elipsis:
-            texto = texto[:max_caracteres]
-            texto = texto[:-3] + '...'
-            return texto,
-
-        lineas = []
-        palabras = texto.split()
-        linea_actual = ""
-
-        for palabra in palabras:
-            if len(linea_actual) + len(palabra) + 1 <= max_caracteres:
-                if linea_actual:
-                    linea_actual += " " + palabra
-                else:
-                    linea_actual = palabra
-            else:
-                lineas.append(linea_actual)
-                linea_actual = palabra
-
-        if linea_actual:
-            lineas.append(linea_actual)
-
-        if len(lineas) > max_lineas:
-            lineas[max_lineas-1] = ' '.join(lineas[max_lineas-1].split(' ')[:-1]) + '...'
-            lineas = lineas[:max_lineas]
-
-        return lineas
-
-    else:
-        return texto,
+from functools import lru_cache
+from typing import NamedTuple
+
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+
+class TablaAnchos(dict):
+    """Anchos de los caracteres de una fuente en milésimas de em, calculados una sola vez por caracter."""
+
+    def __init__(self, fuente: str):
+        super().__init__()
+        self.fuente = fuente
+        for codigo in range(32, 256):
+            self[chr(codigo)] = stringWidth(chr(codigo), fuente, 1000)
+
+    def __missing__(self, caracter: str) -> float:
+        ancho = self[caracter] = stringWidth(caracter, self.fuente, 1000)
+        return ancho
+
+    def medir(self, texto: str) -> float:
+        """Ancho del texto en milésimas de em."""
+        return sum(map(self.__getitem__, texto))
+
+
+_tablas_anchos: dict[str, TablaAnchos] = {}
+
+
+def obtener_tabla_anchos(fuente: str) -> TablaAnchos:
+    tabla = _tablas_anchos.get(fuente)
+    if tabla is None:
+        tabla = _tablas_anchos[fuente] = TablaAnchos(fuente)
+    return tabla
+
+
+def ancho_texto(texto: str, tamaño: float, fuente: str = "Helvetica") -> float:
+    """Ancho en puntos del texto escrito con la fuente y tamaño indicados."""
+    return obtener_tabla_anchos(fuente).medir(texto) * tamaño / 1000
+
+
+class TextoAjustado(NamedTuple):
+    """Lineas de un texto ajustado a una celda y el tamaño de fuente con el que se deben escribir."""
+    lineas: tuple[str]
+    tamaño: float
+
+
+def _partir_lineas(texto: str, limite: float, max_lineas: int, tabla: TablaAnchos) -> tuple[tuple[str], bool]:
+    """Parte el texto en lineas de ancho menor o igual al límite (en milésimas de em).
+
+    Devuelve las lineas (recortadas con puntos suspensivos si exceden el máximo) y si el texto cupo completo.
+    """
+    espacio = tabla[" "]
+    lineas = []
+    actual = []
+    ancho_actual = 0
+
+    for palabra in texto.split():
+        ancho = tabla.medir(palabra)
+        if actual and ancho_actual + espacio + ancho <= limite:
+            actual.append(palabra)
+            ancho_actual += espacio + ancho
+            continue
+
+        if actual:
+            lineas.append(" ".join(actual))
+
+        # Las palabras más anchas que la columna se parten por caracteres
+        while ancho > limite:
+            corte, ancho_corte = 1, tabla[palabra[0]]
+            while corte < len(palabra) and ancho_corte + tabla[palabra[corte]] <= limite:
+                ancho_corte += tabla[palabra[corte]]
+                corte += 1
+            lineas.append(palabra[:corte])
+            palabra = palabra[corte:]
+            ancho -= ancho_corte
+
+        actual = [palabra] if palabra else []
+        ancho_actual = ancho
+
+    if actual:
+        lineas.append(" ".join(actual))
+
+    if len(lineas) <= max_lineas:
+        return tuple(lineas), True
+
+    # Puntos suspensivos en la última linea visible
+    ultima = lineas[max_lineas - 1]
+    limite_ultima = limite - tabla.medir("...")
+    while ultima and tabla.medir(ultima) > limite_ultima:
+        ultima = ultima[:-1]
+    lineas[max_lineas - 1] = ultima.rstrip() + "..."
+    return tuple(lineas[:max_lineas]), False
+
+
+@lru_cache(maxsize=8192)
+def ajustar_texto(
+    texto: str,
+    ancho: float,
+    tamaño: float = 11,
+    max_lineas: int = 4,
+    tamaño_minimo: float | None = None,
+    fuente: str = "Helvetica",
+) -> TextoAjustado:
+    """Ajusta un texto al ancho (en puntos) de una celda según el ancho real de los caracteres de la fuente.
+
+    Si se indica un tamaño mínimo y el texto no cabe en el máximo de lineas, se reduce el tamaño de la fuente
+    de medio en medio punto hasta que quepa o se llegue al mínimo. Los resultados se memorizan.
+    """
+    tabla = obtener_tabla_anchos(fuente)
+    tamaño_minimo = tamaño if tamaño_minimo is None else tamaño_minimo
+
+    while True:
+        lineas, completo = _partir_lineas(texto, ancho * 1000 / tamaño, max_lineas, tabla)
+        if completo or tamaño <= tamaño_minimo:
+            return TextoAjustado(lineas, tamaño)
+        tamaño = max(tamaño - 0.5, tamaño_minimo)
+
+
+def dibujar_texto_ajustado(lienzo, texto: TextoAjustado, x: int, y: int, fuente: str = "Helvetica", tamaño_base: float = 11):
+    """Escribe un texto ajustado, cambiando temporalmente el tamaño de la fuente si fue reducido."""
+    if texto.tamaño != tamaño_base:
+        lienzo.setFont(fuente, texto.tamaño)
+    dibujar_multi_linea(lienzo, texto.lineas, x, y, interlinea=texto.tamaño + 1)
+    if texto.tamaño != tamaño_base:
+        lienzo.setFont(fuente, tamaño_base)
 
 
 def dibujar_multi_linea(lienzo, lineas: tuple[str], x: int, y: int, interlinea: int = 12):
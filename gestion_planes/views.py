@@ -5,6 +5,7 @@ from .models import (
     ObjetivoPlanAprendizaje,
     PlanEvaluacion,
     ItemPlanEvaluacion,
+    TrabajoExportacion,
 )
 from .serializers import (
     SerializadorUnidadCurricular,
@@ -12,13 +13,63 @@ from .serializers import (
     SerializadorObjetivoPlanAprendizaje,
     SerializadorPlanEvaluacion,
     SerializadorItemPlanEvaluacion,
+    SerializadorFiltroExportacion,
+    SerializadorTrabajoExportacion,
 )
 from autenticacion_docente.permissions import CedulaRequerida
-from autenticacion_docente.models import Docente
-from django.conf import settings
+
+from .respuestas import respuesta_pdf
+from .renderizador import renderizador_pdf, RenderizadoNoDisponible
+from .expediente import ExpedientePDF
+from .exportacion_masiva import seleccionar_planes, generar_zip, grupo_exportacion_pdf, ContenidoConCupo
+from .exportaciones import trabajador_exportaciones
+from .vista_previa import obtener_vista_previa
+
+from pathlib import Path
 
 from django.shortcuts import get_object_or_404
-from django.http import HttpResponse
+from django.http import Http404, StreamingHttpResponse
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.serializers import ValidationError
+
+
+# Si el archivo se desaloja de la caché entre que se genera y se abre, se genera una vez más antes de responder 503
+INTENTOS_RESPUESTA_CACHE = 2
+MENSAJE_ARCHIVO_DESALOJADO = "El archivo no se pudo preparar, intente nuevamente en unos segundos."
+
+
+def respuesta_exportacion(request, exportable, nombre_archivo: str):
+    """Respuesta con el PDF de un plan o expediente, generado (si no está en la caché) en los procesos de `renderizador.py`."""
+    for _ in range(INTENTOS_RESPUESTA_CACHE):
+        try:
+            return respuesta_pdf(request, exportable.exportar_pdf(renderizador_pdf.renderizar), nombre_archivo)
+        except FileNotFoundError:
+            continue
+    raise RenderizadoNoDisponible(MENSAJE_ARCHIVO_DESALOJADO)
+
+
+def respuesta_vista_previa(request, plan):
+    """Imagen PNG de la página `pagina` (por defecto la primera) del plan, con el total de páginas en `X-Total-Paginas`."""
+    try:
+        numero_pagina = int(request.GET.get('pagina', 1))
+    except ValueError:
+        raise ValidationError({'pagina': "Debe ser un número entero."})
+    nombre_archivo = f"{Path(plan.nombre_archivo_pdf).stem}_{numero_pagina}.png"
+    for _ in range(INTENTOS_RESPUESTA_CACHE):
+        try:
+            ruta, total_paginas = obtener_vista_previa(plan, numero_pagina)
+        except IndexError as error:
+            raise Http404(str(error))
+        try:
+            respuesta = respuesta_pdf(request, ruta, nombre_archivo, 'image/png', adjunto=False)
+        except FileNotFoundError:
+            continue
+        respuesta['X-Total-Paginas'] = total_paginas
+        return respuesta
+    raise RenderizadoNoDisponible(MENSAJE_ARCHIVO_DESALOJADO)
 
 # Vistas para PlanAprendizaje (limitadas por docente)
 class CrearListarPlanAprendizaje(generics.ListCreateAPIView):
@@ -33,16 +84,14 @@ class CrearListarPlanAprendizaje(generics.ListCreateAPIView):
         """
         Obtiene el conjunto de consultas de los Planes de Aprendizaje asociados al docente autenticado.
         """
-        cedula = self.request.COOKIES.get(settings.NOMBRE_COOKIE_DOCENTE)
-        docente = Docente.objects.get(cedula=cedula)
-        return PlanAprendizaje.objects.filter(docente=docente)
+        docente = self.request.cedula_docente
+        return PlanAprendizaje.consulta_serializacion().filter(docente=docente)
 
     def perform_create(self, serializer):
         """
         Guarda una nueva instancia del Plan de Aprendizaje, asociándola al docente autenticado.
         """
-        cedula = self.request.COOKIES.get(settings.NOMBRE_COOKIE_DOCENTE)
-        docente = Docente.objects.get(cedula=cedula)
+        docente = self.request.docente
         serializer.save(docente=docente)
 
 class ObtenerActualizarEliminarPlanAprendizaje(generics.RetrieveUpdateDestroyAPIView):
@@ -57,9 +106,8 @@ class ObtenerActualizarEliminarPlanAprendizaje(generics.RetrieveUpdateDestroyAPI
         """
         Obtiene el conjunto de consultas de los Planes de Aprendizaje asociados al docente autenticado.
         """
-        cedula = self.request.COOKIES.get(settings.NOMBRE_COOKIE_DOCENTE)
-        docente = Docente.objects.get(cedula=cedula)
-        return PlanAprendizaje.objects.filter(docente=docente)
+        docente = self.request.cedula_docente
+        return PlanAprendizaje.consulta_serializacion().filter(docente=docente)
 
 class DescargarPlanAprendizaje(generics.GenericAPIView):
     """
@@ -70,24 +118,68 @@ class DescargarPlanAprendizaje(generics.GenericAPIView):
 
     def get(self, request, pk):
         """
-        Genera y devuelve el PDF del Plan de Aprendizaje solicitado.
+        Devuelve el PDF del Plan de Aprendizaje solicitado, generándolo solo si cambió desde la última descarga.
+        El archivo se transmite desde el disco y admite descargas parciales (cabecera `Range`).
+        Si los procesos de generación de PDFs están saturados responde 503 con la cabecera `Retry-After`.
         """
-        cedula = self.request.COOKIES.get(settings.NOMBRE_COOKIE_DOCENTE)
-        docente = Docente.objects.get(cedula=cedula)
+        docente = self.request.cedula_docente
         codigo_grupo = pk
         pa = get_object_or_404(
-            PlanAprendizaje,
+            PlanAprendizaje.consulta_exportacion(),
             docente=docente,
             codigo_grupo=codigo_grupo
         )
-        pdf_buffer = pa.generar_pdf()
-        response = HttpResponse(pdf_buffer.getvalue(), content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="plan_aprendizaje_{codigo_grupo}.pdf"'
-        return response
+        return respuesta_exportacion(request, pa, pa.nombre_archivo_pdf)
+
+
+class DescargarExpedientePlanAprendizaje(generics.GenericAPIView):
+    """
+    API endpoint para descargar en un solo PDF un Plan de Aprendizaje seguido de su Plan de Evaluación.
+    La descarga está limitada a los Planes de Aprendizaje asociados al docente autenticado.
+    """
+    permission_classes = [CedulaRequerida]
+
+    def get(self, request, pk):
+        """
+        Devuelve el expediente del grupo, con un marcador por cada plan salvo que se indique `marcadores=false`.
+        Ambos planes se validan y generan en una sola pasada y el archivo se guarda en la caché de PDFs.
+        """
+        docente = self.request.cedula_docente
+        pa = get_object_or_404(
+            PlanAprendizaje.consulta_exportacion(),
+            docente=docente,
+            codigo_grupo=pk
+        )
+        try:
+            expediente = ExpedientePDF.del_grupo(pa, marcadores=request.GET.get('marcadores', 'true').lower() not in ('false', '0'))
+        except PlanEvaluacion.DoesNotExist:
+            raise Http404("El plan de aprendizaje no tiene un plan de evaluación asociado.")
+        return respuesta_exportacion(request, expediente, expediente.nombre_archivo_pdf)
 
 
+class VistaPreviaPlanAprendizaje(generics.GenericAPIView):
+    """
+    API endpoint para obtener la imagen de una página de un Plan de Aprendizaje, sin generar el PDF.
+    La vista previa está limitada a los Planes de Aprendizaje asociados al docente autenticado.
+    """
+    permission_classes = [CedulaRequerida]
 
-# Vistas para ObjetivoPlanAprendizaje (limitadas por docente a través de PlanAprendizaje)
+    def get(self, request, pk):
+        """
+        Devuelve un PNG de la página indicada en `pagina` (por defecto la primera), aunque el plan aún no sea exportable.
+        Responde 404 si la página no existe.
+        """
+        docente = self.request.cedula_docente
+        pa = get_object_or_404(
+            PlanAprendizaje.consulta_exportacion(),
+            docente=docente,
+            codigo_grupo=pk
+        )
+        return respuesta_vista_previa(request, pa)
+
+
+
+# Vistas para ObjetivoPlanAprendizaje (limitadas por docente, copiado en cada objetivo)
 class CrearListarObjetivoPlanAprendizaje(generics.ListCreateAPIView):
     """
     API endpoint para listar y crear Objetivos de Plan de Aprendizaje.
@@ -101,9 +193,8 @@ class CrearListarObjetivoPlanAprendizaje(generics.ListCreateAPIView):
         Obtiene el conjunto de consultas de los Objetivos de Plan de Aprendizaje
         asociados a los Planes de Aprendizaje del docente autenticado, ordenados por ID.
         """
-        cedula = self.request.COOKIES.get(settings.NOMBRE_COOKIE_DOCente)
-        docente = Docente.objects.get(cedula=cedula)
-        return ObjetivoPlanAprendizaje.objects.filter(plan_aprendizaje__docente=docente).order_by('id')
+        docente = self.request.cedula_docente
+        return ObjetivoPlanAprendizaje.objects.filter(docente=docente).order_by('id')
 
 class ObtenerActualizarEliminarObjetivoPlanAprendizaje(generics.RetrieveUpdateDestroyAPIView):
     """
@@ -118,9 +209,8 @@ class ObtenerActualizarEliminarObjetivoPlanAprendizaje(generics.RetrieveUpdateDe
         Obtiene el conjunto de consultas de los Objetivos de Plan de Aprendizaje
         asociados a los Planes de Aprendizaje del docente autenticado.
         """
-        cedula = self.request.COOKIES.get(settings.NOMBRE_COOKIE_DOCENTE)
-        docente = Docente.objects.get(cedula=cedula)
-        return ObjetivoPlanAprendizaje.objects.filter(plan_aprendizaje__docente=docente)
+        docente = self.request.cedula_docente
+        return ObjetivoPlanAprendizaje.objects.filter(docente=docente)
 
     def update(self, request, *args, **kwargs):
         """
@@ -145,9 +235,8 @@ class CrearListarPlanEvaluacion(generics.ListCreateAPIView):
         Obtiene el conjunto de consultas de los Planes de Evaluación
         asociados a los Planes de Aprendizaje del docente autenticado.
         """
-        cedula = self.request.COOKIES.get(settings.NOMBRE_COOKIE_DOCENTE)
-        docente = Docente.objects.get(cedula=cedula)
-        return PlanEvaluacion.objects.filter(plan_aprendizaje__docente=docente)
+        docente = self.request.cedula_docente
+        return PlanEvaluacion.consulta_serializacion().filter(plan_aprendizaje__docente=docente)
 
 class ObtenerActualizarEliminarPlanEvaluacion(generics.RetrieveUpdateDestroyAPIView):
     """
@@ -162,9 +251,8 @@ class ObtenerActualizarEliminarPlanEvaluacion(generics.RetrieveUpdateDestroyAPIV
         Obtiene el conjunto de consultas de los Planes de Evaluación
         asociados a los Planes de Aprendizaje del docente autenticado.
         """
-        cedula = self.request.COOKIES.get(settings.NOMBRE_COOKIE_DOCENTE)
-        docente = Docente.objects.get(cedula=cedula)
-        return PlanEvaluacion.objects.filter(plan_aprendizaje__docente=docente)
+        docente = self.request.cedula_docente
+        return PlanEvaluacion.consulta_serializacion().filter(plan_aprendizaje__docente=docente)
 
 class DescargarPlanEvaluacion(generics.GenericAPIView):
     """
@@ -175,23 +263,135 @@ class DescargarPlanEvaluacion(generics.GenericAPIView):
 
     def get(self, request, pk):
         """
-        Genera y devuelve el PDF del Plan de Evaluación solicitado.
+        Devuelve el PDF del Plan de Evaluación solicitado, generándolo solo si cambió desde la última descarga.
+        El archivo se transmite desde el disco y admite descargas parciales (cabecera `Range`).
+        Si los procesos de generación de PDFs están saturados responde 503 con la cabecera `Retry-After`.
         """
-        cedula = self.request.COOKIES.get(settings.NOMBRE_COOKIE_DOCENTE)
-        docente = Docente.objects.get(cedula=cedula)
+        docente = self.request.cedula_docente
         _id = pk
         pe = get_object_or_404(
-            PlanEvaluacion,
+            PlanEvaluacion.consulta_exportacion(),
             plan_aprendizaje__docente=docente,
             id=_id
         )
-        pdf_buffer = pe.generar_pdf()
-        response = HttpResponse(pdf_buffer.getvalue(), content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="{pe.nombre}.pdf"'
+        return respuesta_exportacion(request, pe, pe.nombre_archivo_pdf)
+
+
+class VistaPreviaPlanEvaluacion(generics.GenericAPIView):
+    """
+    API endpoint para obtener la imagen de una página de un Plan de Evaluación, sin generar el PDF.
+    La vista previa está limitada a los Planes de Evaluación asociados a los Planes de Aprendizaje del docente autenticado.
+    """
+    permission_classes = [CedulaRequerida]
+
+    def get(self, request, pk):
+        """
+        Devuelve un PNG de la página indicada en `pagina` (por defecto la primera), aunque el plan aún no sea exportable.
+        Responde 404 si la página no existe.
+        """
+        docente = self.request.cedula_docente
+        pe = get_object_or_404(
+            PlanEvaluacion.consulta_exportacion(),
+            plan_aprendizaje__docente=docente,
+            id=pk
+        )
+        return respuesta_vista_previa(request, pe)
+
+
+class ExportarPlanes(generics.GenericAPIView):
+    """
+    API endpoint para descargar en un ZIP los PDFs de varios planes a la vez.
+    La exportación está limitada a los planes del docente autenticado y se puede filtrar
+    por núcleo, turno, unidad curricular y tipo de plan (parámetros de la URL).
+    """
+    serializer_class = SerializadorFiltroExportacion
+    permission_classes = [CedulaRequerida]
+
+    def get(self, request):
+        """
+        Devuelve el ZIP por partes a medida que se generan los PDFs. Los planes que no se pueden
+        exportar se indican en el archivo `manifiesto.json` del ZIP. Si ya hay demasiadas exportaciones
+        en curso responde 503 con `Retry-After`.
+        """
+        filtros = self.get_serializer(data=request.query_params)
+        filtros.is_valid(raise_exception=True)
+        filtros = dict(filtros.validated_data)
+        if 'unidad_curricular' in filtros:
+            filtros['unidad_curricular'] = filtros['unidad_curricular'].pk
+
+        planes = seleccionar_planes(docente=request.cedula_docente, **filtros)
+        # El cupo se libera cuando Django cierra la respuesta (terminada o interrumpida)
+        cupo = grupo_exportacion_pdf.reservar()
+        contenido = ContenidoConCupo(generar_zip(planes), cupo)
+        response = StreamingHttpResponse(contenido, content_type='application/zip')
+        response['Content-Disposition'] = 'attachment; filename="planes.zip"'
         return response
 
 
-# Vistas para ItemPlanEvaluacion (limitadas por docente a través de PlanEvaluacion)
+# Vistas para TrabajoExportacion (limitadas por docente)
+class CrearTrabajoExportacion(generics.CreateAPIView):
+    """
+    API endpoint para solicitar la exportación asíncrona de uno o varios planes.
+    Responde de inmediato con el trabajo creado (202); el progreso se consulta en el detalle del trabajo.
+    """
+    serializer_class = SerializadorTrabajoExportacion
+    permission_classes = [CedulaRequerida]
+
+    def get_serializer_context(self):
+        """
+        Agrega al contexto el docente autenticado, dueño de los planes a exportar.
+        """
+        contexto = super().get_serializer_context()
+        contexto['docente'] = self.request.docente
+        return contexto
+
+    def create(self, request, *args, **kwargs):
+        """
+        Crea el trabajo, lo encola en el trabajador local y devuelve su estado inicial.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        trabajo = serializer.save(docente=serializer.context['docente'])
+        trabajador_exportaciones.encolar(trabajo.pk)
+        headers = {'Location': request.build_absolute_uri(reverse('exportaciones-retrieve', kwargs={'pk': trabajo.pk}))}
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED, headers=headers)
+
+class ObtenerTrabajoExportacion(generics.RetrieveAPIView):
+    """
+    API endpoint para consultar el estado y el progreso (páginas generadas / totales) de un trabajo de exportación.
+    Las operaciones están limitadas a los trabajos del docente autenticado.
+    """
+    serializer_class = SerializadorTrabajoExportacion
+    permission_classes = [CedulaRequerida]
+
+    def get_queryset(self):
+        """
+        Obtiene el conjunto de consultas de los trabajos de exportación del docente autenticado.
+        """
+        return TrabajoExportacion.objects.filter(docente=self.request.cedula_docente)
+
+class DescargarTrabajoExportacion(generics.GenericAPIView):
+    """
+    API endpoint para descargar el archivo de un trabajo de exportación completado
+    (un PDF si se exportó un solo plan, un ZIP si se exportaron varios).
+    """
+    permission_classes = [CedulaRequerida]
+
+    def get(self, request, pk):
+        """
+        Devuelve el archivo generado. Responde 404 si el trabajo no ha terminado y 410 si ya expiró.
+        """
+        trabajo = get_object_or_404(TrabajoExportacion, docente=request.cedula_docente, pk=pk, estado__in=['COM', 'EXP'])
+        if not trabajo.expirado:
+            content_type = 'application/pdf' if trabajo.ruta_archivo.suffix == '.pdf' else 'application/zip'
+            try:
+                return respuesta_pdf(request, trabajo.ruta_archivo, trabajo.nombre_archivo, content_type)
+            except FileNotFoundError:  # Eliminado al expirar
+                pass
+        return Response({'detail': "El archivo de la exportación expiró."}, status=status.HTTP_410_GONE)
+
+
+# Vistas para ItemPlanEvaluacion (limitadas por docente, copiado en cada ítem)
 class CrearListarItemPlanEvaluacion(generics.ListCreateAPIView):
     """
     API endpoint para listar y crear Ítems de Plan de Evaluación.
@@ -206,12 +406,9 @@ class CrearListarItemPlanEvaluacion(generics.ListCreateAPIView):
         asociados a los Planes de Evaluación del docente autenticado.
         Permite filtrar por el ID del Plan de Evaluación ('pe' en los parámetros de la URL).
         """
-        cedula = self.request.COOKIES.get(settings.NOMBRE_COOKIE_DOCENTE)
-        docente = Docente.objects.get(cedula=cedula)
+        docente = self.request.cedula_docente
         pe_pk = self.request.GET.get('pe', None)
-        queryset = ItemPlanEvaluacion.objects.filter(
-            plan_evaluacion__plan_aprendizaje__docente=docente,
-        )
+        queryset = ItemPlanEvaluacion.consulta_serializacion().filter(docente=docente)
         if pe_pk:
             queryset = queryset.filter(
                 plan_evaluacion__pk=pe_pk
@@ -232,9 +429,8 @@ class ObtenerActualizarEliminarItemPlanEvaluacion(generics.RetrieveUpdateDestroy
         Obtiene el conjunto de consultas de los Ítems de Plan de Evaluación
         asociados a los Planes de Evaluación del docente autenticado.
         """
-        cedula = self.request.COOKIES.get(settings.NOMBRE_COOKIE_DOCENTE)
-        docente = Docente.objects.get(cedula=cedula)
-        return ItemPlanEvaluacion.objects.filter(plan_evaluacion__plan_aprendizaje__docente=docente)
+        docente = self.request.cedula_docente
+        return ItemPlanEvaluacion.consulta_serializacion().filter(docente=docente)
 
 
 #Vistas para Unidad Curricular
@@ -0,0 +1,142 @@
+from functools import lru_cache
+from hashlib import sha256
+from io import BytesIO
+from json import dumps
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from PIL import Image, ImageDraw, ImageFont
+from reportlab import __file__ as ruta_reportlab
+from reportlab.lib.pagesizes import landscape, letter
+
+from .cache_pdf import cache_vistas
+from .models import ExportablePDFMixin
+from .utils import ancho_texto
+
+
+# Fuente TrueType incluida con reportlab, la más parecida a Helvetica que no requiere instalar nada más
+FUENTE_VISTA_PREVIA = Path(ruta_reportlab).parent / "fonts" / "Vera.ttf"
+
+# Resolución de los PNG de fondo (96 ppp: 1056 pixeles de ancho) y metadato del PNG con la huella del PDF
+# de la plantilla del que se generó (ver `scripts/generar_fondos_vista_previa.py`)
+PPP_FONDO_VISTA_PREVIA = 96
+CLAVE_HUELLA_PLANTILLA = "huella-plantilla"
+
+
+@lru_cache(maxsize=256)
+def fuente_vista_previa(tamaño: float) -> ImageFont.FreeTypeFont:
+    return ImageFont.truetype(str(FUENTE_VISTA_PREVIA), tamaño)
+
+
+def huella_archivo(ruta: Path) -> str:
+    return sha256(ruta.read_bytes()).hexdigest()
+
+
+def version_archivo(ruta: Path) -> str:
+    """Fecha de modificación y tamaño del archivo (como `PlantillaPDF.version`), vacía si no existe."""
+    try:
+        estado = ruta.stat()
+    except FileNotFoundError:
+        return ""
+    return f"{estado.st_mtime_ns}-{estado.st_size}"
+
+
+def fondo_plantilla(ruta_plantilla: Path, ancho: int) -> Image.Image:
+    """Imagen de la plantilla (el PNG junto al PDF de la plantilla) al ancho indicado.
+
+    El PNG es la página de la plantilla rasterizada por `scripts/generar_fondos_vista_previa.py` y se
+    escala al ancho de la vista previa. Se vuelve a leer si cambia el PNG o el PDF, y si el PNG no se
+    generó a partir del PDF actual se lanza ImproperlyConfigured en lugar de mostrar una plantilla
+    desactualizada. Sin PNG, la vista previa se dibuja sobre una página en blanco.
+    """
+    ruta_fondo = ruta_plantilla.with_suffix(".png")
+    return _cargar_fondo(ruta_plantilla, version_archivo(ruta_plantilla), version_archivo(ruta_fondo), ancho)
+
+
+@lru_cache(maxsize=8)
+def _cargar_fondo(ruta_plantilla: Path, version_plantilla: str, version_fondo: str, ancho: int) -> Image.Image:
+    ancho_pagina, alto_pagina = landscape(letter)
+    tamaño = (ancho, round(ancho * alto_pagina / ancho_pagina))
+    ruta_fondo = ruta_plantilla.with_suffix(".png")
+    try:
+        with Image.open(ruta_fondo) as imagen:
+            if imagen.info.get(CLAVE_HUELLA_PLANTILLA) != huella_archivo(ruta_plantilla):
+                raise ImproperlyConfigured(
+                    f"{ruta_fondo.name} no se generó a partir de la versión actual de {ruta_plantilla.name}; "
+                    "genérelo con `python manage.py runscript generar_fondos_vista_previa`."
+                )
+            fondo = imagen.convert("RGB")
+    except FileNotFoundError:
+        return Image.new("RGB", tamaño, "white")
+    return fondo if fondo.size == tamaño else fondo.resize(tamaño, Image.Resampling.LANCZOS)
+
+
+class LienzoImagen:
+    """Lienzo de Pillow con los métodos de `reportlab.pdfgen.canvas.Canvas` que usan los planes.
+
+    Permite dibujar la vista previa con el mismo código que el PDF (`escribir_encabezado` y `llenar_tabla`),
+    convirtiendo las coordenadas en puntos (origen abajo a la izquierda) a pixeles de la imagen. Los textos
+    más anchos que en Helvetica se escriben con una fuente más pequeña, para que ocupen lo mismo que en el PDF.
+    """
+
+    def __init__(self, fondo: Image.Image):
+        self.imagen = fondo.copy()
+        self.escala = self.imagen.width / landscape(letter)[0]
+        self._dibujo = ImageDraw.Draw(self.imagen)
+        self._nombre_fuente, self._tamaño = "Helvetica", 11
+        self._color = (0, 0, 0)
+
+    def setFont(self, fuente: str, tamaño: float):
+        self._nombre_fuente, self._tamaño = fuente, tamaño
+
+    def setFillColor(self, color):
+        self._color = tuple(round(componente * 255) for componente in color.rgb())
+
+    def drawString(self, x: float, y: float, texto: str):
+        tamaño = self._tamaño * self.escala
+        ancho_pdf = ancho_texto(texto, tamaño, self._nombre_fuente)
+        ancho = fuente_vista_previa(tamaño).getlength(texto)
+        if ancho > ancho_pdf:
+            tamaño = round(tamaño * ancho_pdf / ancho, 1)
+
+        posicion = (x * self.escala, self.imagen.height - y * self.escala)
+        self._dibujo.text(posicion, texto, fill=self._color, font=fuente_vista_previa(tamaño), anchor="ls")
+
+    def png(self) -> BytesIO:
+        buffer = BytesIO()
+        # Con más compresión el archivo apenas se reduce y la codificación tarda casi el doble
+        self.imagen.save(buffer, "PNG", compress_level=1)
+        buffer.seek(0)
+        return buffer
+
+
+def dibujar_vista_previa(plan: ExportablePDFMixin, parte: tuple[tuple[int, object]]) -> BytesIO:
+    """Dibuja el encabezado y las filas de una página del plan sobre la imagen de su plantilla."""
+    lienzo = LienzoImagen(fondo_plantilla(plan.plantilla_para_pdf, settings.ANCHO_VISTA_PREVIA_PDF))
+    lienzo.setFont("Helvetica", plan.tamaño_fuente)
+    plan.escribir_encabezado(lienzo)
+    plan.llenar_tabla(lienzo, parte)
+    return lienzo.png()
+
+
+def obtener_vista_previa(plan: ExportablePDFMixin, numero_pagina: int = 1) -> tuple[Path, int]:
+    """Devuelve la ruta del PNG de una página del plan y la cantidad de páginas del documento.
+
+    La página se pagina igual que en el PDF pero se dibuja directamente en una imagen, sin generar ni
+    combinar PDFs, y no exige que el plan sea exportable. Las imágenes se guardan en la caché según la
+    huella de la página. Lanza IndexError si la página no existe.
+    """
+    partes = plan.paginar(tuple(enumerate(plan.obtener_items_pdf(), 1))) or ((),)
+    if not 1 <= numero_pagina <= len(partes):
+        raise IndexError(f"El plan tiene {len(partes)} páginas.")
+
+    parte = partes[numero_pagina - 1]
+    # La huella de la página ya incluye la versión del PDF de la plantilla; se agrega la de su PNG
+    version_fondo = version_archivo(plan.plantilla_para_pdf.with_suffix(".png"))
+    huella = sha256(dumps(
+        ("vista previa", settings.ANCHO_VISTA_PREVIA_PDF, version_fondo, plan.huella_pagina(parte))
+    ).encode())
+    ruta = cache_vistas.obtener_o_generar(huella.hexdigest(), lambda: dibujar_vista_previa(plan, parte))
+    return ruta, len(partes)
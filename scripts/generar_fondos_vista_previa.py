@@ -0,0 +1,34 @@
+"""Utilidad para generar las imágenes de fondo de las vistas previas (el PNG junto a cada plantilla PDF).
+
+Uso:
+    python manage.py runscript generar_fondos_vista_previa
+
+Debe ejecutarse cada vez que cambia una plantilla. Cada PNG guarda la huella del PDF del que se
+generó, y la vista previa no usa un PNG que no corresponda a la plantilla actual. Requiere PyMuPDF
+(`pip install pymupdf`), que solo se usa aquí para rasterizar las plantillas y no lo necesita el servidor.
+"""
+
+from PIL import Image
+from PIL.PngImagePlugin import PngInfo
+
+from gestion_planes.models import PlanAprendizaje, PlanEvaluacion
+from gestion_planes.vista_previa import CLAVE_HUELLA_PLANTILLA, PPP_FONDO_VISTA_PREVIA, huella_archivo
+
+
+def run(*args):
+    try:
+        import pymupdf
+    except ImportError:
+        raise SystemExit("Se necesita PyMuPDF para rasterizar las plantillas: pip install pymupdf")
+
+    for modelo in (PlanAprendizaje, PlanEvaluacion):
+        ruta_plantilla = modelo().plantilla_para_pdf
+        with pymupdf.open(ruta_plantilla) as documento:
+            pixeles = documento[0].get_pixmap(dpi=PPP_FONDO_VISTA_PREVIA, alpha=False)
+        imagen = Image.frombytes("RGB", (pixeles.width, pixeles.height), pixeles.samples)
+
+        metadatos = PngInfo()
+        metadatos.add_text(CLAVE_HUELLA_PLANTILLA, huella_archivo(ruta_plantilla))
+        ruta_fondo = ruta_plantilla.with_suffix(".png")
+        imagen.save(ruta_fondo, "PNG", optimize=True, pnginfo=metadatos)
+        print(f"{ruta_fondo.name}: {imagen.width}x{imagen.height} pixeles")
@@ -0,0 +1,505 @@
+"""Utilidad para medir el rendimiento de la exportación de planes a PDF (y de las consultas de los planes).
+
+Uso:
+    python manage.py runscript medir_rendimiento_pdf
+    python manage.py runscript medir_rendimiento_pdf --script-args plantilla
+
+Las mediciones trabajan con instancias en memoria (sin guardar), o dentro de una transacción que se
+revierte al terminar, por lo que no modifican la base de datos.
+"""
+
+from datetime import date, datetime
+from io import BytesIO
+from itertools import count
+from shutil import which
+from tempfile import TemporaryDirectory, TemporaryFile
+from time import perf_counter
+import tracemalloc
+
+from pypdf import PdfReader, PdfWriter
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import landscape, letter
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from autenticacion_docente.models import Docente, NUMERO_MINIMO_CEDULA
+
+from gestion_planes.models import (
+    UnidadCurricular,
+    PlanAprendizaje,
+    ObjetivoPlanAprendizaje,
+    PlanEvaluacion,
+    ItemPlanEvaluacion,
+)
+from gestion_planes.expediente import ExpedientePDF
+from gestion_planes.plantillas import registro_plantillas, registro_encabezados
+from gestion_planes.salida_pdf import MODOS_SALIDA_PDF, MODO_WEB, escribir_pdf
+from gestion_planes.vista_previa import dibujar_vista_previa
+from gestion_planes.utils import ajustar_texto
+
+
+CANTIDAD_OBJETIVOS = 60
+REPETICIONES = 5
+
+
+def crear_plan_en_memoria(cantidad_objetivos: int = CANTIDAD_OBJETIVOS) -> tuple[PlanAprendizaje, tuple]:
+    """Crea un plan de aprendizaje sin guardar junto a sus objetivos enumerados."""
+
+    docente = Docente(cedula=28318187, correo="sidesrev@gmail.com", nombre="Ricardo", apellido="Marin")
+    uc = UnidadCurricular(codigo="AYP-0", trayecto=2, semestre=1, unidades_credito=3, nombre="Algorítmica y Programación")
+    pa = PlanAprendizaje(
+        codigo_grupo="INF_(AYP-0)_FLO_N",
+        docente=docente,
+        unidad_curricular=uc,
+        nucleo="FLO",
+        turno="N",
+        pnf="Informática (PNFi)",
+        fecha_modificacion=datetime.now(),
+    )
+    objetivos = tuple(
+        ObjetivoPlanAprendizaje(
+            plan_aprendizaje=pa,
+            titulo=f"Objetivo de aprendizaje {i}",
+            contenido="Definir y aplicar conceptos como algoritmos, variables, estructuras de control y tipos de datos. " * (1 + i % 2),
+            criterio_logro="Diseñar algoritmos para resolver problemas sencillos, utilizando diagramas de flujo y pseudocódigo.",
+            estrategia_didactica="CL",
+            duracion_horas=2 + i % 8,
+        )
+        for i in range(cantidad_objetivos)
+    )
+    return pa, tuple(enumerate(objetivos, 1))
+
+
+def partir(items: tuple, tamaño: int) -> tuple[tuple]:
+    return tuple(items[i:i + tamaño] for i in range(0, len(items), tamaño))
+
+
+def medir(funcion, repeticiones: int = REPETICIONES) -> float:
+    """Devuelve el menor tiempo (en segundos) de varias ejecuciones de la función."""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = perf_counter()
+        funcion()
+        tiempos.append(perf_counter() - inicio)
+    return min(tiempos)
+
+
+def medir_plantilla():
+    """Latencia por página con la plantilla leída en cada página (antes) y con el registro de plantillas (después)."""
+
+    pa, items = crear_plan_en_memoria()
+    partes = pa.paginar(items)
+
+    def sin_registro():
+        # Sin ninguno de los dos registros, cada página vuelve a leer la plantilla y a combinarle el encabezado
+        for parte in partes:
+            registro_plantillas.limpiar()
+            registro_encabezados.limpiar()
+            pa.generar_pagina(parte)
+
+    def con_registro():
+        for parte in partes:
+            pa.generar_pagina(parte)
+
+    antes = medir(sin_registro) / len(partes)
+    registro_plantillas.obtener(pa.plantilla_para_pdf)
+    despues = medir(con_registro) / len(partes)
+
+    print(f"Plantilla ({CANTIDAD_OBJETIVOS} objetivos, {len(partes)} páginas)")
+    print(f"  Antes:   {antes * 1000:.2f} ms/página")
+    print(f"  Después: {despues * 1000:.2f} ms/página ({antes / despues:.1f}x)")
+
+
+def medir_capa():
+    """Documento completo con un lienzo por página (antes) y con una sola capa de varias páginas (después)."""
+
+    pa, items = crear_plan_en_memoria()
+    partes = pa.paginar(items)
+
+    def pagina_por_pagina():
+        salida = PdfWriter()
+        for parte in partes:
+            salida.add_page(pa.generar_pagina(parte))
+        salida.write(BytesIO())
+
+    def capa_unica():
+        salida = PdfWriter()
+        for pagina_capa in pa.generar_capa(partes).pages:
+            salida.add_page(pa.combinar_con_plantilla(pagina_capa))
+        salida.write(BytesIO())
+
+    antes = medir(pagina_por_pagina)
+    despues = medir(capa_unica)
+
+    print(f"Capa de contenido ({CANTIDAD_OBJETIVOS} objetivos, {len(partes)} páginas)")
+    print(f"  Antes:   {antes * 1000:.2f} ms")
+    print(f"  Después: {despues * 1000:.2f} ms ({antes / despues:.1f}x)")
+
+
+def ajustar_texto_pdf(texto: str, max_caracteres: int, max_lineas: int = 4, elipsis: bool = False) -> tuple[str]:
+    """Ajuste anterior de los textos a las columnas por cantidad de caracteres, como referencia de `medir_texto`."""
+    if len(texto) > max_caracteres:
+        # Puntos suspensivos si el texto es muy largo.
+        if elipsis:
+            texto = texto[:max_caracteres]
+            texto = texto[:-3] + '...'
+            return texto,
+
+        lineas = []
+        palabras = texto.split()
+        linea_actual = ""
+
+        for palabra in palabras:
+            if len(linea_actual) + len(palabra) + 1 <= max_caracteres:
+                if linea_actual:
+                    linea_actual += " " + palabra
+                else:
+                    linea_actual = palabra
+            else:
+                lineas.append(linea_actual)
+                linea_actual = palabra
+
+        if linea_actual:
+            lineas.append(linea_actual)
+
+        if len(lineas) > max_lineas:
+            lineas[max_lineas-1] = ' '.join(lineas[max_lineas-1].split(' ')[:-1]) + '...'
+            lineas = lineas[:max_lineas]
+
+        return lineas
+
+    else:
+        return texto,
+
+
+def medir_texto():
+    """Celdas por segundo del ajuste por cantidad de caracteres y del ajuste por ancho real (sin y con memoria)."""
+
+    pa, items = crear_plan_en_memoria(1000)
+    # Se agrega el índice a cada texto para que todas las celdas sean distintas
+    celdas = [
+        (f"{texto} {i}", x, ancho)
+        for i, objetivo in items
+        for texto, (x, ancho) in zip(pa.fila_pdf(i, objetivo), pa.columnas_pdf)
+    ]
+
+    def por_caracteres():
+        for texto, _, ancho in celdas:
+            ajustar_texto_pdf(texto, int(ancho / 5))
+
+    def por_ancho():
+        ajustar_texto.cache_clear()
+        for texto, _, ancho in celdas:
+            ajustar_texto(texto, ancho, tamaño_minimo=pa.tamaño_minimo_fuente)
+
+    def por_ancho_memorizado():
+        for texto, _, ancho in celdas:
+            ajustar_texto(texto, ancho, tamaño_minimo=pa.tamaño_minimo_fuente)
+
+    print(f"Ajuste de texto ({len(celdas)} celdas)")
+    for nombre, funcion in (
+        ("Por caracteres", por_caracteres),
+        ("Por ancho", por_ancho),
+        ("Por ancho (memorizado)", por_ancho_memorizado),
+    ):
+        print(f"  {nombre}: {len(celdas) / medir(funcion):,.0f} celdas/s")
+
+
+def medir_paginacion():
+    """Páginas, tamaño y tiempo con 6 filas fijas por página (antes) y con paginación por alto de fila (después)."""
+
+    pa, items = crear_plan_en_memoria(30)
+    for _, objetivo in items:
+        objetivo.contenido = "Definir y aplicar conceptos básicos."
+        objetivo.criterio_logro = "Resolver ejercicios sencillos."
+
+    def generar(partes) -> BytesIO:
+        salida = PdfWriter()
+        for pagina_capa in pa.generar_capa(partes).pages:
+            salida.add_page(pa.combinar_con_plantilla(pagina_capa))
+        flujo = BytesIO()
+        salida.write(flujo)
+        return flujo
+
+    print("Paginación (30 objetivos de una linea)")
+    for nombre, partes in (("Antes", partir(items, 6)), ("Después", pa.paginar(items))):
+        tiempo = medir(lambda: generar(partes))
+        tamaño = len(generar(partes).getvalue())
+        print(f"  {nombre}: {len(partes)} páginas, {tamaño / 1024:.0f} KiB, {tiempo * 1000:.2f} ms")
+
+
+@override_settings(CACHE_PAGINAS_PDF=False)
+def medir_encabezado():
+    """Documento completo dibujando el encabezado en cada página (antes) y con la plantilla encabezada en caché (después)."""
+
+    pa, items = crear_plan_en_memoria()
+    partes = pa.paginar(items)
+    objetivos = tuple(objetivo for _, objetivo in items)
+
+    def encabezado_por_pagina():
+        buffer = BytesIO()
+        lienzo = canvas.Canvas(buffer, pagesize=landscape(letter))
+        for datos in partes:
+            lienzo.setFont("Helvetica", pa.tamaño_fuente)
+            pa.escribir_encabezado(lienzo)
+            pa.llenar_tabla(lienzo, datos)
+            lienzo.showPage()
+        lienzo.save()
+
+        salida = PdfWriter()
+        plantilla = registro_plantillas.obtener(pa.plantilla_para_pdf)
+        for pagina_capa in PdfReader(buffer).pages:
+            pagina = plantilla.copiar_pagina()
+            pagina.merge_page(pagina_capa)
+            salida.add_page(pagina)
+        # Se escribe en el modo de salida configurado, igual que `renderizar_pdf`
+        escribir_pdf(salida)
+
+    def primera_descarga():
+        registro_encabezados.limpiar()
+        pa.renderizar_pdf(objetivos)
+
+    def plantilla_encabezada():
+        pa.renderizar_pdf(objetivos)
+
+    print(f"Encabezado ({CANTIDAD_OBJETIVOS} objetivos, {len(partes)} páginas)")
+    for nombre, funcion in (
+        ("Antes", encabezado_por_pagina),
+        ("Primera descarga", primera_descarga),
+        ("Descargas siguientes", plantilla_encabezada),
+    ):
+        print(f"  {nombre}: {medir(funcion) * 1000:.2f} ms")
+
+
+def guardar_grupo(cantidad_objetivos: int = CANTIDAD_OBJETIVOS) -> tuple[PlanAprendizaje, PlanEvaluacion]:
+    """Guarda un plan de aprendizaje en memoria junto a un plan de evaluación exportable (usar dentro de una transacción)."""
+
+    pa, objetivos = crear_plan_en_memoria(cantidad_objetivos)
+    pa.docente.save()
+    pa.unidad_curricular.save()
+    pa.codigo_grupo = "MEDICION_RENDIMIENTO_PDF"
+    pa.save()
+    pe = PlanEvaluacion.objects.create(nombre="P.E Medición", plan_aprendizaje=pa)
+    items = [
+        ItemPlanEvaluacion.objects.create(
+            plan_evaluacion=pe, habilidades_a_evaluar=f"Habilidad evaluada {i}", peso=20, fecha_planificada=date(2025, 5, 1 + i)
+        )
+        for i in range(5)
+    ]
+    for i, objetivo in objetivos:
+        objetivo.plan_aprendizaje = pa
+        objetivo.docente = pa.docente
+        objetivo.evaluacion_asociada = items[i % len(items)]
+    ObjetivoPlanAprendizaje.objects.bulk_create(objetivo for _, objetivo in objetivos)
+    pa.recalcular_contadores()
+    return pa, pe
+
+
+@override_settings(CACHE_PAGINAS_PDF=False)
+def medir_expediente():
+    """Consultas y tiempo de las dos descargas por separado (antes) y del expediente combinado (después)."""
+
+    with transaction.atomic():
+        pa, pe = guardar_grupo()
+
+        def dos_descargas():
+            PlanAprendizaje.consulta_exportacion().get(pk=pa.pk).generar_pdf()
+            PlanEvaluacion.consulta_exportacion().get(pk=pe.pk).generar_pdf()
+
+        def expediente():
+            ExpedientePDF.del_grupo(PlanAprendizaje.consulta_exportacion().get(pk=pa.pk)).generar_pdf()
+
+        print(f"Expediente ({CANTIDAD_OBJETIVOS} objetivos, 5 items)")
+        for nombre, funcion in (("Antes", dos_descargas), ("Después", expediente)):
+            with CaptureQueriesContext(connection) as consultas:
+                funcion()
+            print(f"  {nombre}: {medir(funcion) * 1000:.2f} ms, {len(consultas)} consultas")
+
+        transaction.set_rollback(True)
+
+
+def medir_paginas():
+    """Documento completo sin caché de páginas (antes), tras editar un objetivo y sin cambios (después)."""
+
+    pa, items = crear_plan_en_memoria()
+    partes = pa.paginar(items)
+    objetivos = tuple(objetivo for _, objetivo in items)
+    ediciones = count()
+
+    def sin_cache():
+        with override_settings(CACHE_PAGINAS_PDF=False):
+            pa.renderizar_pdf(objetivos)
+
+    def editar_un_objetivo():
+        objetivos[-1].titulo = f"Objetivo editado {next(ediciones)}"
+        pa.renderizar_pdf(objetivos)
+
+    def sin_cambios():
+        pa.renderizar_pdf(objetivos)
+
+    with TemporaryDirectory() as directorio, override_settings(DIRECTORIO_CACHE_PDF=directorio):
+        pa.renderizar_pdf(objetivos)
+        print(f"Páginas en caché ({CANTIDAD_OBJETIVOS} objetivos, {len(partes)} páginas)")
+        for nombre, funcion in (
+            ("Antes", sin_cache),
+            ("Después, un objetivo editado", editar_un_objetivo),
+            ("Después, sin cambios", sin_cambios),
+        ):
+            print(f"  {nombre}: {medir(funcion) * 1000:.2f} ms")
+
+
+@override_settings(CACHE_PAGINAS_PDF=False)
+def medir_salida():
+    """Tamaño y tiempo de generación del documento en cada modo de salida."""
+
+    pa, items = crear_plan_en_memoria()
+    objetivos = tuple(objetivo for _, objetivo in items)
+
+    print(f"Modos de salida ({CANTIDAD_OBJETIVOS} objetivos)")
+    for modo in MODOS_SALIDA_PDF:
+        if modo == MODO_WEB and which("qpdf") is None:
+            print(f"  {modo}: se omite, qpdf no está instalado")
+            continue
+        with override_settings(MODO_SALIDA_PDF=modo):
+            tamaño = len(pa.renderizar_pdf(objetivos).getvalue())
+            tiempo = medir(lambda: pa.renderizar_pdf(objetivos))
+        print(f"  {modo}: {tamaño / 1024:.1f} KB, {tiempo * 1000:.2f} ms")
+
+
+def medir_vista_previa():
+    """Imagen de la primera página frente al PDF completo, ambos sin caché."""
+
+    pa, items = crear_plan_en_memoria()
+    partes = pa.paginar(items)
+    objetivos = tuple(objetivo for _, objetivo in items)
+
+    print(f"Vista previa ({CANTIDAD_OBJETIVOS} objetivos, {len(partes)} páginas)")
+    with override_settings(CACHE_PAGINAS_PDF=False):
+        print(f"  PDF completo: {medir(lambda: pa.renderizar_pdf(objetivos)) * 1000:.2f} ms")
+    print(f"  Vista previa de una página: {medir(lambda: dibujar_vista_previa(pa, partes[0])) * 1000:.2f} ms")
+
+
+def pico_memoria(funcion) -> float:
+    """Pico de memoria (MB, según tracemalloc) de una ejecución, después de una primera que carga las cachés."""
+    funcion()
+    tracemalloc.start()
+    try:
+        funcion()
+        return tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    finally:
+        tracemalloc.stop()
+
+
+@override_settings(CACHE_PAGINAS_PDF=False)
+def medir_memoria():
+    """Pico de memoria de la exportación normal (antes) y por bloques (después) según el tamaño del plan."""
+
+    print("Memoria de la exportación")
+    for cantidad_objetivos in (150, 600, 1200):
+        with transaction.atomic():
+            pa, _ = guardar_grupo(cantidad_objetivos)
+            pa = PlanAprendizaje.consulta_exportacion().get(pk=pa.pk)
+
+            def en_flujo():
+                with TemporaryFile() as archivo:
+                    pa.escribir_pdf_en_flujo(archivo)
+
+            antes = pico_memoria(lambda: pa.renderizar_pdf(pa.obtener_items_pdf()))
+            despues = pico_memoria(en_flujo)
+            print(f"  {cantidad_objetivos} objetivos: antes {antes:.2f} MB, después {despues:.2f} MB")
+            transaction.set_rollback(True)
+
+
+CANTIDAD_DOCENTES = 100
+ITEMS_POR_PLAN = 50
+CANTIDAD_ITEMS = 100_000
+
+
+def guardar_planes_de_docentes():
+    """Guarda CANTIDAD_ITEMS items (y un objetivo por item) repartidos entre CANTIDAD_DOCENTES docentes."""
+
+    uc = UnidadCurricular.objects.create(
+        codigo="MEDICION-0", trayecto=2, semestre=1, unidades_credito=3, nombre="Algorítmica y Programación"
+    )
+    docentes = Docente.objects.bulk_create(
+        Docente(cedula=NUMERO_MINIMO_CEDULA + i, correo=f"docente{i}@medicion.test", nombre="Docente", apellido=str(i))
+        for i in range(CANTIDAD_DOCENTES)
+    )
+    cantidad_planes = CANTIDAD_ITEMS // ITEMS_POR_PLAN
+    planes = PlanAprendizaje.objects.bulk_create(
+        PlanAprendizaje(
+            codigo_grupo=f"MEDICION_{i}", docente=docentes[i % CANTIDAD_DOCENTES], unidad_curricular=uc,
+            nucleo="FLO", turno="N", pnf="Informática (PNFi)"
+        )
+        for i in range(cantidad_planes)
+    )
+    planes_evaluacion = PlanEvaluacion.objects.bulk_create(
+        PlanEvaluacion(nombre=f"P.E {pa.codigo_grupo}", plan_aprendizaje=pa) for pa in planes
+    )
+    items = ItemPlanEvaluacion.objects.bulk_create((
+        ItemPlanEvaluacion(
+            plan_evaluacion=pe, docente=pe.plan_aprendizaje.docente, habilidades_a_evaluar=f"Habilidad evaluada {i}",
+            peso=5, fecha_planificada=date(2025, 5, 1)
+        )
+        for pe in planes_evaluacion for i in range(ITEMS_POR_PLAN)
+    ), batch_size=5000)
+    ObjetivoPlanAprendizaje.objects.bulk_create((
+        ObjetivoPlanAprendizaje(
+            plan_aprendizaje=item.plan_evaluacion.plan_aprendizaje, docente=item.docente, evaluacion_asociada=item,
+            titulo="Objetivo", contenido="Contenido", criterio_logro="Criterio", estrategia_didactica="CL", duracion_horas=2
+        )
+        for item in items
+    ), batch_size=5000)
+    return docentes[0]
+
+
+def medir_filtro_docente():
+    """Consultas de los objetivos e items de un docente uniendo tablas hasta su plan (antes) y con el docente
+    copiado en cada fila (después)."""
+
+    with transaction.atomic():
+        docente = guardar_planes_de_docentes()
+        consultas = {
+            "Listado de items": (
+                ItemPlanEvaluacion.objects.filter(plan_evaluacion__plan_aprendizaje__docente=docente),
+                ItemPlanEvaluacion.objects.filter(docente=docente),
+            ),
+            "Listado de objetivos": (
+                ObjetivoPlanAprendizaje.objects.filter(plan_aprendizaje__docente=docente),
+                ObjetivoPlanAprendizaje.objects.filter(docente=docente),
+            ),
+        }
+        ultimo = ItemPlanEvaluacion.objects.filter(docente=docente).last().pk
+        consultas["Detalle de un item"] = (
+            ItemPlanEvaluacion.objects.filter(plan_evaluacion__plan_aprendizaje__docente=docente, pk=ultimo),
+            ItemPlanEvaluacion.objects.filter(docente=docente, pk=ultimo),
+        )
+
+        print(f"Filtro por docente ({CANTIDAD_ITEMS} items y objetivos, {CANTIDAD_DOCENTES} docentes)")
+        for nombre, (antes, despues) in consultas.items():
+            tiempo_antes = medir(lambda: list(antes.values_list('pk', flat=True)))
+            tiempo_despues = medir(lambda: list(despues.values_list('pk', flat=True)))
+            print(f"  {nombre}: antes {tiempo_antes * 1000:.2f} ms ({str(antes.query).count('JOIN')} uniones),"
+                  f" después {tiempo_despues * 1000:.2f} ms ({str(despues.query).count('JOIN')} uniones)")
+        transaction.set_rollback(True)
+
+
+MEDICIONES = {
+    "plantilla": medir_plantilla,
+    "capa": medir_capa,
+    "texto": medir_texto,
+    "paginacion": medir_paginacion,
+    "encabezado": medir_encabezado,
+    "expediente": medir_expediente,
+    "paginas": medir_paginas,
+    "salida": medir_salida,
+    "vista_previa": medir_vista_previa,
+    "memoria": medir_memoria,
+    "filtro_docente": medir_filtro_docente,
+}
+
+
+def run(*args):
+    for nombre in args or MEDICIONES:
+        MEDICIONES[nombre]()